@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChatSession, ChatMessage, OperationLog, SystemMetric
+from .models import ChatSession, ChatMessage, OperationLog, SystemMetric, MetricRollup
 
 
 @admin.register(ChatSession)
@@ -27,3 +27,7 @@ class SystemMetricAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'metric_name', 'metric_value')
     list_filter = ('metric_name', 'timestamp')
 
+@admin.register(MetricRollup)
+class MetricRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket_start', 'metric_name', 'resolution', 'count', 'p50', 'p95', 'p99', 'max')
+    list_filter = ('metric_name', 'resolution', 'bucket_start')
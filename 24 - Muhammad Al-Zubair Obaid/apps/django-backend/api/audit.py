@@ -0,0 +1,250 @@
+# api/audit.py
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP = 'drop'
+OVERFLOW_SPILL = 'spill'
+
+
+class AuditLogWriter:
+    """
+    Buffers OperationLog records and writes them with `bulk_create` from a
+    background thread, every `batch_size` records or `flush_interval_ms`,
+    whichever comes first. Records still buffered at interpreter exit are flushed.
+
+    When the buffer is full, new records are either dropped (and counted) or,
+    with the 'spill' policy, appended to a JSONL file that is replayed into the
+    database once the writer has caught up.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval_ms: float = 500.0,
+                 max_queue_size: int = 10000, overflow: str = OVERFLOW_DROP,
+                 spill_path: Optional[str] = None, autostart: bool = True):
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_SPILL):
+            raise ValueError(f"Unknown audit overflow policy: {overflow}")
+        if overflow == OVERFLOW_SPILL and not spill_path:
+            raise ValueError("The 'spill' overflow policy requires a spill_path.")
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.autostart = autostart
+
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.failed = 0
+
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue_size)
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        atexit.register(self.stop)
+
+    @classmethod
+    def from_settings(cls) -> 'AuditLogWriter':
+        config = getattr(settings, 'AUDIT_LOG', {})
+        return cls(
+            batch_size=config.get('BATCH_SIZE', 100),
+            flush_interval_ms=config.get('FLUSH_INTERVAL_MS', 500),
+            max_queue_size=config.get('MAX_QUEUE_SIZE', 10000),
+            overflow=config.get('OVERFLOW', OVERFLOW_DROP),
+            spill_path=config.get('SPILL_PATH'),
+            autostart=config.get('AUTOSTART', True),
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def enqueue(self, record: Dict[str, Any]):
+        """
+        Buffers one record (OperationLog field values, with `user_id` instead of `user`).
+        Never blocks and never touches the database.
+        """
+        record.setdefault('timestamp', timezone.now())
+        if self.autostart:
+            self._ensure_worker()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == OVERFLOW_SPILL:
+                self._spill(record)
+            else:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.warning(f"Audit log buffer is full, {self.dropped} records dropped so far.")
+
+    def flush(self) -> int:
+        """Writes every buffered (and spilled) record now. Returns the number written."""
+        with self._flush_lock:
+            total = 0
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                total += self._write(batch)
+            total += self._replay_spill()
+            return total
+
+    def stop(self):
+        """Stops the background thread and flushes what is left."""
+        self._stop_event.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join(timeout=5)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush audit logs on shutdown: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": self.queue_depth,
+            "written": self.written,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "failed": self.failed,
+        }
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop_event.clear()
+                self._worker = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            batch: List[Dict[str, Any]] = []
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if not batch and not self._has_spill():
+                continue
+
+            close_old_connections()
+            try:
+                with self._flush_lock:
+                    if batch:
+                        self._write(batch)
+                    if self._queue.empty():
+                        self._replay_spill()
+            except Exception as e:
+                # The worker must outlive any single bad round, or records pile up unwritten.
+                logger.exception(f"Audit log writer round failed: {e}")
+            finally:
+                close_old_connections()
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> int:
+        from .models import OperationLog
+        try:
+            OperationLog.objects.bulk_create([OperationLog(**record) for record in batch])
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to write {len(batch)} operation logs: {e}")
+            return 0
+        self.written += len(batch)
+        return len(batch)
+
+    def _spill(self, record: Dict[str, Any]):
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+                with open(self.spill_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, default=_encode) + '\n')
+            self.spilled += 1
+        except OSError as e:
+            self.dropped += 1
+            logger.error(f"Failed to spill audit log record to {self.spill_path}: {e}")
+
+    def _has_spill(self) -> bool:
+        if not self.spill_path:
+            return False
+        return os.path.exists(self.spill_path) or os.path.exists(f"{self.spill_path}.replay")
+
+    def _replay_spill(self) -> int:
+        if not self._has_spill():
+            return 0
+        # Move the file aside first so records spilled during the replay are kept for the next round.
+        replay_path = f"{self.spill_path}.replay"
+        with self._spill_lock:
+            if not os.path.exists(replay_path) and os.path.exists(self.spill_path):
+                os.replace(self.spill_path, replay_path)
+
+        records, corrupt = [], []
+        with open(replay_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(_decode(json.loads(line)))
+                except (ValueError, TypeError, AttributeError):
+                    corrupt.append(line if line.endswith('\n') else line + '\n')
+        if corrupt:
+            # A truncated line (e.g. the process died mid-spill) must not block the rest of the replay.
+            with open(f"{self.spill_path}.corrupt", 'a', encoding='utf-8') as f:
+                f.writelines(corrupt)
+            self.failed += len(corrupt)
+            logger.error(f"Moved {len(corrupt)} unreadable spilled audit log records to {self.spill_path}.corrupt.")
+        total = 0
+        for start in range(0, len(records), self.batch_size):
+            written = self._write(records[start:start + self.batch_size])
+            if not written:
+                # Keep what was not written so it is retried on the next flush.
+                with open(replay_path, 'w', encoding='utf-8') as f:
+                    for record in records[start:]:
+                        f.write(json.dumps(record, default=_encode) + '\n')
+                return total
+            total += written
+        os.remove(replay_path)
+        logger.info(f"Replayed {total} spilled audit log records.")
+        return total
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _decode(record: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(record.get('timestamp'), str):
+        record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+    return record
+
+
+audit_log_writer = AuditLogWriter.from_settings()
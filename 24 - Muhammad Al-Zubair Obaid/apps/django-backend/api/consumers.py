@@ -1,16 +1,42 @@
 # api/consumers.py
 import json
+import time
+import asyncio
 import logging
+from collections import deque
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from .intent_classifier.batching import QueueFullError
+from .result_cache import make_result
+from .services import ai_classifier_instance as ai_classifier
+from .services import response_formatter_instance as response_formatter
+from .services import result_cache_instance as result_cache
 
 logger = logging.getLogger(__name__)
 
+
 class SupportChatConsumer(AsyncWebsocketConsumer):
     """
     Handles WebSocket connections for the real-time support chat.
-    Its primary role now is to provide a stable channel name for the session.
+    Provides a stable channel name for the session and answers queries sent as
+    {"type": "query", "id": ..., "query": ...}. Each query streams back
+    'entities', 'classified' and 'response' frames tagged with its id, and several
+    queries may be in flight on the same socket.
     """
     async def connect(self):
+        config = getattr(settings, 'SUPPORT_CHAT_WS', {})
+        self.max_in_flight = config.get('MAX_IN_FLIGHT', 4)
+        self.rate_limit = config.get('RATE_LIMIT', 20)
+        self.rate_window = config.get('RATE_WINDOW_SECONDS', 10)
+        self.max_query_length = config.get('MAX_QUERY_LENGTH', 1000)
+        self.require_authentication = config.get('REQUIRE_AUTHENTICATION', True)
+
+        self.in_flight = {}
+        self.recent_queries = deque()
+        self.user = await self._authenticate()
+
         await self.accept()
         logger.info(f"WebSocket connected: {self.channel_name}")
         await self.send(text_data=json.dumps({
@@ -19,4 +45,128 @@ class SupportChatConsumer(AsyncWebsocketConsumer):
         }))
 
     async def disconnect(self, close_code):
-        logger.info(f"WebSocket disconnected: {self.channel_name} (Code: {close_code})")
\ No newline at end of file
+        for task in self.in_flight.values():
+            task.cancel()
+        self.in_flight.clear()
+        logger.info(f"WebSocket disconnected: {self.channel_name} (Code: {close_code})")
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or '')
+        except json.JSONDecodeError:
+            await self._send_error(None, 'invalid_message', "Messages must be JSON objects.")
+            return
+        if not isinstance(message, dict):
+            await self._send_error(None, 'invalid_message', "Messages must be JSON objects.")
+            return
+
+        message_type = message.get('type')
+        if message_type == 'query':
+            await self._start_query(message)
+        elif message_type == 'cancel':
+            query_id = message.get('id')
+            task = self.in_flight.get(query_id) if isinstance(query_id, (str, int)) else None
+            if task is not None:
+                task.cancel()
+        else:
+            await self._send_error(message.get('id'), 'invalid_message', f"Unknown message type: {message_type}")
+
+    async def _start_query(self, message):
+        query_id = message.get('id')
+        query = message.get('query')
+
+        if self.require_authentication and not (self.user and self.user.is_authenticated):
+            await self._send_error(query_id, 'unauthenticated', "Authentication credentials were not provided.")
+            return
+        if not isinstance(query_id, (str, int)) or isinstance(query_id, bool):
+            await self._send_error(None, 'invalid_message', "Queries need a string or integer 'id'.")
+            return
+        if not isinstance(query, str) or not query.strip():
+            await self._send_error(query_id, 'invalid_query', "Query is required.")
+            return
+        if len(query) > self.max_query_length:
+            await self._send_error(query_id, 'invalid_query', f"Query is longer than {self.max_query_length} characters.")
+            return
+        if query_id in self.in_flight:
+            await self._send_error(query_id, 'duplicate_id', "A query with this id is already in flight.")
+            return
+        if len(self.in_flight) >= self.max_in_flight:
+            await self._send_error(query_id, 'too_many_in_flight', f"At most {self.max_in_flight} queries may be in flight.")
+            return
+        if not self._allow_query():
+            await self._send_error(query_id, 'rate_limited', "Too many queries, please slow down.")
+            return
+
+        task = asyncio.create_task(self._run_query(query_id, query))
+        self.in_flight[query_id] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(query_id, None))
+
+    def _allow_query(self) -> bool:
+        """Sliding-window limit on queries accepted from this connection."""
+        now = time.monotonic()
+        while self.recent_queries and now - self.recent_queries[0] >= self.rate_window:
+            self.recent_queries.popleft()
+        if len(self.recent_queries) >= self.rate_limit:
+            return False
+        self.recent_queries.append(now)
+        return True
+
+    async def _run_query(self, query_id, query):
+        try:
+            if not ai_classifier.loaded:
+                # The first query of a lazily started worker loads the model off the event loop.
+                await ai_classifier.aload()
+            normalized_query = ai_classifier.preprocess_text(query)
+            if result_cache is not None:
+                cached = result_cache.get(normalized_query, ai_classifier.model_version)
+                if cached is not None:
+                    await self._send_frame('entities', query_id, entities=cached.get('entities', {}))
+                    await self._send_frame('classified', query_id, intent=cached.get('intent'))
+                    await self._send_frame('response', query_id, cached=True, response=cached.get('response'),
+                                           intent=cached.get('intent'), entities=cached.get('entities', {}))
+                    return
+
+            classification_result = {}
+            async for stage, payload in ai_classifier.classify_stream(query):
+                classification_result.update(payload)
+                await self._send_frame(stage, query_id, **payload)
+
+            result = make_result(classification_result, response_formatter.generate_response(classification_result))
+            if result_cache is not None and "error" not in classification_result:
+                result_cache.set(normalized_query, ai_classifier.model_version, result)
+            await self._send_frame('response', query_id, cached=False, **result)
+        except asyncio.CancelledError:
+            raise
+        except QueueFullError:
+            await self._send_error(query_id, 'busy', "The assistant is busy, please retry shortly.")
+        except Exception as e:
+            logger.exception(f"Error while handling WebSocket query {query_id!r}: {e}")
+            await self._send_error(query_id, 'internal_error', "An error occurred while processing the request.")
+
+    async def _send_frame(self, frame_type, query_id, **payload):
+        await self.send(text_data=json.dumps({'type': frame_type, 'id': query_id, **payload}))
+
+    async def _send_error(self, query_id, code, message):
+        await self._send_frame('error', query_id, code=code, error=message)
+
+    async def _authenticate(self):
+        """
+        Uses the session user set by AuthMiddlewareStack, or a JWT passed as
+        ?token=<access token> since browsers cannot set headers on WebSocket requests.
+        """
+        user = self.scope.get('user')
+        if user is not None and user.is_authenticated:
+            return user
+
+        token = parse_qs(self.scope.get('query_string', b'').decode()).get('token')
+        if not token:
+            return user
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+        from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+        authentication = JWTAuthentication()
+        try:
+            validated_token = authentication.get_validated_token(token[0])
+            return await database_sync_to_async(authentication.get_user)(validated_token)
+        except (InvalidToken, AuthenticationFailed) as e:
+            logger.warning(f"Rejected WebSocket token for {self.channel_name}: {e}")
+            return user
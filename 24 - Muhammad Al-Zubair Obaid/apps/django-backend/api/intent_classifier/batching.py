@@ -0,0 +1,188 @@
+# services/intent_classifier/batching.py
+import time
+import queue
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger('IntentClassifierService.Batching')
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the inference queue is at capacity and cannot accept more work."""
+
+
+@dataclass
+class BatchMetrics:
+    """Timing information recorded for every batch that goes through the model."""
+    batch_size: int
+    queue_wait_ms: float
+    inference_ms: float
+    finished_at: float
+
+
+@dataclass
+class _PendingItem:
+    payload: Any
+    future: Future
+    enqueued_at: float
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent inference requests into padded batches.
+
+    Requests are queued by `submit` and picked up by a single worker thread, which
+    waits until either `max_batch_size` items are available or `max_latency_ms`
+    has elapsed since the first item of the batch arrived. The whole batch is then
+    passed to `process_batch` in one call and the results are fanned back out to
+    the awaiting coroutines.
+
+    Results are delivered through `concurrent.futures.Future` objects so that the
+    batcher can be shared by callers running on different event loops (e.g. the
+    per-request loops created by `async_to_sync`).
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_batch_size: int = 32,
+                 max_latency_ms: float = 5.0, max_queue_size: int = 1024, metrics_history: int = 256,
+                 on_batch: Optional[Callable[[BatchMetrics], None]] = None, name: str = 'inference-batcher'):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.on_batch = on_batch
+        self.name = name
+
+        self._queue: "queue.Queue[_PendingItem]" = queue.Queue(maxsize=max_queue_size)
+        self._metrics: Deque[BatchMetrics] = deque(maxlen=metrics_history)
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._rejected = 0
+
+    # --- Public API ---
+
+    async def submit(self, payload: Any) -> Any:
+        """Queues a single item for batched processing and waits for its result."""
+        return await asyncio.wrap_future(self.submit_nowait(payload))
+
+    def submit_nowait(self, payload: Any) -> Future:
+        """Queues a single item and returns a future that resolves to its result."""
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait(_PendingItem(payload, future, time.perf_counter()))
+        except queue.Full:
+            self._rejected += 1
+            raise QueueFullError(f"Inference queue is full ({self.max_queue_size} pending requests).")
+        return future
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the worker thread after draining the items already queued."""
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        """Summarises the recently processed batches."""
+        batches = list(self._metrics)
+        summary = {
+            "batches": len(batches),
+            "queue_depth": self.queue_depth,
+            "rejected": self._rejected,
+            "max_batch_size": self.max_batch_size,
+            "max_latency_ms": self.max_latency * 1000.0,
+        }
+        if batches:
+            summary.update({
+                "avg_batch_size": sum(b.batch_size for b in batches) / len(batches),
+                "avg_queue_wait_ms": sum(b.queue_wait_ms for b in batches) / len(batches),
+                "avg_inference_ms": sum(b.inference_ms for b in batches) / len(batches),
+            })
+        return summary
+
+    # --- Worker ---
+
+    def _ensure_started(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop_event.clear()
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self) -> List[_PendingItem]:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = first.enqueued_at + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        logger.info(f"Batching worker '{self.name}' started (max_batch_size={self.max_batch_size}, "
+                    f"max_latency_ms={self.max_latency * 1000.0:.1f}).")
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            if batch:
+                self._process(batch)
+        logger.info(f"Batching worker '{self.name}' stopped.")
+
+    def _process(self, batch: List[_PendingItem]):
+        # Skip items whose caller has already gone away.
+        batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started_at = time.perf_counter()
+        try:
+            results = self.process_batch([item.payload for item in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} inputs.")
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} items failed: {e}")
+            for item in batch:
+                item.future.set_exception(e)
+            return
+        finished_at = time.perf_counter()
+
+        for item, result in zip(batch, results):
+            item.future.set_result(result)
+
+        metrics = BatchMetrics(
+            batch_size=len(batch),
+            queue_wait_ms=(started_at - min(item.enqueued_at for item in batch)) * 1000.0,
+            inference_ms=(finished_at - started_at) * 1000.0,
+            finished_at=time.time(),
+        )
+        self._metrics.append(metrics)
+        logger.debug(f"Processed batch of {metrics.batch_size} (queue wait {metrics.queue_wait_ms:.2f}ms, "
+                     f"inference {metrics.inference_ms:.2f}ms)")
+        if self.on_batch is not None:
+            try:
+                self.on_batch(metrics)
+            except Exception as e:
+                logger.error(f"Batch metrics callback failed: {e}")
@@ -0,0 +1,213 @@
+# services/intent_classifier/benchmarks.py
+"""
+Micro-benchmarks for the classifier's text-processing hot paths.
+
+Run from the django-backend directory:
+    python api/intent_classifier/benchmarks.py entities --apps 1000
+    python api/intent_classifier/benchmarks.py normalizer --queries 5000
+"""
+import os
+import re
+import json
+import random
+import argparse
+import timeit
+import unicodedata
+from typing import Any, Dict, List
+
+try:
+    from .entity_matcher import EntityMatcher
+    from .normalizer import TextNormalizer
+except ImportError:  # Run as a script
+    from entity_matcher import EntityMatcher
+    from normalizer import TextNormalizer
+
+DEFAULT_CONFIG_DIR = './config/ai'
+
+
+# --- Reference implementations (the pre-optimisation code paths) ---
+
+def legacy_extract_entities(text_lower: str, apps_config: Dict, envs_config: Dict) -> Dict[str, Any]:
+    """The original per-alias regex loop from MultilingualIntentClassifier._extract_entities."""
+    entities = {'apps': [], 'environment': None}
+
+    for app_info in apps_config.get('applications', []):
+        for alias in app_info.get('aliases', []):
+            if re.search(r'\b' + re.escape(alias) + r'\b', text_lower):
+                if app_info['id'] not in entities['apps']:
+                    entities['apps'].append(app_info['id'])
+
+    for env_info in envs_config.get('environments', []):
+        if env_info['id'].replace('_', ' ') in text_lower:
+            entities['environment'] = env_info['id']
+            for app_id in env_info.get('apps', []):
+                if app_id not in entities['apps']:
+                    entities['apps'].append(app_id)
+            break
+    return entities
+
+
+def legacy_detect_language(text: str) -> str:
+    """The original MultilingualIntentClassifier.detect_language."""
+    if not text:
+        return 'en'
+    arabic_chars = len(re.findall(r'[\u0600-\u06FF]', text))
+    total_chars = len(re.findall(r'\w', text))
+    return 'ar' if total_chars > 0 and (arabic_chars / total_chars) > 0.3 else 'en'
+
+
+def legacy_preprocess_text(text: str) -> str:
+    """The original MultilingualIntentClassifier.preprocess_text."""
+    text = text.lower()
+    text = unicodedata.normalize('NFKC', text)
+
+    # Arabic-specific normalization
+    if legacy_detect_language(text) == 'ar':
+        text = re.sub(r'[\u064B-\u0652\u0670\u0640]', '', text)  # Remove diacritics
+        text = text.replace('أ', 'ا').replace('إ', 'ا').replace('آ', 'ا')
+        text = text.replace('ى', 'ي').replace('ة', 'ه')
+
+    text = re.sub(r'http[s]?://\S+', '', text)
+    text = re.sub(r'\S+@\S+', '', text)
+    text = re.sub(r'[^\w\s\u0600-\u06FF-]', ' ', text)  # Keep alphanumeric, space, arabic, hyphen
+    text = ' '.join(text.split())
+    return text.strip()
+
+
+# --- Corpus helpers ---
+
+def _load_config(config_dir: str, file_name: str) -> Dict:
+    with open(os.path.join(config_dir, file_name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def synthesize_apps_config(apps_config: Dict, total_apps: int, seed: int = 42) -> Dict:
+    """Pads the real apps config with synthetic applications to simulate a large catalogue."""
+    rng = random.Random(seed)
+    applications = list(apps_config.get('applications', []))
+    for index in range(len(applications), total_apps):
+        name = f"tool{index}"
+        aliases = [name, f"{name} studio", f"{rng.choice(['super', 'open', 'easy'])} {name}"]
+        applications.append({'id': f"Vendor.{name.title()}", 'aliases': aliases})
+    return {'applications': applications}
+
+
+def sample_queries(apps_config: Dict, envs_config: Dict, count: int, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+    templates = ["install {} please", "ثبت {} على جهازي", "how do i update {}", "setup {} for me",
+                 "i need help with my laptop", "جهز لي بيئة {}"]
+    aliases = [alias for app in apps_config['applications'] for alias in app['aliases']]
+    env_names = [env['id'].replace('_', ' ') for env in envs_config.get('environments', [])]
+    queries = []
+    for _ in range(count):
+        template = rng.choice(templates)
+        filler = rng.choice(env_names) if 'بيئة' in template and env_names else rng.choice(aliases)
+        queries.append(template.format(filler))
+    return queries
+
+
+def sample_user_messages(intents_config: Dict, count: int, seed: int = 42) -> List[str]:
+    """
+    Builds chat-like messages from the intent patterns: mixed casing and punctuation,
+    Arabic diacritics and tatweel, pasted links and e-mail addresses, and some repeats.
+    """
+    rng = random.Random(seed)
+    patterns = [pattern for intent in intents_config.get('intents', []) for pattern in intent['patterns']]
+    decorations = [
+        lambda p: p,
+        lambda p: p.upper(),
+        lambda p: p + "!!",
+        lambda p: p + " ؟",
+        lambda p: "Hi, " + p + " - thanks :)",
+        lambda p: p + " see https://support.example.com/kb/123?lang=ar",
+        lambda p: p + " my email is user.name@example.com",
+        lambda p: p.replace('ا', 'أ', 1).replace('ي', 'ى', 1),
+        lambda p: 'ـ'.join(p.split(' ', 1)) + ' \u064e\u0651',
+        lambda p: "  " + p + "\t\n",
+    ]
+    messages = []
+    for _ in range(count):
+        if messages and rng.random() < 0.2:
+            messages.append(rng.choice(messages))
+        else:
+            messages.append(rng.choice(decorations)(rng.choice(patterns)))
+    return messages
+
+
+# --- Benchmarks ---
+
+def bench_entities(config_dir: str, total_apps: int, queries: int, repeat: int):
+    apps_config = synthesize_apps_config(_load_config(config_dir, 'apps.json'), total_apps)
+    envs_config = _load_config(config_dir, 'environments.json')
+    texts = sample_queries(apps_config, envs_config, queries)
+
+    build_time = timeit.timeit(lambda: EntityMatcher(apps_config, envs_config), number=1)
+    matcher = EntityMatcher(apps_config, envs_config)
+
+    mismatches = [t for t in texts if matcher.extract(t) != legacy_extract_entities(t, apps_config, envs_config)]
+    if mismatches:
+        print(f"WARNING: {len(mismatches)} results differ from the legacy loop, e.g. {mismatches[0]!r}")
+
+    legacy = min(timeit.repeat(lambda: [legacy_extract_entities(t, apps_config, envs_config) for t in texts],
+                               number=1, repeat=repeat))
+    compiled = min(timeit.repeat(lambda: [matcher.extract(t) for t in texts], number=1, repeat=repeat))
+
+    alias_count = sum(len(app['aliases']) for app in apps_config['applications'])
+    print(f"apps={len(apps_config['applications'])} aliases={alias_count} queries={len(texts)}")
+    print(f"matcher build:          {build_time * 1000:10.2f} ms (once per config load)")
+    print(f"legacy regex loop:      {legacy / len(texts) * 1e6:10.1f} us/query")
+    print(f"compiled automaton:     {compiled / len(texts) * 1e6:10.1f} us/query")
+    print(f"speedup:                {legacy / compiled:10.1f}x")
+
+
+def bench_normalizer(config_dir: str, queries: int, repeat: int):
+    messages = sample_user_messages(_load_config(config_dir, 'intents.json'), queries)
+    normalizer = TextNormalizer()
+
+    mismatches = [m for m in messages if normalizer.normalize(m).text != legacy_preprocess_text(m)]
+    if mismatches:
+        print(f"WARNING: {len(mismatches)} results differ from legacy preprocess_text, e.g. {mismatches[0]!r}")
+
+    def legacy_request(message):
+        # What classify() used to do per request: preprocess twice and detect the language twice.
+        legacy_preprocess_text(message)
+        legacy_detect_language(message)
+        legacy_preprocess_text(message)
+
+    def normalizer_request(message):
+        normalizer.normalize(message)
+
+    def uncached_request(message):
+        normalizer._normalize(message)
+
+    legacy = min(timeit.repeat(lambda: [legacy_request(m) for m in messages], number=1, repeat=repeat))
+    uncached = min(timeit.repeat(lambda: [uncached_request(m) for m in messages], number=1, repeat=repeat))
+    normalizer.clear_cache()
+    cached = min(timeit.repeat(lambda: [normalizer_request(m) for m in messages], number=1, repeat=repeat))
+
+    arabic = sum(legacy_detect_language(m) == 'ar' for m in messages)
+    print(f"messages={len(messages)} arabic={arabic} unique={len(set(messages))}")
+    print(f"legacy (2x preprocess + detect):  {legacy / len(messages) * 1e6:8.2f} us/request")
+    print(f"normalizer, single pass:          {uncached / len(messages) * 1e6:8.2f} us/request")
+    print(f"normalizer, memoized:             {cached / len(messages) * 1e6:8.2f} us/request")
+    print(f"speedup (single pass / memoized): {legacy / uncached:8.1f}x / {legacy / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark classifier text-processing paths.")
+    parser.add_argument("--config-dir", default=DEFAULT_CONFIG_DIR, help="Directory containing the AI config files.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (the best run is reported).")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    entities_parser = subparsers.add_parser("entities", help="Alias automaton vs. the per-alias regex loop.")
+    entities_parser.add_argument("--apps", type=int, default=1000, help="Total applications in the synthetic config.")
+    entities_parser.add_argument("--queries", type=int, default=100, help="Number of sample queries.")
+
+    normalizer_parser = subparsers.add_parser("normalizer", help="TextNormalizer vs. the original preprocessing.")
+    normalizer_parser.add_argument("--queries", type=int, default=5000, help="Number of sample messages.")
+
+    args = parser.parse_args()
+    if args.benchmark == "entities":
+        bench_entities(args.config_dir, args.apps, args.queries, args.repeat)
+    elif args.benchmark == "normalizer":
+        bench_normalizer(args.config_dir, args.queries, args.repeat)
@@ -1,12 +1,13 @@
 # services/intent_classifier/classifier.py
 import os
-import re
+import shutil
 import json
+import hashlib
 import logging
-import unicodedata
+import time
 from datetime import datetime
 from os.path import exists
-from typing import Dict, List, Any, Optional, Tuple
+from typing import AsyncIterator, Callable, Dict, List, Any, Optional, Tuple
 
 import numpy as np
 import tensorflow as tf
@@ -14,18 +15,41 @@ from transformers import TFAutoModelForSequenceClassification, AutoTokenizer
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 
-# --- Logging Configuration ---
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'./logs/classifier_{datetime.now().strftime("%Y%m%d")}.log'),
-        logging.StreamHandler()
-    ]
-)
+try:
+    from .batching import MicroBatcher
+    from .data_pipeline import ThroughputCallback, build_dataset, load_tokenized_examples
+    from .entity_matcher import EntityMatcher
+    from .normalizer import NormalizedText, TextNormalizer
+    from .responses import ResponseFormatter  # noqa: F401  (re-exported for existing imports)
+    from .serving import DEFAULT_BUCKETS, SERVING_DIR_NAME, ServingModel, export_serving_model, has_serving_artifact
+except ImportError:  # Imported as a top-level module by run_training.py
+    from batching import MicroBatcher
+    from data_pipeline import ThroughputCallback, build_dataset, load_tokenized_examples
+    from entity_matcher import EntityMatcher
+    from normalizer import NormalizedText, TextNormalizer
+    from responses import ResponseFormatter  # noqa: F401  (re-exported for existing imports)
+    from serving import DEFAULT_BUCKETS, SERVING_DIR_NAME, ServingModel, export_serving_model, has_serving_artifact
+
 logger = logging.getLogger('IntentClassifierService')
 
 
+# --- Logging Configuration ---
+def configure_logging(log_dir: str = './logs', level: int = logging.DEBUG):
+    """
+    Sends log output to the console and a dated file in `log_dir`. Called by the
+    command-line scripts; under Django, logging is left to the project settings.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(log_dir, f'classifier_{datetime.now().strftime("%Y%m%d")}.log')),
+            logging.StreamHandler()
+        ]
+    )
+
+
 # --- Singleton Metaclass for Model Loading ---
 class SingletonMeta(type):
     """
@@ -49,13 +73,22 @@ class MultilingualIntentClassifier(metaclass=SingletonMeta):
     """
 
     def __init__(self, model_name: str = 'bert-base-multilingual-cased', model_dir: str = './models/intent_classifier',
-                 config_dir: str = './config/ai'):
+                 config_dir: str = './config/ai', max_batch_size: int = 32, max_batch_latency_ms: float = 5.0,
+                 max_queue_size: int = 1024, serving_backend: str = 'auto'):
         logger.info(f"Initializing classifier with model '{model_name}'...")
         self.model_name = model_name
         self.model_dir = model_dir
         self.config_dir = config_dir
         self.tokenizer = None
         self.model = None
+        # 'auto' | 'tflite' | 'saved_model' use an exported serving artifact when present; 'eager' never does.
+        self.serving_backend = serving_backend
+        self.serving_model = None
+        # Identifies the weights currently in use; changes whenever the model is saved or reloaded.
+        self.model_version = None
+        self._model_listeners: List[Callable[[], None]] = []
+        # Optional callable(metric_name, value) that receives per-request timings.
+        self.metrics_sink: Optional[Callable[[str, float], None]] = None
         self.label_encoder = LabelEncoder()
         self.max_length = 128
         self.num_labels = 0
@@ -66,6 +99,12 @@ class MultilingualIntentClassifier(metaclass=SingletonMeta):
         self._intents_config = None
         self._apps_config = None
         self._envs_config = None
+        self._entity_matcher = None
+        self.normalizer = TextNormalizer()
+
+        # Concurrent classify() calls are coalesced into batched forward passes on a worker thread.
+        self.batcher = MicroBatcher(self._predict_batch, max_batch_size=max_batch_size,
+                                    max_latency_ms=max_batch_latency_ms, max_queue_size=max_queue_size)
 
         # Ensure directories exist
         os.makedirs(self.model_dir, exist_ok=True)
@@ -108,73 +147,47 @@ class MultilingualIntentClassifier(metaclass=SingletonMeta):
             self._envs_config = self._load_json_config('environments.json')
         return self._envs_config
 
+    @property
+    def entity_matcher(self) -> EntityMatcher:
+        """Alias automaton compiled from the current apps/environments configs."""
+        if self._entity_matcher is None:
+            self._entity_matcher = EntityMatcher(self.apps_config, self.envs_config)
+        return self._entity_matcher
+
+    def reload_configs(self):
+        """Drops the cached configs so they, and the entity matcher, are rebuilt from disk on next use."""
+        self._intents_config = None
+        self._apps_config = None
+        self._envs_config = None
+        self._entity_matcher = None
+
     def detect_language(self, text: str) -> str:
         """Simple language detection based on Arabic character ratio."""
-        if not text:
-            return 'en'
-        arabic_chars = len(re.findall(r'[\u0600-\u06FF]', text))
-        total_chars = len(re.findall(r'\w', text))
-        return 'ar' if total_chars > 0 and (arabic_chars / total_chars) > 0.3 else 'en'
+        return self.normalizer.detect_language(text)
+
+    def normalize(self, text: str) -> NormalizedText:
+        """Normalized text, language and token spans in one (memoized) pass."""
+        return self.normalizer.normalize(text)
 
     def preprocess_text(self, text: str) -> str:
         """Cleans and normalizes text for both English and Arabic."""
-        text = text.lower()
-        text = unicodedata.normalize('NFKC', text)
-
-        # Arabic-specific normalization
-        if self.detect_language(text) == 'ar':
-            text = re.sub(r'[\u064B-\u0652\u0670\u0640]', '', text)  # Remove diacritics
-            text = text.replace('أ', 'ا').replace('إ', 'ا').replace('آ', 'ا')
-            text = text.replace('ى', 'ي').replace('ة', 'ه')
-
-        text = re.sub(r'http[s]?://\S+', '', text)
-        text = re.sub(r'\S+@\S+', '', text)
-        text = re.sub(r'[^\w\s\u0600-\u06FF-]', ' ', text)  # Keep alphanumeric, space, arabic, hyphen
-        text = ' '.join(text.split())
-        return text.strip()
-
-    def _extract_entities(self, text: str) -> Dict[str, Any]:
-        """Extracts applications and environments from text using config files."""
-        entities = {'apps': [], 'environment': None}
-        text_lower = self.preprocess_text(text)
-
-        # Extract apps
-        for app_info in self.apps_config.get('applications', []):
-            for alias in app_info.get('aliases', []):
-                if re.search(r'\b' + re.escape(alias) + r'\b', text_lower):
-                    if app_info['id'] not in entities['apps']:
-                        entities['apps'].append(app_info['id'])
-
-        # Extract environment (simple keyword matching)
-        for env_info in self.envs_config.get('environments', []):
-            if env_info['id'].replace('_', ' ') in text_lower:
-                entities['environment'] = env_info['id']
-                for app_id in env_info.get('apps', []):
-                    if app_id not in entities['apps']:
-                        entities['apps'].append(app_id)
-                break
-        return entities
-
-    def load_training_data(self) -> Tuple[List[str], List[str]]:
-        """Loads and preprocesses training data from intents.json."""
-        logger.info("Loading training data...")
-        texts, labels = [], []
-        for intent_data in self.intents_config.get('intents', []):
-            intent = intent_data['intent']
-            for pattern in intent_data['patterns']:
-                processed_text = self.preprocess_text(pattern)
-                if processed_text:
-                    texts.append(processed_text)
-                    labels.append(intent)
-        logger.info(f"Loaded {len(texts)} patterns for {len(set(labels))} intents.")
-        return texts, labels
-
-    def train(self, epochs: int = 10, batch_size: int = 16):
-        """Trains and saves the intent classification model."""
+        return self.normalizer.normalize(text).text
+
+    def train(self, epochs: int = 10, batch_size: int = 16, mixed_precision: bool = False,
+              cache_dir: Optional[str] = None):
+        """
+        Trains and saves the intent classification model.
+        Tokenized patterns are cached per intent under `cache_dir` (default: next to the
+        model directory), so retraining after a small intents.json edit only re-tokenizes
+        the intents that changed.
+        """
         logger.info("--- Starting Model Training ---")
-        texts, labels = self.load_training_data()
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(self.model_dir)), 'tokenized_cache')
+        sequences, labels = load_tokenized_examples(self.intents_config, self.preprocess_text, self.tokenizer,
+                                                    self.max_length, cache_dir)
 
-        if not texts:
+        if not sequences:
             logger.error("No training data loaded. Aborting training.")
             return
 
@@ -183,36 +196,39 @@ class MultilingualIntentClassifier(metaclass=SingletonMeta):
         self.num_labels = len(self.label_encoder.classes_)
 
         # Build and compile model
-        self.model = TFAutoModelForSequenceClassification.from_pretrained(self.model_name, num_labels=self.num_labels)
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-
-        optimizer = tf.keras.optimizers.Adam(learning_rate=3e-5)
-        # FIX: Use a standard Keras loss function for compilation.
-        loss = tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True)
-        self.model.compile(optimizer=optimizer, loss=loss, metrics=['accuracy'])
-
-        # Prepare datasets
-        X_train, X_val, y_train, y_val = train_test_split(texts, encoded_labels, test_size=0.2, random_state=42,
-                                                          stratify=encoded_labels)
-
-        train_encodings = self.tokenizer(X_train, truncation=True, padding=True, max_length=self.max_length)
-        val_encodings = self.tokenizer(X_val, truncation=True, padding=True, max_length=self.max_length)
-
-        train_dataset = tf.data.Dataset.from_tensor_slices((dict(train_encodings), y_train)).shuffle(1000).batch(
-            batch_size)
-        val_dataset = tf.data.Dataset.from_tensor_slices((dict(val_encodings), y_val)).batch(batch_size)
-
-        # Setup callbacks
-        callbacks = [
-            tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)
-        ]
-
-        # Train the model
-        logger.info("Fitting the model...")
-        logger.debug("Parameters: ", train_dataset, val_dataset, train_encodings, callbacks)
-        self.model.fit(train_dataset, validation_data=val_dataset, epochs=epochs, callbacks=callbacks)
+        previous_policy = tf.keras.mixed_precision.global_policy()
+        if mixed_precision:
+            # Compute in float16 while keeping float32 variables; only worthwhile on GPUs with tensor cores.
+            tf.keras.mixed_precision.set_global_policy('mixed_float16')
+        try:
+            self.model = TFAutoModelForSequenceClassification.from_pretrained(self.model_name, num_labels=self.num_labels)
+
+            optimizer = tf.keras.optimizers.Adam(learning_rate=3e-5)
+            # FIX: Use a standard Keras loss function for compilation.
+            loss = tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True)
+            self.model.compile(optimizer=optimizer, loss=loss, metrics=['accuracy'])
+
+            # Prepare datasets: batches are grouped by length and padded only to their longest sequence.
+            X_train, X_val, y_train, y_val = train_test_split(sequences, encoded_labels, test_size=0.2,
+                                                              random_state=42, stratify=encoded_labels)
+            pad_token_id = self.tokenizer.pad_token_id or 0
+            train_dataset = build_dataset(X_train, y_train, batch_size, pad_token_id=pad_token_id, shuffle=True)
+            val_dataset = build_dataset(X_val, y_val, batch_size, pad_token_id=pad_token_id)
+
+            # Setup callbacks
+            callbacks = [
+                ThroughputCallback(examples_per_epoch=len(X_train)),
+                tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)
+            ]
+
+            # Train the model
+            logger.info("Fitting the model...")
+            self.model.fit(train_dataset, validation_data=val_dataset, epochs=epochs, callbacks=callbacks)
+        finally:
+            tf.keras.mixed_precision.set_global_policy(previous_policy)
 
         # Save the fine-tuned model and set the ready flag
+        self.serving_model = None
         self.save_model()
         self.is_ready = True
         logger.info("--- Model Training Complete ---")
@@ -220,11 +236,17 @@ class MultilingualIntentClassifier(metaclass=SingletonMeta):
     def save_model(self):
         """Saves the model, tokenizer, and label encoder."""
         logger.info(f"Saving model to {self.model_dir}...")
+        serving_dir = os.path.join(self.model_dir, SERVING_DIR_NAME)
+        if os.path.exists(serving_dir):
+            # The exported artifact was traced from the previous weights.
+            logger.warning(f"Removing stale serving artifact in {serving_dir}. Re-run run_export.py to rebuild it.")
+            shutil.rmtree(serving_dir)
         self.model.save_pretrained(self.model_dir)
         self.tokenizer.save_pretrained(self.model_dir)
         with open(os.path.join(self.model_dir, 'label_encoder.json'), 'w') as f:
             json.dump({'classes': self.label_encoder.classes_.tolist()}, f)
         logger.info("Model saved successfully.")
+        self._on_model_changed()
 
     def load_model_and_tokenizer(self):
 
@@ -237,8 +259,16 @@ class MultilingualIntentClassifier(metaclass=SingletonMeta):
             return
 
         logger.info(f"Loading model from {self.model_dir}...")
+        serving_dir = os.path.join(self.model_dir, SERVING_DIR_NAME)
         try:
-            self.model = TFAutoModelForSequenceClassification.from_pretrained(self.model_dir)
+            if self.serving_backend != 'eager' and has_serving_artifact(serving_dir):
+                # The exported graph replaces the full Keras model, which is never loaded.
+                self.serving_model = ServingModel.load(serving_dir, backend=self.serving_backend)
+                self.model = None
+                logger.info(f"Using exported '{self.serving_model.backend}' serving artifact from {serving_dir}.")
+            else:
+                self.model = TFAutoModelForSequenceClassification.from_pretrained(self.model_dir)
+                self.serving_model = None
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
 
             with open(os.path.join(self.model_dir, 'label_encoder.json'), 'r') as f:
@@ -247,100 +277,138 @@ class MultilingualIntentClassifier(metaclass=SingletonMeta):
             self.num_labels = len(self.label_encoder.classes_)
             self.is_ready = True
             logger.info("Model, tokenizer, and label encoder loaded successfully.")
+            self._on_model_changed()
         except Exception as e:
             logger.error(f"Failed to load model from {self.model_dir}: {e}")
             self.is_ready = False
 
+    def add_model_listener(self, callback: Callable[[], None]):
+        """Registers a callback invoked whenever the model is saved or (re)loaded, e.g. to drop cached results."""
+        self._model_listeners.append(callback)
+
+    def _compute_model_version(self) -> str:
+        """Fingerprints the model directory so every worker loading the same files agrees on the version."""
+        digest = hashlib.sha1()
+        for root, dirs, files in os.walk(self.model_dir):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, self.model_dir)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        if self.serving_model is not None:
+            digest.update(self.serving_model.backend.encode())
+        return digest.hexdigest()[:12]
+
+    def _on_model_changed(self):
+        self.model_version = self._compute_model_version()
+        logger.info(f"Model version is now '{self.model_version}'.")
+        for callback in self._model_listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Model change listener failed: {e}")
+
+    def export_serving_model(self, buckets=DEFAULT_BUCKETS, quantize: bool = False):
+        """Exports the loaded model as a graph-compiled serving artifact inside the model directory."""
+        if self.model is None:
+            raise RuntimeError("The full model must be loaded (serving_backend='eager') to export it.")
+        buckets = sorted(set(buckets) | {self.max_length})
+        export_serving_model(self.model, os.path.join(self.model_dir, SERVING_DIR_NAME),
+                             buckets=[length for length in buckets if length <= self.max_length],
+                             quantize=quantize)
+
+    def _predict_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """
+        Runs a single padded forward pass over a batch of preprocessed texts.
+        Called from the batching worker thread; returns (intent, confidence) per text.
+        """
+        tokenize_start = time.perf_counter()
+        if self.serving_model is not None:
+            inputs = self.tokenizer(texts, return_tensors="np", truncation=True, padding=True,
+                                    max_length=min(self.max_length, self.serving_model.max_length))
+            self._record_metric('tokenizer_time', (time.perf_counter() - tokenize_start) * 1000)
+            logits = self.serving_model.predict_logits(inputs['input_ids'], inputs['attention_mask'],
+                                                       pad_token_id=self.tokenizer.pad_token_id or 0)
+        else:
+            inputs = self.tokenizer(texts, return_tensors="tf", truncation=True, padding=True,
+                                    max_length=self.max_length)
+            self._record_metric('tokenizer_time', (time.perf_counter() - tokenize_start) * 1000)
+            logits = self.model(inputs).logits
+        probabilities = tf.nn.softmax(logits, axis=-1).numpy()
+
+        top_indices = np.argmax(probabilities, axis=-1)
+        intents = self.label_encoder.inverse_transform(top_indices)
+        return [(intent, float(probabilities[row, index]))
+                for row, (intent, index) in enumerate(zip(intents, top_indices))]
+
+    def warmup(self):
+        """Runs one prediction so the first real request does not pay for graph building."""
+        if not self.is_ready:
+            return
+        started_at = time.perf_counter()
+        self._predict_batch([self.preprocess_text("warmup")])
+        logger.info(f"Warmup prediction finished in {(time.perf_counter() - started_at) * 1000:.1f}ms.")
+
+    def _record_metric(self, metric_name: str, value: float):
+        if self.metrics_sink is not None:
+            try:
+                self.metrics_sink(metric_name, value)
+            except Exception as e:
+                logger.error(f"Failed to record metric '{metric_name}': {e}")
 
     async def classify(self, text: str) -> Dict[str, Any]:
         """
         Performs intent classification on the input text.
         Returns a dictionary with intent, confidence, and extracted entities.
         """
+        result = {}
+        async for _, payload in self.classify_stream(text):
+            result.update(payload)
+        if "error" in result:
+            return result
+
+        return {
+            "intent": result["intent"],
+            "confidence": result["confidence"],
+            "language": result["language"],
+            "entities": result["entities"]
+        }
+
+    async def classify_stream(self, text: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Classifies the input text in stages, yielding (stage, payload) pairs as soon as
+        each part is known: 'entities' (language and entities, no model needed) and then
+        'classified' (intent and confidence, once the batched prediction returns).
+        """
         if not self.is_ready:
             logger.error("Model is not ready. Cannot perform classification.")
-            return {
+            yield "classified", {
                 "error": "Model not loaded or ready",
                 "intent": "unknown",
                 "confidence": 0.0,
                 "language": "en",
                 "entities": {}
             }
+            return
 
         start_time = datetime.now()
 
-        # 1. Preprocess and Language Detection
-        processed_text = self.preprocess_text(text)
-        language = self.detect_language(text)
-
-        # 2. Tokenize
-        inputs = self.tokenizer(processed_text, return_tensors="tf", truncation=True, padding=True,
-                                max_length=self.max_length)
+        # 1. Preprocess and Language Detection (one pass, shared by every later step)
+        normalized = self.normalize(text)
 
-        # 3. Predict
-        logits = self.model(inputs).logits
-        probabilities = tf.nn.softmax(logits, axis=-1).numpy()[0]
+        # 2. Extract entities
+        yield "entities", {"language": normalized.language, "entities": self.entity_matcher.extract(normalized.text)}
 
-        # 4. Get top prediction
-        top_index = np.argmax(probabilities)
-        confidence = float(probabilities[top_index])
-        intent = self.label_encoder.inverse_transform([top_index])[0]
+        # 3. Tokenize and predict as part of a batch with other in-flight requests
+        intent, confidence = await self.batcher.submit(normalized.text)
 
-        # 5. Extract entities
-        entities = self._extract_entities(text)
-
-        # 6. Confidence Threshold Check
+        # 4. Confidence Threshold Check
         if confidence < 0.80:
             logger.warning(f"Low confidence ({confidence:.2f}) for intent '{intent}'. Original text: '{text}'")
 
+        # Timed here rather than in classify() so WebSocket queries are measured too
         inference_time = (datetime.now() - start_time).total_seconds() * 1000
         logger.info(f"Classified '{text}' as '{intent}' with confidence {confidence:.2f} in {inference_time:.2f}ms")
+        self._record_metric('inference_time', inference_time)
 
-        return {
-            "intent": intent,
-            "confidence": confidence,
-            "language": language,
-            "entities": entities
-        }
-
-
-class ResponseFormatter:
-    """
-    Generates user-friendly chat responses based on classification results
-    and predefined templates.
-    """
-    def __init__(self, config_path: str = './config/ai/responses.json'):
-        logger.info(f"Initializing ResponseFormatter with config: {config_path}")
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                self.responses = json.load(f)
-        except Exception as e:
-            logger.error(f"Failed to load response templates: {e}")
-            self.responses = {}
-
-    def generate_response(self, classification_result: dict) -> str:
-        """
-        Formats a response string using templates.
-        """
-        intent = classification_result.get('intent', 'unknown')
-        lang = classification_result.get('language', 'en')
-        entities = classification_result.get('entities', {})
-
-        lang_responses = self.responses.get(lang, self.responses.get('en', {}))
-        intent_responses = lang_responses.get(intent)
-
-        if not intent_responses:
-            return lang_responses.get('unknown', {}).get('not_found', "I'm not sure how to help with that.")
-
-        # Correctly check if an automated solution exists for the detected intent.
-        is_automated = intent in ["app_installation", "environment_setup", "hardware_info"]
-        response_key = 'found' if is_automated else 'not_found'
-        
-        template = intent_responses.get(response_key, "Processing your request.")
-
-        try:
-            app_names = ", ".join(entities.get('apps', []))
-            env_name = (entities.get('environment') or '').replace('_', ' ').title()
-            return template.format(apps=app_names, environment=env_name)
-        except KeyError:
-            return template.replace("{apps}", "").replace("{environment}", "")
\ No newline at end of file
+        yield "classified", {"intent": intent, "confidence": confidence}
@@ -0,0 +1,131 @@
+# services/intent_classifier/data_pipeline.py
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import tensorflow as tf
+
+logger = logging.getLogger('IntentClassifierService.DataPipeline')
+
+DEFAULT_BUCKET_BOUNDARIES = (16, 32, 64)
+
+
+def tokenizer_fingerprint(tokenizer, max_length: int) -> str:
+    """Identifies everything about the tokenizer that affects the produced token ids."""
+    description = {
+        'class': type(tokenizer).__name__,
+        'name_or_path': getattr(tokenizer, 'name_or_path', ''),
+        'vocab_size': len(tokenizer),
+        'do_lower_case': getattr(tokenizer, 'do_lower_case', None),
+        'max_length': max_length,
+    }
+    return hashlib.sha1(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class TokenizedShardCache:
+    """
+    On-disk cache of tokenized training data, one JSON shard per intent.
+
+    Shards live under `<cache_dir>/<tokenizer fingerprint>/` and are named after a hash
+    of the intent's preprocessed patterns, so editing one intent only re-tokenizes that
+    intent and switching tokenizers never reads incompatible ids. Sequences are stored
+    unpadded; padding happens per batch in the tf.data pipeline.
+    """
+
+    def __init__(self, cache_dir: str, tokenizer, max_length: int):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.shard_dir = os.path.join(cache_dir, tokenizer_fingerprint(tokenizer, max_length))
+        os.makedirs(self.shard_dir, exist_ok=True)
+
+    def _shard_path(self, intent: str, texts: Sequence[str]) -> str:
+        digest = hashlib.sha1(json.dumps([intent, list(texts)], ensure_ascii=False).encode('utf-8')).hexdigest()
+        return os.path.join(self.shard_dir, f"{digest}.json")
+
+    def get_or_tokenize(self, intent: str, texts: Sequence[str]) -> Tuple[List[List[int]], bool]:
+        """Returns (input_ids per text, whether the shard came from the cache)."""
+        path = self._shard_path(intent, texts)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)['input_ids'], True
+
+        input_ids = self.tokenizer(list(texts), truncation=True, max_length=self.max_length)['input_ids']
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'intent': intent, 'input_ids': input_ids}, f)
+        os.replace(tmp_path, path)
+        return input_ids, False
+
+
+def load_tokenized_examples(intents_config: Dict, preprocess: Callable[[str], str], tokenizer,
+                            max_length: int, cache_dir: str) -> Tuple[List[List[int]], List[str]]:
+    """Preprocesses and tokenizes every intent pattern, reusing cached shards where possible."""
+    cache = TokenizedShardCache(cache_dir, tokenizer, max_length)
+    sequences, labels = [], []
+    reused = 0
+    intents = intents_config.get('intents', [])
+    for intent_data in intents:
+        intent = intent_data['intent']
+        texts = [text for text in (preprocess(pattern) for pattern in intent_data['patterns']) if text]
+        if not texts:
+            continue
+        input_ids, cached = cache.get_or_tokenize(intent, texts)
+        reused += cached
+        sequences.extend(input_ids)
+        labels.extend([intent] * len(input_ids))
+    logger.info(f"Loaded {len(sequences)} tokenized patterns for {len(set(labels))} intents "
+                f"({reused}/{len(intents)} shards reused from {cache.shard_dir}).")
+    return sequences, labels
+
+
+def build_dataset(sequences: Sequence[List[int]], labels: Sequence[int], batch_size: int, pad_token_id: int = 0,
+                  bucket_boundaries: Sequence[int] = DEFAULT_BUCKET_BOUNDARIES, shuffle: bool = False,
+                  seed: int = 42) -> tf.data.Dataset:
+    """
+    Builds a batched dataset of ({'input_ids', 'attention_mask'}, label) where each
+    batch is grouped by sequence length and padded only to its own longest sequence.
+    """
+    def generate():
+        for input_ids, label in zip(sequences, labels):
+            yield {'input_ids': input_ids, 'attention_mask': [1] * len(input_ids)}, label
+
+    dataset = tf.data.Dataset.from_generator(generate, output_signature=(
+        {'input_ids': tf.TensorSpec([None], tf.int32), 'attention_mask': tf.TensorSpec([None], tf.int32)},
+        tf.TensorSpec([], tf.int64),
+    ))
+    dataset = dataset.cache()
+    if shuffle:
+        dataset = dataset.shuffle(len(sequences), seed=seed, reshuffle_each_iteration=True)
+
+    boundaries = [boundary for boundary in sorted(bucket_boundaries) if boundary > 1]
+    dataset = dataset.bucket_by_sequence_length(
+        element_length_func=lambda features, label: tf.shape(features['input_ids'])[0],
+        bucket_boundaries=boundaries,
+        bucket_batch_sizes=[batch_size] * (len(boundaries) + 1),
+        padding_values=({'input_ids': tf.constant(pad_token_id, tf.int32),
+                         'attention_mask': tf.constant(0, tf.int32)}, tf.constant(0, tf.int64)),
+    )
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """Logs training examples/sec for every epoch and adds it to the epoch logs."""
+
+    def __init__(self, examples_per_epoch: int):
+        super().__init__()
+        self.examples_per_epoch = examples_per_epoch
+        self._epoch_start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self._epoch_start
+        examples_per_sec = self.examples_per_epoch / elapsed if elapsed > 0 else 0.0
+        if logs is not None:
+            logs['examples_per_sec'] = examples_per_sec
+        logger.info(f"Epoch {epoch + 1}: {self.examples_per_epoch} examples in {elapsed:.1f}s "
+                    f"({examples_per_sec:.1f} examples/sec)")
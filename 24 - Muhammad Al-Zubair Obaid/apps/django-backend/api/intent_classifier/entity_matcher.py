@@ -0,0 +1,119 @@
+# services/intent_classifier/entity_matcher.py
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+def _is_boundary(text: str, position: int) -> bool:
+    """Mirrors the regex `\\b` assertion at `position`."""
+    before = position > 0 and _is_word_char(text[position - 1])
+    after = position < len(text) and _is_word_char(text[position])
+    return before != after
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a fixed set of phrases. Reports every
+    (possibly overlapping) occurrence of every phrase in one pass over the text.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+
+        for phrase in phrases:
+            if phrase:
+                self._insert(phrase)
+        self._build_failure_links()
+
+    def _insert(self, phrase: str):
+        state = 0
+        for ch in phrase:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][ch] = next_state
+            state = next_state
+        if phrase not in self._output[state]:
+            self._output[state].append(phrase)
+
+    def _build_failure_links(self):
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Yields (start, end, phrase) for every occurrence in `text`."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for phrase in output[state]:
+                yield index + 1 - len(phrase), index + 1, phrase
+
+
+class EntityMatcher:
+    """
+    Precompiled matcher for application aliases and environment names.
+    Built once per loaded configuration; `extract` scans the text a single time
+    and returns the same result as matching every alias with a word-bounded
+    regex and every environment name as a substring.
+    """
+
+    def __init__(self, apps_config: Dict, envs_config: Dict):
+        self.applications = apps_config.get('applications', [])
+        self.environments = envs_config.get('environments', [])
+
+        # Phrase -> indices into the config lists, so results keep the config order.
+        self._app_phrases: Dict[str, List[int]] = {}
+        for index, app_info in enumerate(self.applications):
+            for alias in app_info.get('aliases', []):
+                self._app_phrases.setdefault(alias, []).append(index)
+
+        self._env_phrases: Dict[str, List[int]] = {}
+        for index, env_info in enumerate(self.environments):
+            self._env_phrases.setdefault(env_info['id'].replace('_', ' '), []).append(index)
+
+        self._automaton = AhoCorasick(list(self._app_phrases) + list(self._env_phrases))
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """Extracts applications and environments from already preprocessed text."""
+        app_hits = set()
+        env_hits = set()
+        for start, end, phrase in self._automaton.iter_matches(text):
+            app_indices = self._app_phrases.get(phrase)
+            if app_indices and _is_boundary(text, start) and _is_boundary(text, end):
+                app_hits.update(app_indices)
+            env_indices = self._env_phrases.get(phrase)
+            if env_indices:
+                env_hits.update(env_indices)
+
+        entities = {'apps': [], 'environment': None}
+        for index in sorted(app_hits):
+            app_id = self.applications[index]['id']
+            if app_id not in entities['apps']:
+                entities['apps'].append(app_id)
+
+        if env_hits:
+            env_info = self.environments[min(env_hits)]
+            entities['environment'] = env_info['id']
+            for app_id in env_info.get('apps', []):
+                if app_id not in entities['apps']:
+                    entities['apps'].append(app_id)
+        return entities
@@ -0,0 +1,88 @@
+# services/intent_classifier/normalizer.py
+import re
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+_ARABIC_RUN_RE = re.compile(r'[\u0600-\u06FF]+')
+_WORD_RUN_RE = re.compile(r'\w+')
+_URL_RE = re.compile(r'http[s]?://\S+')
+_EMAIL_RE = re.compile(r'\S+@\S+')
+# Runs of anything but word characters, whitespace, Arabic and hyphens become one space;
+# whitespace is collapsed afterwards anyway.
+_STRIP_RE = re.compile(r'[^\w\s\u0600-\u06FF-]+')
+
+# Removes diacritics and tatweel and folds alef/yeh/teh marbuta variants in one pass.
+_ARABIC_FOLDING = str.maketrans(
+    {'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ى': 'ي', 'ة': 'ه'},
+)
+_ARABIC_FOLDING.update({code: None for code in range(0x064B, 0x0653)})
+_ARABIC_FOLDING.update({0x0670: None, 0x0640: None})
+
+
+class NormalizedText(NamedTuple):
+    text: str
+    language: str
+    # (start, end) offsets of each whitespace-separated token in `text`.
+    spans: Tuple[Tuple[int, int], ...]
+
+    @property
+    def tokens(self) -> Tuple[str, ...]:
+        return tuple(self.text[start:end] for start, end in self.spans)
+
+
+def _char_count(pattern: 're.Pattern', text: str) -> int:
+    return sum(len(run) for run in pattern.findall(text))
+
+
+class TextNormalizer:
+    """
+    Cleans and normalizes English and Arabic text for classification and entity matching.
+
+    `normalize` lowercases and NFKC-normalizes the text, detects its language, folds
+    Arabic diacritics and letter variants, strips URLs, e-mail addresses and punctuation,
+    and collapses whitespace. Results are memoized in a bounded LRU cache, so repeated
+    calls for the same request (or popular queries) are dictionary lookups.
+    """
+
+    def __init__(self, cache_size: int = 4096, arabic_threshold: float = 0.3):
+        self.arabic_threshold = arabic_threshold
+        self._cached_normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def normalize(self, text: str) -> NormalizedText:
+        return self._cached_normalize(text)
+
+    def cache_info(self):
+        return self._cached_normalize.cache_info()
+
+    def clear_cache(self):
+        self._cached_normalize.cache_clear()
+
+    def detect_language(self, text: str) -> str:
+        """'ar' when more than `arabic_threshold` of the word characters are Arabic, else 'en'."""
+        if not text:
+            return 'en'
+        total_chars = _char_count(_WORD_RUN_RE, text)
+        if total_chars == 0:
+            return 'en'
+        arabic_chars = _char_count(_ARABIC_RUN_RE, text)
+        return 'ar' if arabic_chars / total_chars > self.arabic_threshold else 'en'
+
+    def _normalize(self, text: str) -> NormalizedText:
+        text = unicodedata.normalize('NFKC', text.lower())
+        language = self.detect_language(text)
+        if language == 'ar':
+            text = text.translate(_ARABIC_FOLDING)
+
+        if '://' in text:
+            text = _URL_RE.sub('', text)
+        if '@' in text:
+            text = _EMAIL_RE.sub('', text)
+        tokens = _STRIP_RE.sub(' ', text).split()
+
+        spans = []
+        position = 0
+        for token in tokens:
+            spans.append((position, position + len(token)))
+            position += len(token) + 1
+        return NormalizedText(' '.join(tokens), language, tuple(spans))
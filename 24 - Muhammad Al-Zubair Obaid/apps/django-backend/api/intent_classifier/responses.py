@@ -0,0 +1,47 @@
+# services/intent_classifier/responses.py
+import json
+import logging
+
+logger = logging.getLogger('IntentClassifierService.Responses')
+
+
+class ResponseFormatter:
+    """
+    Generates user-friendly chat responses based on classification results
+    and predefined templates.
+    """
+    def __init__(self, config_path: str = './config/ai/responses.json'):
+        logger.info(f"Initializing ResponseFormatter with config: {config_path}")
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                self.responses = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load response templates: {e}")
+            self.responses = {}
+
+    def generate_response(self, classification_result: dict) -> str:
+        """
+        Formats a response string using templates.
+        """
+        intent = classification_result.get('intent', 'unknown')
+        lang = classification_result.get('language', 'en')
+        entities = classification_result.get('entities', {})
+
+        lang_responses = self.responses.get(lang, self.responses.get('en', {}))
+        intent_responses = lang_responses.get(intent)
+
+        if not intent_responses:
+            return lang_responses.get('unknown', {}).get('not_found', "I'm not sure how to help with that.")
+
+        # Correctly check if an automated solution exists for the detected intent.
+        is_automated = intent in ["app_installation", "environment_setup", "hardware_info"]
+        response_key = 'found' if is_automated else 'not_found'
+        
+        template = intent_responses.get(response_key, "Processing your request.")
+
+        try:
+            app_names = ", ".join(entities.get('apps', []))
+            env_name = (entities.get('environment') or '').replace('_', ' ').title()
+            return template.format(apps=app_names, environment=env_name)
+        except KeyError:
+            return template.replace("{apps}", "").replace("{environment}", "")
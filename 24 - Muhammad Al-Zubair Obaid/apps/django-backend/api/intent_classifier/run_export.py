@@ -0,0 +1,21 @@
+# services/intent_classifier/run_export.py
+import argparse
+from classifier import MultilingualIntentClassifier, configure_logging
+from serving import DEFAULT_BUCKETS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the trained intent classifier as a serving artifact.")
+    parser.add_argument("--buckets", type=int, nargs='+', default=list(DEFAULT_BUCKETS),
+                        help="Sequence-length buckets to trace a fixed input signature for.")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Also write a dynamic-range int8 quantized TFLite model.")
+    args = parser.parse_args()
+    configure_logging()
+
+    # Load the full fine-tuned model, ignoring any previously exported artifact
+    intent_classifier = MultilingualIntentClassifier(serving_backend='eager')
+    if not intent_classifier.is_ready:
+        raise SystemExit("No trained model found. Run run_training.py first.")
+
+    # The classifier picks the artifact up automatically on its next load
+    intent_classifier.export_serving_model(buckets=args.buckets, quantize=args.quantize)
@@ -1,16 +1,23 @@
 # services/intent_classifier/run_training.py
 import argparse
-from classifier import MultilingualIntentClassifier
+from classifier import MultilingualIntentClassifier, configure_logging
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Train the intent classification model.")
-    parser.add_argument("--epochs", type=int, default=50, help="Number of training epochs.")
+    parser.add_argument("--epochs", type=int, default=10,
+                        help="Maximum number of training epochs (early stopping usually ends sooner).")
     parser.add_argument("--batch-size", type=int, default=32, help="Training batch size.")
+    parser.add_argument("--mixed-precision", action="store_true",
+                        help="Train with the mixed_float16 policy (GPU only).")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directory for cached tokenized shards (default: next to the model directory).")
     args = parser.parse_args()
+    configure_logging()
 
     # Initialize the classifier
     # This will download the base BERT model on the first run
     intent_classifier = MultilingualIntentClassifier()
 
     # Start training
-    intent_classifier.train(epochs=args.epochs, batch_size=args.batch_size)
+    intent_classifier.train(epochs=args.epochs, batch_size=args.batch_size,
+                            mixed_precision=args.mixed_precision, cache_dir=args.cache_dir)
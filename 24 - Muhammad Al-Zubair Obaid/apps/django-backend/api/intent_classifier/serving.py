@@ -0,0 +1,144 @@
+# services/intent_classifier/serving.py
+import os
+import json
+import logging
+from typing import Dict, Iterable, List
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger('IntentClassifierService.Serving')
+
+SERVING_DIR_NAME = 'serving'
+SERVING_CONFIG_FILE = 'serving_config.json'
+SAVED_MODEL_DIR_NAME = 'saved_model'
+TFLITE_FILE_NAME = 'model_dynamic_int8.tflite'
+DEFAULT_BUCKETS = (16, 32, 64, 128)
+
+
+def _signature_key(length: int) -> str:
+    return f"serving_{length}"
+
+
+def _make_serving_fn(model, length: int):
+    """Traces the model for a fixed sequence length so it runs as a single graph."""
+
+    @tf.function(input_signature=[
+        tf.TensorSpec([None, length], tf.int32, name='input_ids'),
+        tf.TensorSpec([None, length], tf.int32, name='attention_mask'),
+    ])
+    def serve(input_ids, attention_mask):
+        outputs = model(input_ids=input_ids, attention_mask=attention_mask, training=False)
+        return {'logits': outputs.logits}
+
+    return serve
+
+
+def export_serving_model(model, output_dir: str, buckets: Iterable[int] = DEFAULT_BUCKETS,
+                         quantize: bool = False) -> Dict:
+    """
+    Writes a serving artifact for a fine-tuned TF model:
+    a SavedModel with one traced signature per sequence-length bucket and,
+    optionally, a dynamic-range int8 quantized TFLite model with the same signatures.
+    """
+    buckets = sorted(set(int(length) for length in buckets))
+    os.makedirs(output_dir, exist_ok=True)
+
+    module = tf.Module()
+    module.model = model
+    signatures = {}
+    for length in buckets:
+        serve = _make_serving_fn(model, length)
+        setattr(module, _signature_key(length), serve)
+        signatures[_signature_key(length)] = serve.get_concrete_function()
+
+    saved_model_dir = os.path.join(output_dir, SAVED_MODEL_DIR_NAME)
+    logger.info(f"Exporting SavedModel with buckets {buckets} to {saved_model_dir}...")
+    tf.saved_model.save(module, saved_model_dir, signatures=signatures)
+
+    config = {'buckets': buckets, 'saved_model': SAVED_MODEL_DIR_NAME, 'tflite': None}
+
+    if quantize:
+        logger.info("Converting to dynamic-range quantized TFLite...")
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir, signature_keys=list(signatures))
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        tflite_model = converter.convert()
+        with open(os.path.join(output_dir, TFLITE_FILE_NAME), 'wb') as f:
+            f.write(tflite_model)
+        config['tflite'] = TFLITE_FILE_NAME
+        logger.info(f"Quantized model written ({len(tflite_model) / 1e6:.1f} MB).")
+
+    with open(os.path.join(output_dir, SERVING_CONFIG_FILE), 'w') as f:
+        json.dump(config, f, indent=2)
+    logger.info("Serving artifact exported successfully.")
+    return config
+
+
+def has_serving_artifact(serving_dir: str) -> bool:
+    return os.path.exists(os.path.join(serving_dir, SERVING_CONFIG_FILE))
+
+
+class ServingModel:
+    """
+    Inference wrapper around an exported serving artifact. Inputs are padded up to the
+    smallest bucket that fits the batch, so every call hits a pre-traced signature.
+    """
+
+    def __init__(self, buckets: List[int], runners: Dict[int, object], backend: str):
+        self.buckets = sorted(buckets)
+        self.runners = runners
+        self.backend = backend
+
+    @classmethod
+    def load(cls, serving_dir: str, backend: str = 'auto') -> 'ServingModel':
+        """
+        Loads the artifact. `backend` is 'tflite', 'saved_model', or 'auto'
+        (prefer the quantized TFLite model when it was exported).
+        """
+        with open(os.path.join(serving_dir, SERVING_CONFIG_FILE), 'r') as f:
+            config = json.load(f)
+        buckets = config['buckets']
+
+        if backend in ('auto', 'tflite') and config.get('tflite'):
+            # The interpreter maps the flatbuffer from disk instead of copying the weights.
+            interpreter = tf.lite.Interpreter(model_path=os.path.join(serving_dir, config['tflite']))
+            runners = {length: interpreter.get_signature_runner(_signature_key(length)) for length in buckets}
+            return cls(buckets, runners, 'tflite')
+
+        if backend == 'tflite':
+            logger.warning("No TFLite model in the serving artifact, falling back to the SavedModel.")
+        loaded = tf.saved_model.load(os.path.join(serving_dir, config['saved_model']))
+        runners = {length: loaded.signatures[_signature_key(length)] for length in buckets}
+        # Keep a reference so the signatures' variables are not garbage collected.
+        model = cls(buckets, runners, 'saved_model')
+        model._loaded = loaded
+        return model
+
+    @property
+    def max_length(self) -> int:
+        return self.buckets[-1]
+
+    def bucket_for(self, length: int) -> int:
+        for bucket in self.buckets:
+            if length <= bucket:
+                return bucket
+        return self.buckets[-1]
+
+    def predict_logits(self, input_ids: np.ndarray, attention_mask: np.ndarray, pad_token_id: int = 0) -> np.ndarray:
+        """Pads (or truncates) the batch to its bucket length and returns the logits."""
+        length = input_ids.shape[1]
+        bucket = self.bucket_for(length)
+        if length < bucket:
+            pad = ((0, 0), (0, bucket - length))
+            input_ids = np.pad(input_ids, pad, constant_values=pad_token_id)
+            attention_mask = np.pad(attention_mask, pad, constant_values=0)
+        elif length > bucket:
+            input_ids, attention_mask = input_ids[:, :bucket], attention_mask[:, :bucket]
+
+        input_ids = input_ids.astype(np.int32)
+        attention_mask = attention_mask.astype(np.int32)
+        runner = self.runners[bucket]
+        if self.backend == 'tflite':
+            return runner(input_ids=input_ids, attention_mask=attention_mask)['logits']
+        outputs = runner(input_ids=tf.constant(input_ids), attention_mask=tf.constant(attention_mask))
+        return outputs['logits'].numpy()
@@ -0,0 +1,18 @@
+# api/management/commands/rollup_metrics.py
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+from api.metrics import rollup_metrics
+
+
+class Command(BaseCommand):
+    help = "Rolls raw SystemMetric points into 1-minute/1-hour aggregates and applies retention."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--now', help="ISO timestamp to treat as the current time (for backfills).")
+
+    def handle(self, *args, **options):
+        now = parse_datetime(options['now']) if options['now'] else None
+        summary = rollup_metrics(now=now)
+        self.stdout.write(self.style.SUCCESS(
+            ", ".join(f"{key}={value}" for key, value in summary.items())
+        ))
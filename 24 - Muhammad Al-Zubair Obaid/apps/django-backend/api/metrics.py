@@ -0,0 +1,259 @@
+# api/metrics.py
+import os
+import math
+import queue
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+try:
+    import psutil
+except ImportError:  # CPU/RSS samples fall back to the standard library
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = {
+    '1m': timedelta(minutes=1),
+    '1h': timedelta(hours=1),
+}
+
+
+class ProcessSampler:
+    """Measures this process's CPU usage (% of one core) and resident memory (MB)."""
+
+    def __init__(self):
+        self._process = psutil.Process() if psutil is not None else None
+        self._last_cpu = self._cpu_seconds()
+        self._last_wall = time.monotonic()
+
+    def _cpu_seconds(self) -> float:
+        times = os.times()
+        return times.user + times.system
+
+    def cpu_percent(self) -> float:
+        if self._process is not None:
+            return self._process.cpu_percent(interval=None)
+        cpu, wall = self._cpu_seconds(), time.monotonic()
+        elapsed = wall - self._last_wall
+        percent = (cpu - self._last_cpu) / elapsed * 100.0 if elapsed > 0 else 0.0
+        self._last_cpu, self._last_wall = cpu, wall
+        return percent
+
+    def rss_mb(self) -> Optional[float]:
+        if self._process is not None:
+            return self._process.memory_info().rss / (1024 * 1024)
+        try:
+            with open('/proc/self/statm') as f:
+                resident_pages = int(f.read().split()[1])
+            return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+        except (OSError, ValueError, AttributeError):
+            return None
+
+
+class MetricsRecorder:
+    """
+    Collects SystemMetric points from request and batching code paths and writes
+    them with `bulk_create` from a background thread. The same thread samples
+    process CPU and RSS every `sample_interval_s` and, when `rollup_interval_s`
+    is set, runs the rollup and retention job.
+
+    `record` never blocks: when `max_buffer` points are waiting, new points are dropped.
+    """
+
+    def __init__(self, flush_interval_s: float = 5.0, batch_size: int = 500, max_buffer: int = 10000,
+                 sample_interval_s: Optional[float] = 15.0, rollup_interval_s: Optional[float] = 60.0,
+                 autostart: bool = True):
+        self.flush_interval = flush_interval_s
+        self.batch_size = batch_size
+        self.sample_interval = sample_interval_s
+        self.rollup_interval = rollup_interval_s
+        self.autostart = autostart
+        self.sampler = ProcessSampler()
+
+        self.written = 0
+        self.dropped = 0
+
+        self._queue: "queue.Queue[Tuple[str, float, datetime]]" = queue.Queue(maxsize=max_buffer)
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        atexit.register(self.stop)
+
+    @classmethod
+    def from_settings(cls) -> Optional['MetricsRecorder']:
+        """Builds the recorder described by settings.METRICS, or None when it is disabled."""
+        config = getattr(settings, 'METRICS', {})
+        if not config.get('ENABLED', True):
+            return None
+        return cls(
+            flush_interval_s=config.get('FLUSH_INTERVAL_SECONDS', 5),
+            batch_size=config.get('BATCH_SIZE', 500),
+            max_buffer=config.get('MAX_BUFFER', 10000),
+            sample_interval_s=config.get('SAMPLE_INTERVAL_SECONDS', 15),
+            rollup_interval_s=config.get('ROLLUP_INTERVAL_SECONDS', 60),
+        )
+
+    def record(self, metric_name: str, value: float, timestamp: Optional[datetime] = None):
+        """Buffers one point. Safe to call from any thread."""
+        if self.autostart:
+            self._ensure_worker()
+        try:
+            self._queue.put_nowait((metric_name, float(value), timestamp or timezone.now()))
+        except queue.Full:
+            self.dropped += 1
+
+    def record_batch(self, batch_metrics):
+        """`MicroBatcher.on_batch` hook: records how long the batch waited in the queue."""
+        self.record('queue_wait', batch_metrics.queue_wait_ms)
+
+    def sample_process(self):
+        self.record('cpu_usage', self.sampler.cpu_percent())
+        rss = self.sampler.rss_mb()
+        if rss is not None:
+            self.record('memory_usage', rss)
+
+    def flush(self) -> int:
+        """Writes every buffered point now. Returns the number written."""
+        from .models import SystemMetric
+        total = 0
+        while True:
+            points = []
+            while len(points) < self.batch_size:
+                try:
+                    points.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not points:
+                return total
+            try:
+                SystemMetric.objects.bulk_create([
+                    SystemMetric(metric_name=name, metric_value=value, timestamp=timestamp)
+                    for name, value, timestamp in points
+                ])
+            except Exception as e:
+                logger.error(f"Failed to write {len(points)} metric points: {e}")
+                return total
+            self.written += len(points)
+            total += len(points)
+
+    def stop(self):
+        self._stop_event.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join(timeout=5)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush metrics on shutdown: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"buffered": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop_event.clear()
+                self._worker = threading.Thread(target=self._run, name='metrics-recorder', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        next_flush = next_sample = next_rollup = time.monotonic()
+        while not self._stop_event.wait(timeout=1.0):
+            now = time.monotonic()
+            if self.sample_interval and now >= next_sample:
+                self.sample_process()
+                next_sample = now + self.sample_interval
+            if now < next_flush and self._queue.qsize() < self.batch_size:
+                continue
+
+            close_old_connections()
+            try:
+                self.flush()
+                next_flush = now + self.flush_interval
+                if self.rollup_interval and now >= next_rollup:
+                    rollup_metrics()
+                    next_rollup = now + self.rollup_interval
+            except Exception as e:
+                logger.error(f"Metrics background job failed: {e}")
+            finally:
+                close_old_connections()
+
+
+# --- Rollups ---
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def floor_time(value: datetime, resolution: str) -> datetime:
+    if resolution == '1h':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(second=0, microsecond=0)
+
+
+def _aggregate(points: Iterable[Tuple[str, datetime, float]], resolution: str) -> List:
+    from .models import MetricRollup
+    buckets: Dict[Tuple[str, datetime], List[float]] = {}
+    for metric_name, timestamp, value in points:
+        buckets.setdefault((metric_name, floor_time(timestamp, resolution)), []).append(value)
+
+    rollups = []
+    for (metric_name, bucket_start), values in buckets.items():
+        values.sort()
+        rollups.append(MetricRollup(
+            metric_name=metric_name, resolution=resolution, bucket_start=bucket_start, count=len(values),
+            p50=percentile(values, 50), p95=percentile(values, 95), p99=percentile(values, 99), max=values[-1],
+        ))
+    return rollups
+
+
+def rollup_metrics(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Aggregates raw points into every complete 1-minute and 1-hour bucket that has not
+    been rolled up yet, then deletes raw points and rollups older than their retention.
+    Safe to run repeatedly and from several processes: buckets are upserted.
+    """
+    from .models import MetricRollup, SystemMetric
+    config = getattr(settings, 'METRICS', {})
+    now = now or timezone.now()
+    summary = {}
+
+    # Points are timestamped when recorded but written up to a flush interval later,
+    # so only buckets that closed before that delay are considered complete.
+    settled = now - timedelta(seconds=2 * config.get('FLUSH_INTERVAL_SECONDS', 5))
+    for resolution in RESOLUTIONS:
+        end = floor_time(settled, resolution)
+        latest = (MetricRollup.objects.filter(resolution=resolution)
+                  .order_by('-bucket_start').values_list('bucket_start', flat=True).first())
+        raw = SystemMetric.objects.filter(timestamp__lt=end)
+        if latest is not None:
+            raw = raw.filter(timestamp__gte=latest + RESOLUTIONS[resolution])
+
+        points = raw.order_by().values_list('metric_name', 'timestamp', 'metric_value').iterator(chunk_size=5000)
+        rollups = _aggregate(points, resolution)
+        MetricRollup.objects.bulk_create(
+            rollups, batch_size=500, update_conflicts=True,
+            unique_fields=['metric_name', 'resolution', 'bucket_start'],
+            update_fields=['count', 'p50', 'p95', 'p99', 'max'],
+        )
+        summary[f'rollups_{resolution}'] = len(rollups)
+
+    summary['deleted_raw'], _ = SystemMetric.objects.filter(
+        timestamp__lt=now - timedelta(hours=config.get('RAW_RETENTION_HOURS', 24))).delete()
+    summary['deleted_1m'], _ = MetricRollup.objects.filter(
+        resolution='1m', bucket_start__lt=now - timedelta(days=config.get('MINUTE_RETENTION_DAYS', 7))).delete()
+    summary['deleted_1h'], _ = MetricRollup.objects.filter(
+        resolution='1h', bucket_start__lt=now - timedelta(days=config.get('HOUR_RETENTION_DAYS', 365))).delete()
+    return summary
@@ -1,16 +1,32 @@
 # api/middleware.py
 import logging
 import time
-from .models import OperationLog
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.functional import SimpleLazyObject, empty
+from .audit import audit_log_writer
 
 logger = logging.getLogger(__name__)
 
 
 class AuditLogMiddleware:
+    """
+    Records an OperationLog entry for every /api/ request. Entries are handed to the
+    buffered audit writer, so the request never waits on a database write.
+    Runs natively in both WSGI and ASGI stacks.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
         start_time = time.time()
 
         # Process the request
@@ -21,27 +37,60 @@ class AuditLogMiddleware:
         # Log only API requests to avoid logging admin/static file requests
         if request.path.startswith('/api/'):
             try:
-                user = request.user if request.user.is_authenticated else None
+                user = getattr(request, 'user', None)
+                self._enqueue(request, response, duration, _user_id(user))
+            except Exception as e:
+                logger.error(f"Failed to create operation log: {e}")
+
+        return response
+
+    async def __acall__(self, request):
+        start_time = time.time()
+
+        response = await self.get_response(request)
 
-                # Get client IP address
-                x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-                if x_forwarded_for:
-                    ip_address = x_forwarded_for.split(',')[0]
+        duration = time.time() - start_time
+
+        if request.path.startswith('/api/'):
+            try:
+                user = getattr(request, 'user', None)
+                if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+                    # Nothing has resolved the session user yet, and doing so queries the database.
+                    if hasattr(request, 'auser'):
+                        user_id = _user_id(await request.auser())
+                    else:
+                        user_id = await sync_to_async(_user_id)(user)
                 else:
-                    ip_address = request.META.get('REMOTE_ADDR')
-
-                OperationLog.objects.create(
-                    user=user,
-                    operation=f"{request.method} {request.path}",
-                    ip_address=ip_address,
-                    is_success=(200 <= response.status_code < 300),
-                    details={
-                        "request_body": request.POST.dict() if request.POST else {},
-                        "response_status": response.status_code,
-                        "duration_ms": round(duration * 1000, 2)
-                    }
-                )
+                    user_id = _user_id(user)
+                self._enqueue(request, response, duration, user_id)
             except Exception as e:
                 logger.error(f"Failed to create operation log: {e}")
 
         return response
+
+    @staticmethod
+    def _enqueue(request, response, duration, user_id):
+        # Get client IP address
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            ip_address = x_forwarded_for.split(',')[0]
+        else:
+            ip_address = request.META.get('REMOTE_ADDR')
+
+        audit_log_writer.enqueue({
+            "user_id": user_id,
+            "operation": f"{request.method} {request.path}",
+            "ip_address": ip_address,
+            "is_success": (200 <= response.status_code < 300),
+            "details": {
+                "request_body": request.POST.dict() if request.POST else {},
+                "response_status": response.status_code,
+                "duration_ms": round(duration * 1000, 2)
+            }
+        })
+
+
+def _user_id(user):
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
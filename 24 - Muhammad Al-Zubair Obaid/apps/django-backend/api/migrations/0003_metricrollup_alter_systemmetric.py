@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2025-08-03 14:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_operationlog_timestamp'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='systemmetric',
+            name='metric_name',
+            field=models.CharField(choices=[('cpu_usage', 'CPU Usage (%)'), ('memory_usage', 'Memory Usage (MB)'), ('inference_time', 'Inference Time (ms)'), ('tokenizer_time', 'Tokenizer Time (ms)'), ('queue_wait', 'Queue Wait (ms)')], db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='systemmetric',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric_name', models.CharField(choices=[('cpu_usage', 'CPU Usage (%)'), ('memory_usage', 'Memory Usage (MB)'), ('inference_time', 'Inference Time (ms)'), ('tokenizer_time', 'Tokenizer Time (ms)'), ('queue_wait', 'Queue Wait (ms)')], max_length=50)),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour')], max_length=2)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('p50', models.FloatField()),
+                ('p95', models.FloatField()),
+                ('p99', models.FloatField()),
+                ('max', models.FloatField()),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('metric_name', 'resolution', 'bucket_start'), name='unique_metric_rollup_bucket')],
+            },
+        ),
+    ]
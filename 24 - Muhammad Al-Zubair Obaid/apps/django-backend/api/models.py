@@ -1,6 +1,7 @@
 # api/models.py
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class ChatSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_sessions')
@@ -21,7 +22,8 @@ class ChatMessage(models.Model):
 class OperationLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     operation = models.CharField(max_length=100, db_index=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the request is logged, not when the buffered audit writer saves the row.
+    timestamp = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     is_success = models.BooleanField(default=True)
     details = models.JSONField()
@@ -38,8 +40,11 @@ class SystemMetric(models.Model):
         ('cpu_usage', 'CPU Usage (%)'),
         ('memory_usage', 'Memory Usage (MB)'),
         ('inference_time', 'Inference Time (ms)'),
+        ('tokenizer_time', 'Tokenizer Time (ms)'),
+        ('queue_wait', 'Queue Wait (ms)'),
     ]
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Points are written in batches by api.metrics, so the sample time is set when it is recorded.
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     metric_name = models.CharField(max_length=50, choices=METRIC_CHOICES, db_index=True)
     metric_value = models.FloatField()
 
@@ -52,3 +57,32 @@ class SystemMetric(models.Model):
 
     def __str__(self):
         return f"{self.metric_name}: {self.metric_value} at {self.timestamp}"
+
+
+class MetricRollup(models.Model):
+    """
+    Aggregates of SystemMetric points over fixed time buckets, produced by the
+    `rollup_metrics` job so that dashboards never have to scan raw points.
+    """
+    RESOLUTION_CHOICES = [
+        ('1m', '1 minute'),
+        ('1h', '1 hour'),
+    ]
+    metric_name = models.CharField(max_length=50, choices=SystemMetric.METRIC_CHOICES)
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    p50 = models.FloatField()
+    p95 = models.FloatField()
+    p99 = models.FloatField()
+    max = models.FloatField()
+
+    class Meta:
+        ordering = ['bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['metric_name', 'resolution', 'bucket_start'],
+                                    name='unique_metric_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric_name} [{self.resolution}] at {self.bucket_start}: p95={self.p95}"
@@ -0,0 +1,150 @@
+# api/result_cache.py
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ai-result'
+
+
+class InProcessCacheBackend:
+    """
+    Bounded LRU cache with a per-entry TTL, local to the worker process.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 300,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    """
+    Stores results in a Django cache so hits are shared across worker processes.
+    Size bounds and eviction are those of the configured cache (e.g. Redis maxmemory-policy).
+    """
+
+    def __init__(self, alias: str = 'default', ttl_seconds: float = 300):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: Any):
+        self.cache.set(key, value, timeout=self.ttl_seconds)
+
+    def clear(self):
+        # Keys embed the model version, so entries for a replaced model are never read again
+        # and simply expire. Clearing the whole shared cache would drop unrelated data.
+        pass
+
+
+class ResultCache:
+    """
+    Caches classification results and formatted responses keyed on the
+    normalized query text and the version of the model that produced them.
+    Both the HTTP view and the chat WebSocket share entries, so values are the
+    transport-neutral dicts built by `make_result`.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(normalized_text: str, model_version: Optional[str]) -> str:
+        digest = hashlib.sha1(f"{model_version}\x00{normalized_text}".encode('utf-8')).hexdigest()
+        return f"{KEY_PREFIX}:{digest}"
+
+    def get(self, normalized_text: str, model_version: Optional[str]) -> Optional[Dict]:
+        value = self.backend.get(self.make_key(normalized_text, model_version))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, normalized_text: str, model_version: Optional[str], value: Dict):
+        self.backend.set(self.make_key(normalized_text, model_version), value)
+
+    def invalidate(self):
+        """Called when the classifier swaps its model."""
+        self.backend.clear()
+        self.invalidations += 1
+        logger.info("AI result cache invalidated after a model change.")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        stats = {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+        if isinstance(self.backend, InProcessCacheBackend):
+            stats.update({"size": len(self.backend), "evictions": self.backend.evictions})
+        return stats
+
+
+def make_result(classification_result: Dict, response: str) -> Dict:
+    """The cached form of an answered query; each transport maps it to its own field names."""
+    return {
+        "response": response,
+        "intent": classification_result.get("intent"),
+        "entities": classification_result.get("entities", {}),
+    }
+
+
+def build_result_cache(config: Dict) -> Optional[ResultCache]:
+    """Builds the cache described by settings.AI_RESULT_CACHE, or None when it is disabled."""
+    backend_name = config.get('BACKEND', 'memory')
+    ttl_seconds = config.get('TTL_SECONDS', 300)
+    if backend_name is None or not config.get('ENABLED', True):
+        return None
+    if backend_name == 'memory':
+        backend = InProcessCacheBackend(max_entries=config.get('MAX_ENTRIES', 2048), ttl_seconds=ttl_seconds)
+    elif backend_name == 'django':
+        backend = DjangoCacheBackend(alias=config.get('CACHE_ALIAS', 'default'), ttl_seconds=ttl_seconds)
+    else:
+        raise ValueError(f"Unknown AI_RESULT_CACHE backend: {backend_name}")
+    return ResultCache(backend)
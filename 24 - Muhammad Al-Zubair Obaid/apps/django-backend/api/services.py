@@ -1,28 +1,169 @@
 # api/services.py
+import time
+import asyncio
 import logging
-from .intent_classifier.classifier import MultilingualIntentClassifier, ResponseFormatter
+import threading
+from typing import Any, Callable, Dict
+from django.conf import settings
+from .intent_classifier.responses import ResponseFormatter
+from .metrics import MetricsRecorder
+from .result_cache import build_result_cache
 
 logger = logging.getLogger(__name__)
 
+LOAD_MODES = ('eager', 'lazy', 'background')
+
 # These will hold the singleton instances. They are initialized as None.
 ai_classifier_instance = None
 response_formatter_instance = None
+result_cache_instance = None
+metrics_recorder_instance = None
+
+
+class LazyClassifier:
+    """
+    Stands in for the MultilingualIntentClassifier singleton until it is needed.
+    TensorFlow, transformers and the model weights are only loaded on the first
+    attribute access, an explicit `load()`/`aload()` (e.g. from the warmup endpoint),
+    or a background `start_loading()`. `status()` reports the load progress.
+    """
+
+    def __init__(self, factory: Callable[[Callable[[str], None]], Any]):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self._state = 'not_loaded'
+        self._stage = None
+        self._error = None
+        self._started_at = None
+        self._finished_at = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def load(self):
+        """Loads the classifier (once) and returns it. Blocks while another thread is loading it."""
+        if self._instance is not None:
+            return self._instance
+        with self._lock:
+            if self._instance is not None:
+                return self._instance
+            self._state, self._error = 'loading', None
+            self._started_at, self._finished_at = time.monotonic(), None
+            try:
+                instance = self._factory(self._report_stage)
+            except Exception as e:
+                self._state, self._error = 'failed', str(e)
+                self._finished_at = time.monotonic()
+                logger.exception(f"Failed to load the AI classifier: {e}")
+                raise
+            self._instance = instance
+            self._state, self._stage = 'ready', None
+            self._finished_at = time.monotonic()
+            logger.info(f"AI classifier loaded in {self._finished_at - self._started_at:.1f}s.")
+            return instance
+
+    async def aload(self):
+        """Loads the classifier without blocking the event loop."""
+        if self._instance is not None:
+            return self._instance
+        return await asyncio.to_thread(self.load)
+
+    def start_loading(self):
+        """Starts loading in a daemon thread and returns immediately."""
+        if self._instance is not None or self._state == 'loading':
+            return
+
+        def run():
+            try:
+                self.load()
+            except Exception:
+                pass  # Already logged and reported through status().
+
+        threading.Thread(target=run, name='ai-classifier-loader', daemon=True).start()
+
+    def status(self) -> Dict[str, Any]:
+        status = {"state": self._state, "stage": self._stage, "error": self._error}
+        if self._started_at is not None:
+            status["elapsed_s"] = round((self._finished_at or time.monotonic()) - self._started_at, 2)
+        if self._instance is not None:
+            status.update({
+                "model_ready": self._instance.is_ready,
+                "model_version": self._instance.model_version,
+                "serving_backend": (self._instance.serving_model.backend
+                                    if self._instance.serving_model is not None else 'eager'),
+            })
+        return status
+
+    def _report_stage(self, stage: str):
+        self._stage = stage
+        logger.info(f"AI classifier loading: {stage}...")
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+
+def _build_classifier(report_stage: Callable[[str], None]):
+    """Imports and constructs the classifier, then attaches the cache and metrics hooks."""
+    report_stage('importing')
+    from .intent_classifier.classifier import MultilingualIntentClassifier
+
+    report_stage('loading_model')
+    # The path needs to be correct from the project root where manage.py is run.
+    classifier_settings = getattr(settings, 'AI_CLASSIFIER', {})
+    classifier = MultilingualIntentClassifier(
+        max_batch_size=classifier_settings.get('MAX_BATCH_SIZE', 32),
+        max_batch_latency_ms=classifier_settings.get('MAX_BATCH_LATENCY_MS', 5.0),
+        max_queue_size=classifier_settings.get('MAX_QUEUE_SIZE', 1024),
+        serving_backend=classifier_settings.get('SERVING_BACKEND', 'auto'),
+    )
+
+    if result_cache_instance is not None:
+        # Cached results are only valid for the model that produced them.
+        classifier.add_model_listener(result_cache_instance.invalidate)
+    if metrics_recorder_instance is not None:
+        classifier.metrics_sink = metrics_recorder_instance.record
+        classifier.batcher.on_batch = metrics_recorder_instance.record_batch
+
+    report_stage('warming_up')
+    classifier.warmup()
+    return classifier
 
 
 def initialize_services():
     """
     Initializes the singleton services. This function is called once from AppConfig.ready().
+    The classifier itself is loaded according to AI_CLASSIFIER['LOAD_MODE'].
     """
-    global ai_classifier_instance, response_formatter_instance
-
-    if ai_classifier_instance is None:
-        logger.info("Loading MultilingualIntentClassifier singleton...")
-        # The path needs to be correct from the project root where manage.py is run.
-        ai_classifier_instance = MultilingualIntentClassifier()
-        logger.info("AI Classifier loaded.")
+    global ai_classifier_instance, response_formatter_instance, result_cache_instance, metrics_recorder_instance
 
     if response_formatter_instance is None:
         logger.info("Loading ResponseFormatter singleton...")
         response_formatter_instance = ResponseFormatter()
         logger.info("Response Formatter loaded.")
 
+    if result_cache_instance is None:
+        result_cache_instance = build_result_cache(getattr(settings, 'AI_RESULT_CACHE', {}))
+        if result_cache_instance is not None:
+            logger.info(f"AI result cache enabled ({type(result_cache_instance.backend).__name__}).")
+
+    if metrics_recorder_instance is None:
+        metrics_recorder_instance = MetricsRecorder.from_settings()
+        if metrics_recorder_instance is not None:
+            logger.info("System metrics recording enabled.")
+
+    if ai_classifier_instance is None:
+        load_mode = getattr(settings, 'AI_CLASSIFIER', {}).get('LOAD_MODE', 'lazy')
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"Unknown AI_CLASSIFIER LOAD_MODE: {load_mode}")
+        ai_classifier_instance = LazyClassifier(_build_classifier)
+        if load_mode == 'eager':
+            logger.info("Loading MultilingualIntentClassifier singleton...")
+            ai_classifier_instance.load()
+        elif load_mode == 'background':
+            ai_classifier_instance.start_loading()
+        else:
+            logger.info("AI classifier will be loaded on first use or warmup.")
@@ -1,4 +1,6 @@
 # api/tests.py
+import asyncio
+import unicodedata
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 from django.urls import reverse
@@ -25,6 +27,8 @@ def test_ai_request_authenticated(mock_grpc_client, mock_ai_classifier):
     Tests a successful, authenticated request to the main AI endpoint.
     """
     # Setup Mocks
+    mock_ai_classifier.preprocess_text = MagicMock(return_value="specs")
+    mock_ai_classifier.model_version = "test"
     mock_ai_classifier.classify.return_value = {
         "intent": "hardware_info",
         "entities": {}
@@ -46,3 +50,418 @@ def test_ai_request_authenticated(mock_grpc_client, mock_ai_classifier):
     assert "Test CPU" in response.data['initial_response']
     mock_ai_classifier.classify.assert_called_once_with("specs")
     mock_grpc_client.query_system_info.assert_called_once()
+
+
+@pytest.mark.django_db
+@patch('api.views.ai_classifier', new_callable=AsyncMock)
+def test_ai_request_served_from_result_cache(mock_ai_classifier):
+    """
+    Tests that a repeated query with the same normalized text skips classification.
+    """
+    from api.result_cache import InProcessCacheBackend, ResultCache
+
+    mock_ai_classifier.preprocess_text = MagicMock(side_effect=lambda text: " ".join(text.lower().split()))
+    mock_ai_classifier.model_version = "v1"
+    mock_ai_classifier.classify.return_value = {
+        "intent": "app_installation",
+        "language": "en",
+        "entities": {"apps": ["Git.Git"], "environment": None}
+    }
+    cache = ResultCache(InProcessCacheBackend(max_entries=8, ttl_seconds=60))
+
+    client = APIClient()
+    user = User.objects.create_user(username='testuser', password='password')
+    client.force_authenticate(user=user)
+    url = reverse('ai-request')
+
+    with patch('api.views.result_cache', cache):
+        first = client.post(url, {"query": "Install Git"}, format='json')
+        second = client.post(url, {"query": "install   git"}, format='json')
+
+    assert first.status_code == second.status_code == 200
+    assert first.data == second.data
+    mock_ai_classifier.classify.assert_called_once_with("Install Git")
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_in_process_cache_evicts_expired_and_least_recently_used():
+    """
+    Tests TTL expiry and LRU eviction of the in-process result cache backend.
+    """
+    from api.result_cache import InProcessCacheBackend
+
+    now = [0.0]
+    backend = InProcessCacheBackend(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    backend.set("a", 1)
+    backend.set("b", 2)
+    assert backend.get("a") == 1  # "a" is now the most recently used entry
+    backend.set("c", 3)
+    assert backend.get("b") is None
+    assert backend.evictions == 1
+
+    now[0] = 11.0
+    assert backend.get("a") is None
+    assert backend.get("c") is None
+
+
+@pytest.mark.django_db
+@patch('api.views.result_cache', None)
+@patch('api.views.ai_classifier', new_callable=AsyncMock)
+def test_audit_middleware_buffers_operation_logs(mock_ai_classifier):
+    """
+    Tests that API requests are queued for the audit writer and saved together on flush.
+    """
+    from api.audit import AuditLogWriter
+    from api.models import OperationLog
+
+    mock_ai_classifier.preprocess_text = MagicMock(return_value="test")
+    mock_ai_classifier.model_version = "test"
+    mock_ai_classifier.classify.return_value = {"intent": "greeting", "entities": {}}
+
+    writer = AuditLogWriter(batch_size=10, autostart=False)
+    client = APIClient()
+    with patch('api.middleware.audit_log_writer', writer):
+        for _ in range(3):
+            client.post(reverse('ai-request'), {"query": "test"})
+
+    assert OperationLog.objects.count() == 0
+    assert writer.queue_depth == 3
+    assert writer.flush() == 3
+    log = OperationLog.objects.first()
+    assert log.operation == "POST /api/ai-request/"
+    assert log.is_success is True
+    assert log.details["response_status"] == 200
+
+
+@pytest.mark.django_db
+def test_audit_writer_spills_overflow_and_replays_it(tmp_path):
+    """
+    Tests that records beyond the buffer are spilled to disk and written on the next flush.
+    """
+    from api.audit import AuditLogWriter
+    from api.models import OperationLog
+
+    spill_path = tmp_path / "audit_spill.jsonl"
+    writer = AuditLogWriter(max_queue_size=2, overflow='spill', spill_path=str(spill_path), autostart=False)
+    for index in range(5):
+        writer.enqueue({"operation": f"GET /api/{index}/", "details": {}})
+
+    assert writer.queue_depth == 2
+    assert writer.spilled == 3
+    assert writer.flush() == 5
+    assert OperationLog.objects.count() == 5
+    assert not spill_path.exists()
+
+
+@pytest.mark.django_db
+def test_audit_writer_skips_corrupt_spill_lines(tmp_path):
+    """
+    Tests that a truncated spill line is set aside instead of aborting the replay.
+    """
+    from api.audit import AuditLogWriter
+    from api.models import OperationLog
+
+    spill_path = tmp_path / "audit_spill.jsonl"
+    spill_path.write_text('{"operation": "GET /api/0/", "details": {}}\n{"operation": "GET /a\n',
+                          encoding='utf-8')
+    writer = AuditLogWriter(overflow='spill', spill_path=str(spill_path), autostart=False)
+
+    assert writer.flush() == 1
+    assert OperationLog.objects.count() == 1
+    assert writer.failed == 1
+    assert not spill_path.exists()
+    assert (tmp_path / "audit_spill.jsonl.corrupt").exists()
+
+
+def _run_websocket_session(messages, expected_frames):
+    """Sends `messages` to a SupportChatConsumer and collects `expected_frames` replies."""
+    from asgiref.sync import async_to_sync
+    from channels.testing import WebsocketCommunicator
+    from api.consumers import SupportChatConsumer
+
+    async def session():
+        communicator = WebsocketCommunicator(SupportChatConsumer.as_asgi(), "/ws/support/")
+        connected, _ = await communicator.connect()
+        assert connected
+        assert (await communicator.receive_json_from())["type"] == "connection_established"
+        for message in messages:
+            await communicator.send_json_to(message)
+        frames = [await communicator.receive_json_from(timeout=2) for _ in range(expected_frames)]
+        await communicator.disconnect()
+        return frames
+
+    return async_to_sync(session)()
+
+
+@patch('api.consumers.result_cache', None)
+@patch('api.consumers.response_formatter')
+@patch('api.consumers.ai_classifier')
+def test_websocket_query_streams_stages(mock_ai_classifier, mock_response_formatter, settings):
+    """
+    Tests that a query sent over the WebSocket streams entities, classified and response frames.
+    """
+    settings.SUPPORT_CHAT_WS = {'REQUIRE_AUTHENTICATION': False}
+
+    async def classify_stream(text):
+        yield "entities", {"language": "en", "entities": {"apps": ["Git.Git"], "environment": None}}
+        yield "classified", {"intent": "app_installation", "confidence": 0.97}
+
+    mock_ai_classifier.preprocess_text.side_effect = lambda text: text.lower()
+    mock_ai_classifier.classify_stream = classify_stream
+    mock_response_formatter.generate_response.return_value = "Installing Git."
+
+    frames = _run_websocket_session([{"type": "query", "id": 1, "query": "Install Git"}], expected_frames=3)
+
+    assert [frame["type"] for frame in frames] == ["entities", "classified", "response"]
+    assert all(frame["id"] == 1 for frame in frames)
+    assert frames[1]["intent"] == "app_installation"
+    assert frames[2]["response"] == "Installing Git."
+
+
+@pytest.mark.django_db
+@patch('api.consumers.response_formatter')
+@patch('api.consumers.ai_classifier')
+@patch('api.views.ai_classifier', new_callable=AsyncMock)
+def test_result_cache_is_shared_by_http_and_websocket(mock_view_classifier, mock_ws_classifier,
+                                                      mock_response_formatter, settings):
+    """
+    Tests that a result cached by either transport is served by the other with its own field names.
+    """
+    from api.result_cache import InProcessCacheBackend, ResultCache
+
+    settings.SUPPORT_CHAT_WS = {'REQUIRE_AUTHENTICATION': False}
+    for classifier in (mock_view_classifier, mock_ws_classifier):
+        classifier.preprocess_text = MagicMock(side_effect=lambda text: " ".join(text.lower().split()))
+        classifier.model_version = "v1"
+        classifier.loaded = True
+    mock_view_classifier.classify.return_value = {
+        "intent": "app_installation", "entities": {"apps": ["Git.Git"], "environment": None}
+    }
+
+    async def classify_stream(text):
+        yield "entities", {"language": "en", "entities": {"apps": ["Docker.DockerDesktop"], "environment": None}}
+        yield "classified", {"intent": "app_installation", "confidence": 0.97}
+
+    mock_ws_classifier.classify_stream = classify_stream
+    mock_response_formatter.generate_response.return_value = "Installing Docker."
+    cache = ResultCache(InProcessCacheBackend(max_entries=8, ttl_seconds=60))
+
+    client = APIClient()
+    url = reverse('ai-request')
+    with patch('api.views.result_cache', cache), patch('api.consumers.result_cache', cache):
+        # Filled over HTTP, read over the WebSocket
+        first = client.post(url, {"query": "Install Git"}, format='json')
+        git_frames = _run_websocket_session([{"type": "query", "id": 1, "query": "install git"}], expected_frames=3)
+        # Filled over the WebSocket, read over HTTP
+        _run_websocket_session([{"type": "query", "id": 2, "query": "Install Docker"}], expected_frames=3)
+        docker = client.post(url, {"query": "install docker"}, format='json')
+
+    assert git_frames[2]["cached"] is True
+    assert git_frames[2]["response"] == first.data["initial_response"]
+    assert "initial_response" not in git_frames[2]
+    assert docker.data == {
+        "initial_response": "Installing Docker.",
+        "intent": "app_installation",
+        "entities": {"apps": ["Docker.DockerDesktop"], "environment": None},
+    }
+    mock_view_classifier.classify.assert_called_once_with("Install Git")
+
+
+@patch('api.consumers.ai_classifier')
+def test_websocket_limits_in_flight_queries(mock_ai_classifier, settings):
+    """
+    Tests that queries beyond the per-connection in-flight limit are rejected.
+    """
+    settings.SUPPORT_CHAT_WS = {'REQUIRE_AUTHENTICATION': False, 'MAX_IN_FLIGHT': 1}
+
+    async def classify_stream(text):
+        await asyncio.sleep(10)
+        yield "classified", {}
+
+    mock_ai_classifier.classify_stream = classify_stream
+    frames = _run_websocket_session([
+        {"type": "query", "id": "a", "query": "first"},
+        {"type": "query", "id": "b", "query": "second"},
+    ], expected_frames=1)
+
+    assert frames == [{"type": "error", "id": "b", "code": "too_many_in_flight",
+                       "error": "At most 1 queries may be in flight."}]
+
+
+@pytest.mark.django_db
+def test_rollup_metrics_aggregates_and_applies_retention(settings):
+    """
+    Tests that raw points are rolled into minute/hour buckets and old raw points are removed.
+    """
+    from datetime import datetime, timedelta, timezone as dt_timezone
+    from api.metrics import rollup_metrics
+    from api.models import MetricRollup, SystemMetric
+
+    settings.METRICS = {'FLUSH_INTERVAL_SECONDS': 5, 'RAW_RETENTION_HOURS': 2}
+    hour = datetime(2025, 8, 1, 10, tzinfo=dt_timezone.utc)
+    SystemMetric.objects.bulk_create(
+        [SystemMetric(metric_name='inference_time', metric_value=value, timestamp=hour + timedelta(seconds=value))
+         for value in range(1, 101)]
+        + [SystemMetric(metric_name='inference_time', metric_value=500, timestamp=hour + timedelta(minutes=5))]
+    )
+
+    summary = rollup_metrics(now=hour + timedelta(hours=1, minutes=1))
+    assert summary['rollups_1m'] == 3
+    assert summary['rollups_1h'] == 1
+
+    first_minute = MetricRollup.objects.get(resolution='1m', bucket_start=hour)
+    assert (first_minute.count, first_minute.p50, first_minute.p95, first_minute.max) == (59, 30, 57, 59)
+    hourly = MetricRollup.objects.get(resolution='1h')
+    assert (hourly.count, hourly.p99, hourly.max) == (101, 100, 500)
+
+    # Re-running is idempotent, and raw points past their retention are deleted.
+    summary = rollup_metrics(now=hour + timedelta(hours=3))
+    assert summary['deleted_raw'] == 101
+    assert MetricRollup.objects.filter(resolution='1m').count() == 3
+
+
+def test_lazy_classifier_loads_once_on_first_use():
+    """
+    Tests that the lazy classifier proxy defers construction and reports its progress.
+    """
+    from api.services import LazyClassifier
+
+    built = []
+
+    def factory(report_stage):
+        report_stage('loading_model')
+        classifier = MagicMock(is_ready=True, model_version="abc", serving_model=None)
+        built.append(classifier)
+        return classifier
+
+    lazy = LazyClassifier(factory)
+    assert lazy.status()["state"] == "not_loaded"
+    assert not built
+
+    lazy.preprocess_text("hello")
+    lazy.preprocess_text("again")
+    assert len(built) == 1
+    assert built[0].preprocess_text.call_count == 2
+    assert lazy.status()["state"] == "ready"
+    assert lazy.status()["model_version"] == "abc"
+
+
+def test_readiness_probe_reports_loading_state():
+    """
+    Tests that the readiness probe answers 503 until the classifier is loaded, without authentication.
+    """
+    from api.services import LazyClassifier
+
+    lazy = LazyClassifier(lambda report_stage: MagicMock(is_ready=True, model_version="abc", serving_model=None))
+    client = APIClient()
+    with patch('api.views.ai_classifier', lazy):
+        assert client.get(reverse('ai-ready')).status_code == 503
+        lazy.load()
+        response = client.get(reverse('ai-ready'))
+    assert response.status_code == 200
+    assert response.data["state"] == "ready"
+
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    """
+    Tests that concurrent submissions are processed together in a single batch.
+    """
+    import asyncio
+    from api.intent_classifier.batching import MicroBatcher
+
+    batch_sizes = []
+
+    def process_batch(items):
+        batch_sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process_batch, max_batch_size=8, max_latency_ms=50)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    results = asyncio.run(run())
+    batcher.stop()
+
+    assert results == [0, 2, 4, 6, 8]
+    assert batch_sizes == [5]
+    assert batcher.stats()["batches"] == 1
+
+
+def test_micro_batcher_rejects_when_queue_is_full():
+    """
+    Tests that the batcher applies backpressure instead of queueing without bound.
+    """
+    import threading
+    import time
+    from api.intent_classifier.batching import MicroBatcher, QueueFullError
+
+    release = threading.Event()
+
+    def process_batch(items):
+        release.wait(timeout=5)
+        return items
+
+    batcher = MicroBatcher(process_batch, max_batch_size=1, max_latency_ms=0, max_queue_size=1)
+    first = batcher.submit_nowait("first")
+    # Wait until the worker has taken the first item, leaving the queue empty again.
+    while batcher.queue_depth:
+        time.sleep(0.001)
+    batcher.submit_nowait("second")
+
+    with pytest.raises(QueueFullError):
+        batcher.submit_nowait("third")
+
+    release.set()
+    assert first.result(timeout=5) == "first"
+    batcher.stop()
+
+
+def test_entity_matcher_matches_legacy_alias_loop():
+    """
+    Tests that the compiled alias automaton returns the same entities as the per-alias regex loop.
+    """
+    from api.intent_classifier.benchmarks import legacy_extract_entities
+    from api.intent_classifier.entity_matcher import EntityMatcher
+
+    apps_config = {"applications": [
+        {"id": "Microsoft.VisualStudio", "aliases": ["visual studio"]},
+        {"id": "Microsoft.VisualStudioCode", "aliases": ["vscode", "visual studio code"]},
+        {"id": "Git.Git", "aliases": ["git"]},
+    ]}
+    envs_config = {"environments": [
+        {"id": "python_dev", "apps": ["Python.Python.3.12", "Git.Git"]},
+        {"id": "web_dev", "apps": ["OpenJS.NodeJS"]},
+    ]}
+    matcher = EntityMatcher(apps_config, envs_config)
+
+    texts = [
+        "install visual studio code and git",
+        "install github desktop",
+        "setup web dev and python dev",
+        "ثبت vscode",
+        "",
+    ]
+    for text in texts:
+        assert matcher.extract(text) == legacy_extract_entities(text, apps_config, envs_config)
+
+
+def test_text_normalizer_matches_legacy_preprocessing():
+    """
+    Tests that the single-pass normalizer produces the same text and language as the original functions.
+    """
+    import json
+    from api.intent_classifier.benchmarks import legacy_detect_language, legacy_preprocess_text, sample_user_messages
+    from api.intent_classifier.normalizer import TextNormalizer
+
+    with open('./config/ai/intents.json', 'r', encoding='utf-8') as f:
+        messages = sample_user_messages(json.load(f), 500)
+    messages += ["", "!!!", "ﻻ تثبت", "mail me at a@b.c or http://x.y/z", "أَهلاً بِكـــم في الدعم"]
+
+    normalizer = TextNormalizer(cache_size=64)
+    for message in messages:
+        result = normalizer.normalize(message)
+        assert result.text == legacy_preprocess_text(message)
+        assert result.language == legacy_detect_language(unicodedata.normalize('NFKC', message.lower()))
+        assert " ".join(result.tokens) == result.text
@@ -1,8 +1,12 @@
 from django.urls import path
-from .views import AiRequestView
+from .views import AiRequestView, AiStatsView, AiReadinessView, AiWarmupView, MetricsView
 
 urlpatterns = [
     path('ai-request/', AiRequestView.as_view(), name='ai-request'),
+    path('ai-stats/', AiStatsView.as_view(), name='ai-stats'),
+    path('ai/ready/', AiReadinessView.as_view(), name='ai-ready'),
+    path('ai/warmup/', AiWarmupView.as_view(), name='ai-warmup'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     # path('admin/run-command/', AdminOperationView.as_view(), name='admin-run-command'),
     # path('analytics/dashboard/', AnalyticsDashboardView.as_view(), name='analytics-dashboard'),
 ]
@@ -4,9 +4,18 @@ from asgiref.sync import async_to_sync
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.permissions import AllowAny, IsAdminUser
+from .audit import audit_log_writer
+from .intent_classifier.batching import QueueFullError
+from .metrics import RESOLUTIONS
+from .models import MetricRollup, SystemMetric
+from .result_cache import make_result
 from .services import ai_classifier_instance as ai_classifier
 from .services import response_formatter_instance as response_formatter
+from .services import result_cache_instance as result_cache
+from .services import metrics_recorder_instance as metrics_recorder
 
 logger = logging.getLogger(__name__)
 
@@ -23,14 +32,119 @@ class AiRequestView(APIView):
         if not query:
             return Response({"error": "Query is required."}, status=status.HTTP_400_BAD_REQUEST)
 
+        if not ai_classifier.loaded:
+            # The first request of a lazily started worker loads the model off the event loop.
+            await ai_classifier.aload()
+        # Repeated questions are answered from the cache without running the model.
+        normalized_query = ai_classifier.preprocess_text(query)
+        if result_cache is not None:
+            cached = result_cache.get(normalized_query, ai_classifier.model_version)
+            if cached is not None:
+                return Response(_ai_response_data(cached), status=status.HTTP_200_OK)
+
         # The view's only job now is to classify and return the result.
         # The frontend will decide if a gRPC call is needed.
-        classification_result = await ai_classifier.classify(query)
-        initial_response = response_formatter.generate_response(classification_result)
-        
-        response_data = {
-            "initial_response": initial_response,
-            "intent": classification_result.get("intent"),
-            "entities": classification_result.get("entities", {})
-        }
-        return Response(response_data, status=status.HTTP_200_OK)
+        try:
+            classification_result = await ai_classifier.classify(query)
+        except QueueFullError as e:
+            logger.warning(f"Rejecting AI request under load: {e}")
+            return Response({"error": "The assistant is busy, please retry shortly."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        result = make_result(classification_result, response_formatter.generate_response(classification_result))
+        if result_cache is not None and "error" not in classification_result:
+            result_cache.set(normalized_query, ai_classifier.model_version, result)
+        return Response(_ai_response_data(result), status=status.HTTP_200_OK)
+
+
+def _ai_response_data(result):
+    """Maps a cached result to the fields AiRequestView has always returned."""
+    return {
+        "initial_response": result.get("response"),
+        "intent": result.get("intent"),
+        "entities": result.get("entities", {})
+    }
+
+
+class AiStatsView(APIView):
+    """Reports inference batching, result cache and audit writer counters."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({
+            "classifier": ai_classifier.status(),
+            "batching": ai_classifier.batcher.stats() if ai_classifier.loaded else None,
+            "result_cache": result_cache.stats() if result_cache is not None else None,
+            "audit_log": audit_log_writer.stats(),
+            "metrics": metrics_recorder.stats() if metrics_recorder is not None else None,
+        }, status=status.HTTP_200_OK)
+
+
+class AiReadinessView(APIView):
+    """
+    Readiness probe: 200 once the classifier is loaded with a model, 503 (with the
+    load progress) before that. Unauthenticated and unthrottled so orchestrators can poll it.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    throttle_classes = []
+
+    def get(self, request, *args, **kwargs):
+        classifier_status = ai_classifier.status()
+        is_ready = classifier_status["state"] == "ready" and classifier_status.get("model_ready", False)
+        return Response(classifier_status,
+                        status=status.HTTP_200_OK if is_ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class AiWarmupView(APIView):
+    """
+    Starts loading the classifier if it is not loaded yet. Returns 202 while loading,
+    or waits for the load to finish when called with ?wait=true.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        if request.query_params.get('wait') == 'true':
+            try:
+                ai_classifier.load()
+            except Exception:
+                return Response(ai_classifier.status(), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        else:
+            ai_classifier.start_loading()
+        classifier_status = ai_classifier.status()
+        return Response(classifier_status,
+                        status=status.HTTP_200_OK if ai_classifier.loaded else status.HTTP_202_ACCEPTED)
+
+
+class MetricsView(APIView):
+    """
+    Returns rolled-up SystemMetric buckets for a time range.
+    Query parameters: metric (required), start/end (ISO 8601, default: the last hour)
+    and resolution ('1m' or '1h', default: '1h' for ranges longer than six hours).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        metric = request.query_params.get('metric')
+        if metric not in dict(SystemMetric.METRIC_CHOICES):
+            return Response({"error": "A valid 'metric' is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        end = parse_datetime(request.query_params.get('end', '')) or timezone.now()
+        start = parse_datetime(request.query_params.get('start', '')) or end - RESOLUTIONS['1h']
+        if start >= end:
+            return Response({"error": "'start' must be before 'end'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        resolution = request.query_params.get('resolution') or ('1h' if end - start > 6 * RESOLUTIONS['1h'] else '1m')
+        if resolution not in RESOLUTIONS:
+            return Response({"error": f"'resolution' must be one of {', '.join(RESOLUTIONS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        points = MetricRollup.objects.filter(
+            metric_name=metric, resolution=resolution, bucket_start__gte=start, bucket_start__lt=end,
+        ).values('bucket_start', 'count', 'p50', 'p95', 'p99', 'max')
+        return Response({
+            "metric": metric,
+            "resolution": resolution,
+            "start": start,
+            "end": end,
+            "points": list(points),
+        }, status=status.HTTP_200_OK)
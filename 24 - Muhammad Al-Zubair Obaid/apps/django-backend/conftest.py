@@ -0,0 +1,16 @@
+# conftest.py
+import pytest
+from unittest.mock import patch
+
+
+@pytest.fixture(autouse=True)
+def audit_log_writer():
+    """
+    Gives every test its own audit writer that never starts a background thread, so
+    records from one test are never flushed into another test's database.
+    """
+    from api.audit import AuditLogWriter
+
+    writer = AuditLogWriter(autostart=False)
+    with patch('api.middleware.audit_log_writer', writer), patch('api.views.audit_log_writer', writer):
+        yield writer
@@ -144,6 +144,76 @@ CHANNEL_LAYERS = {
     }
 }
 
+# --- AI Classifier Settings ---
+# Concurrent classification requests are coalesced into batches of up to MAX_BATCH_SIZE,
+# waiting at most MAX_BATCH_LATENCY_MS for a batch to fill. Requests beyond MAX_QUEUE_SIZE
+# pending items are rejected with 503 instead of piling up.
+# SERVING_BACKEND selects the artifact written by run_export.py: 'auto' (quantized TFLite if
+# exported, else the SavedModel), 'tflite', 'saved_model', or 'eager' to always load the full model.
+# The TFLite interpreter memory-maps the model file read-only, so with 'tflite' every worker
+# process on a host shares one copy of the weights through the page cache.
+# LOAD_MODE controls when TensorFlow and the model are loaded: 'lazy' (first request or
+# POST /api/ai/warmup/), 'background' (a thread started at worker boot; requests wait for it),
+# or 'eager' (during AppConfig.ready(), which also slows every manage.py command).
+# GET /api/ai/ready/ reports the load progress for readiness probes.
+AI_CLASSIFIER = {
+    'LOAD_MODE': 'lazy',
+    'MAX_BATCH_SIZE': 32,
+    'MAX_BATCH_LATENCY_MS': 5.0,
+    'MAX_QUEUE_SIZE': 1024,
+    'SERVING_BACKEND': 'auto',
+}
+
+# Results for repeated (normalized) queries are cached per model version. 'memory' keeps a
+# per-process LRU; 'django' uses the CACHES entry named by CACHE_ALIAS so hits are shared
+# across workers (configure a shared cache such as Redis for that).
+AI_RESULT_CACHE = {
+    'BACKEND': 'memory',
+    'MAX_ENTRIES': 2048,
+    'TTL_SECONDS': 300,
+    'CACHE_ALIAS': 'default',
+}
+
+# Queries sent over the support chat WebSocket. Each connection may have MAX_IN_FLIGHT
+# queries running at once and may start at most RATE_LIMIT queries per RATE_WINDOW_SECONDS.
+# Clients authenticate with their session or by passing ?token=<JWT access token>.
+SUPPORT_CHAT_WS = {
+    'MAX_IN_FLIGHT': 4,
+    'RATE_LIMIT': 20,
+    'RATE_WINDOW_SECONDS': 10,
+    'MAX_QUERY_LENGTH': 1000,
+    'REQUIRE_AUTHENTICATION': True,
+}
+
+# SystemMetric points (inference/tokenizer/queue-wait timings and CPU/RSS samples) are
+# buffered by api.metrics and bulk-written every FLUSH_INTERVAL_SECONDS. Every
+# ROLLUP_INTERVAL_SECONDS (or via `manage.py rollup_metrics`) raw points are rolled into
+# 1-minute and 1-hour aggregates. Raw points must be kept for more than an hour so the
+# hourly rollups can be computed from them.
+METRICS = {
+    'ENABLED': True,
+    'FLUSH_INTERVAL_SECONDS': 5,
+    'BATCH_SIZE': 500,
+    'MAX_BUFFER': 10000,
+    'SAMPLE_INTERVAL_SECONDS': 15,
+    'ROLLUP_INTERVAL_SECONDS': 60,
+    'RAW_RETENTION_HOURS': 24,
+    'MINUTE_RETENTION_DAYS': 7,
+    'HOUR_RETENTION_DAYS': 365,
+}
+
+# OperationLog rows are buffered by api.audit and written with bulk_create every BATCH_SIZE
+# records or FLUSH_INTERVAL_MS, whichever comes first. When MAX_QUEUE_SIZE records are
+# waiting, OVERFLOW decides whether new records are dropped ('drop') or appended to
+# SPILL_PATH ('spill') and replayed once the writer catches up.
+AUDIT_LOG = {
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL_MS': 500,
+    'MAX_QUEUE_SIZE': 10000,
+    'OVERFLOW': 'drop',
+    'SPILL_PATH': str(BASE_DIR / 'logs' / 'audit_spill.jsonl'),
+}
+
 # --- Django REST Framework Settings ---
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -0,0 +1,173 @@
+# audio_buffer.py
+import ctypes
+import threading
+
+import numpy as np
+import speech_recognition as sr
+
+DEFAULT_BUFFER_SECONDS = 10
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size ring of int16 samples shared between the microphone reader and its consumers.
+
+    The storage is allocated once; `write` copies each frame into it without allocating.
+    Positions are absolute sample counts since the buffer was created, so a reader can
+    keep its own cursor and resume exactly where it stopped, as long as it does not fall
+    more than `capacity` samples behind the writer.
+    """
+
+    def __init__(self, sample_rate, seconds=DEFAULT_BUFFER_SECONDS, frame_length=1):
+        # السعة من مضاعفات طول الإطار حتى لا ينقسم أي إطار على طرفي الحلقة
+        frames = max(1, int(sample_rate * seconds) // frame_length)
+        self.capacity = frames * frame_length
+        self.sample_rate = sample_rate
+        self._samples = np.zeros(self.capacity, dtype=np.int16)
+        self._position = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def position(self):
+        """Absolute index of the next sample to be written."""
+        return self._position
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def write(self, frame):
+        count = len(frame)
+        with self._condition:
+            start = self._position % self.capacity
+            end = start + count
+            if end <= self.capacity:
+                self._samples[start:end] = frame
+            else:
+                split = self.capacity - start
+                self._samples[start:] = frame[:split]
+                self._samples[:end - self.capacity] = frame[split:]
+            self._position += count
+            self._condition.notify_all()
+
+    def read(self, position, count, timeout=None):
+        """
+        Returns (samples, next position) for `count` samples starting at `position`, waiting
+        for the writer when they are not available yet. A reader that fell behind the ring
+        skips forward to the oldest sample still held. Returns fewer samples (possibly none)
+        when the buffer is closed or `timeout` expires.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or self._position - position >= count, timeout)
+            position = max(position, self._position - self.capacity)
+            count = min(count, self._position - position)
+            if count <= 0:
+                return np.empty(0, dtype=np.int16), position
+            start = position % self.capacity
+            end = start + count
+            if end <= self.capacity:
+                samples = self._samples[start:end].copy()
+            else:
+                samples = np.concatenate((self._samples[start:], self._samples[:end - self.capacity]))
+            return samples, position + count
+
+    def read_into(self, position, out, timeout=None):
+        """
+        Like `read`, but copies into the preallocated array `out` (filling it completely or
+        not at all) and returns (samples copied, next position). Used by readers that run
+        for every frame, such as the wake-word detector.
+        """
+        count = len(out)
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._closed or self._position - position >= count, timeout):
+                return 0, position
+            position = max(position, self._position - self.capacity)
+            if self._position - position < count:
+                return 0, position
+            start = position % self.capacity
+            end = start + count
+            if end <= self.capacity:
+                out[:] = self._samples[start:end]
+            else:
+                split = self.capacity - start
+                out[:split] = self._samples[start:]
+                out[split:] = self._samples[:end - self.capacity]
+            return count, position + count
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class PorcupineFrameProcessor:
+    """
+    Runs Porcupine on a preallocated int16 frame.
+
+    `Porcupine.process` expects a sequence of Python ints and copies it into a new ctypes
+    array on every call. When the installed pvporcupine exposes its native handle, the
+    frame's memory is passed to the library directly instead; otherwise the public API
+    is used.
+    """
+
+    def __init__(self, porcupine):
+        self.porcupine = porcupine
+        self.frame = np.zeros(porcupine.frame_length, dtype=np.int16)
+        self._pointer = self.frame.ctypes.data_as(ctypes.POINTER(ctypes.c_short))
+        self._keyword_index = ctypes.c_int()
+        self._process_func = getattr(porcupine, '_process_func', None)
+        self._handle = getattr(porcupine, '_handle', None)
+        statuses = getattr(porcupine, 'PicovoiceStatuses', None)
+        self._success = getattr(statuses, 'SUCCESS', None)
+        self.native = None not in (self._process_func, self._handle, self._success)
+
+    def process(self):
+        """Returns the detected keyword index for the current contents of `frame`, or -1."""
+        if self.native:
+            status = self._process_func(self._handle, self._pointer, ctypes.byref(self._keyword_index))
+            if status == self._success:
+                return self._keyword_index.value
+        # المسار العام، ويرفع أيضاً الاستثناء المناسب عند فشل المسار المباشر
+        return self.porcupine.process(self.frame.tolist())
+
+
+class _RingBufferStream:
+    def __init__(self, source):
+        self._source = source
+
+    def read(self, size):
+        return self._source.read_bytes(size)
+
+
+class BufferedAudioSource(sr.AudioSource):
+    """
+    A speech_recognition audio source that reads from the wake-word engine's ring buffer
+    instead of opening the microphone again, so listening starts without reopening the
+    device and without losing the audio spoken while it would have been opening.
+    """
+
+    def __init__(self, ring_buffer, chunk_size=1024, read_timeout=2.0):
+        self.ring_buffer = ring_buffer
+        self.SAMPLE_RATE = ring_buffer.sample_rate
+        self.SAMPLE_WIDTH = 2
+        self.CHUNK = chunk_size
+        self.read_timeout = read_timeout
+        self.stream = None
+        self._cursor = ring_buffer.position
+
+    def __enter__(self):
+        self.stream = _RingBufferStream(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+
+    def seek(self, position=None):
+        """Moves the read cursor to `position` (default: now) so older audio is skipped."""
+        self._cursor = self.ring_buffer.position if position is None else position
+
+    def read_bytes(self, frame_count):
+        samples, self._cursor = self.ring_buffer.read(self._cursor, frame_count, timeout=self.read_timeout)
+        # عند توقف محرك كلمة التفعيل تُعاد بيانات فارغة فينتهي الاستماع
+        return samples.tobytes()
@@ -0,0 +1,165 @@
+# audio_capture.py
+import math
+import time
+import logging
+import threading
+
+import numpy as np
+import pyaudio
+
+from PySide6.QtCore import QThread, Signal
+
+from audio_buffer import AudioRingBuffer, BufferedAudioSource, DEFAULT_BUFFER_SECONDS
+
+# القيم التي يتطلبها Porcupine؛ بقية المستهلكين (التعرف على الكلام ومقياس المستوى) يتكيفون معها
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 512
+
+LEVEL_INTERVAL_SECONDS = 0.1
+LEVEL_FLOOR_DB = -60.0
+REOPEN_DELAY_SECONDS = 1.0
+
+
+class AudioCaptureService(QThread):
+    """
+    Keeps a single microphone stream open for the whole session and shares it.
+
+    Every frame is written to `audio_buffer`, which pulling consumers read with their own
+    cursor (the wake-word detector, and speech recognition through `create_audio_source`,
+    whose listen() does the VAD/endpointing). Callbacks registered with `subscribe` are
+    called with each frame on the capture thread and must return quickly. The input level
+    is published through `level_changed` (0.0 - 1.0) about ten times a second.
+
+    `set_device` switches the microphone in place: the stream is reopened inside the
+    capture loop while consumers keep reading from the same buffer.
+    """
+    level_changed = Signal(float)
+    device_changed = Signal(int)
+    capture_error = Signal(str)
+
+    def __init__(self, device_index=None, buffer_seconds=DEFAULT_BUFFER_SECONDS):
+        super().__init__()
+        self.sample_rate = SAMPLE_RATE
+        self.frame_length = FRAME_LENGTH
+        self.audio_buffer = AudioRingBuffer(SAMPLE_RATE, buffer_seconds, FRAME_LENGTH)
+        self._device_index = self._normalize_device(device_index)
+        self._device_switch_requested = False
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._is_running = True
+        self._level_scratch = np.zeros(FRAME_LENGTH, dtype=np.float32)
+
+    @staticmethod
+    def _normalize_device(device_index):
+        # القيمة -1 تعني عدم العثور على ميكروفون افتراضي، فنترك PyAudio يختار
+        return device_index if device_index is not None and device_index >= 0 else None
+
+    @property
+    def device_index(self):
+        return self._device_index
+
+    def set_device(self, device_index):
+        """Switches to another input device without stopping the service or its consumers."""
+        device_index = self._normalize_device(device_index)
+        with self._lock:
+            if device_index == self._device_index and self.isRunning():
+                return
+            self._device_index = device_index
+            self._device_switch_requested = True
+        if not self.isRunning():
+            self.start()
+
+    def ensure_started(self):
+        """Starts capturing if it is not already; the service runs until `stop` at shutdown."""
+        if not self.isRunning():
+            self.start()
+
+    def subscribe(self, callback):
+        """Registers `callback(frame)`; `frame` is an int16 array that is only valid during the call."""
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [subscriber for subscriber in self._subscribers if subscriber != callback]
+
+    def create_audio_source(self):
+        """A speech_recognition source that starts at the current moment of the shared stream."""
+        return BufferedAudioSource(self.audio_buffer)
+
+    def stop(self):
+        self._is_running = False
+        self.audio_buffer.close()
+
+    def run(self):
+        pa = pyaudio.PyAudio()
+        stream = None
+        next_level_at = 0.0
+        try:
+            while self._is_running:
+                if stream is None or self._device_switch_requested:
+                    stream = self._reopen_stream(pa, stream)
+                    if stream is None:
+                        self.msleep(int(REOPEN_DELAY_SECONDS * 1000))
+                        continue
+
+                try:
+                    pcm = stream.read(self.frame_length, exception_on_overflow=False)
+                except (IOError, OSError) as e:
+                    # غالباً فُصل الميكروفون؛ نعيد المحاولة دون إيقاف المستهلكين
+                    logging.error("Audio capture read error: %s", e)
+                    self.capture_error.emit(str(e))
+                    stream = self._close_stream(stream)
+                    continue
+
+                frame = np.frombuffer(pcm, dtype=np.int16)
+                self.audio_buffer.write(frame)
+                for callback in self._subscribers:
+                    try:
+                        callback(frame)
+                    except Exception as e:
+                        logging.error("Audio subscriber %r failed: %s", callback, e)
+
+                now = time.monotonic()
+                if now >= next_level_at:
+                    self.level_changed.emit(self._level(frame))
+                    next_level_at = now + LEVEL_INTERVAL_SECONDS
+        finally:
+            self._close_stream(stream)
+            pa.terminate()
+            self.audio_buffer.close()
+
+    def _reopen_stream(self, pa, stream):
+        self._close_stream(stream)
+        with self._lock:
+            device_index = self._device_index
+            self._device_switch_requested = False
+        try:
+            stream = pa.open(rate=self.sample_rate, channels=1, format=pyaudio.paInt16, input=True,
+                             input_device_index=device_index, frames_per_buffer=self.frame_length)
+        except (IOError, OSError) as e:
+            logging.error("Could not open microphone (index %s): %s", device_index, e)
+            self.capture_error.emit(str(e))
+            return None
+        logging.info("Audio capture started on microphone index %s.", device_index)
+        self.device_changed.emit(-1 if device_index is None else device_index)
+        return stream
+
+    @staticmethod
+    def _close_stream(stream):
+        if stream is not None:
+            try:
+                stream.stop_stream()
+                stream.close()
+            except (IOError, OSError) as e:
+                logging.warning("Error closing microphone stream: %s", e)
+        return None
+
+    def _level(self, frame):
+        np.copyto(self._level_scratch, frame)
+        rms = math.sqrt(float(np.dot(self._level_scratch, self._level_scratch)) / len(frame)) / 32768.0
+        if rms <= 0:
+            return 0.0
+        db = 20 * math.log10(rms)
+        return min(1.0, max(0.0, 1.0 - db / LEVEL_FLOOR_DB))
@@ -1,7 +1,6 @@
 # audio_manager.py
 import os
-import struct
-import pyaudio
+import queue
 import pvporcupine
 import speech_recognition as sr
 import pygame
@@ -11,96 +10,136 @@ import logging
 from PySide6.QtCore import QThread, Signal
 from PySide6.QtWidgets import QApplication
 
+from audio_buffer import PorcupineFrameProcessor
+
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 gemini_model = genai.GenerativeModel('gemini-1.5-flash')
 
 
 class AudioPlaybackThread(QThread):
+    """
+    Plays audio files one after another from a queue, so sentence chunks of a reply are
+    spoken back to back as they arrive. Files queued with `delete_after=True` are
+    temporary and removed once played; cached speech files are left in place.
+
+    Every `stop_playback` starts a new generation. Each queued file carries the generation
+    it was queued in and is only played while that generation is current, so a stop also
+    covers a file the worker has already taken off the queue.
+    """
     finished = Signal()
+    playback_started = Signal(str)
+
     def __init__(self):
         super().__init__()
+        self._queue = queue.Queue()
         self._is_playing = False
-        self._stop_requested = False
+        self._generation = 0
+        self._is_running = True
         self.current_audio_file = None
 
     def run(self):
-        self._is_playing = True
-        self._stop_requested = False
-        
-        try: # <--- إضافة هنا
-            while pygame.mixer.music.get_busy() and not self._stop_requested:
-                QApplication.processEvents()
-                self.msleep(50)
-            
-            if pygame.mixer.music.get_busy():
-                pygame.mixer.music.stop()
-            
-            pygame.mixer.music.unload()
-            
-        finally: # <--- إضافة هنا
-            # نضمن أن يتم حذف الملف المؤقت دائمًا، حتى لو حدث خطأ أثناء التشغيل
-            if self.current_audio_file and os.path.exists(self.current_audio_file):
-                try:
-                    os.remove(self.current_audio_file)
-                    logging.info(f"Successfully removed temporary audio file: {self.current_audio_file}") # <--- تم الإضافة
-                except Exception as e:
-                    logging.error("Error removing temporary audio file in AudioPlaybackThread finally block: %s", e) # <--- تم التعديل
-                finally: # <--- إضافة هنا
-                    self.current_audio_file = None # <--- تم الإضافة
-            self._is_playing = False
-            self.finished.emit()
-
-    def play_audio(self, file_path):
-        # قبل تشغيل ملف جديد، تأكد من إزالة أي ملف قديم متبقي
-        if self.current_audio_file and os.path.exists(self.current_audio_file): # <--- تم الإضافة
-            try: # <--- تم الإضافة
-                os.remove(self.current_audio_file) # <--- تم الإضافة
-                logging.info(f"Cleaned up previous temporary audio file before playing new one: {self.current_audio_file}") # <--- تم الإضافة
-            except Exception as e: # <--- تم الإضافة
-                logging.warning(f"Could not remove old temporary audio file: {e}") # <--- تم الإضافة
+        while self._is_running:
+            try:
+                file_path, delete_after, generation = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self._play_file(file_path, delete_after, generation)
+            if self._queue.empty():
+                self._is_playing = False
+                self.finished.emit()
 
-        self.stop_playback()
+    def _play_file(self, file_path, delete_after, generation):
+        self._is_playing = True
         self.current_audio_file = file_path
         try:
+            # طلب إيقاف وصل بعد سحب الملف من الطابور يلغي تشغيله
+            if generation != self._generation:
+                return
             pygame.mixer.music.load(file_path)
+            if generation != self._generation:
+                pygame.mixer.music.unload()
+                return
             pygame.mixer.music.play()
-            if not self.isRunning():
-                self.start()
+            self.playback_started.emit(file_path)
+            while pygame.mixer.music.get_busy() and generation == self._generation:
+                # عند وجود مقطع تالٍ ننتظر بفواصل أقصر حتى يبدأ مباشرة بعد انتهاء الحالي
+                self.msleep(5 if not self._queue.empty() else 20)
+
+            if pygame.mixer.music.get_busy():
+                pygame.mixer.music.stop()
+            # التفريغ ضروري فقط لحذف الملفات المؤقتة؛ load التالي يستبدل الملف الحالي
+            if delete_after or self._queue.empty():
+                pygame.mixer.music.unload()
         except pygame.error as e:
             logging.error("Error playing audio: %s", e)
+        finally:
+            # نضمن أن يتم حذف الملف المؤقت دائمًا، حتى لو حدث خطأ أثناء التشغيل
+            if delete_after and os.path.exists(file_path):
+                try:
+                    os.remove(file_path)
+                except Exception as e:
+                    logging.error("Error removing temporary audio file in AudioPlaybackThread: %s", e)
             self.current_audio_file = None
 
+    def play_audio(self, file_path, delete_after=False):
+        """Queues a file to be played after everything queued before it."""
+        self._queue.put((file_path, delete_after, self._generation))
+        if not self.isRunning():
+            self.start()
+
     def stop_playback(self):
-        if self._is_playing:
-            self._stop_requested = True
-            self.wait(100)
-        if pygame.mixer.music.get_busy():
+        """Stops the current file and drops everything still queued."""
+        self._generation += 1
+        while True:
+            try:
+                file_path, delete_after, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if delete_after and os.path.exists(file_path):
+                os.remove(file_path)
+        if pygame.mixer.get_init() and pygame.mixer.music.get_busy():
             pygame.mixer.music.stop()
 
+    def shutdown(self):
+        self.stop_playback()
+        self._is_running = False
+
 
 class WakeWordThread(QThread):
+    """
+    Runs Porcupine on the frames of the shared AudioCaptureService. It reads the capture
+    ring buffer with its own cursor into a preallocated frame, so it neither opens the
+    microphone nor allocates per frame.
+    """
     wake_word_detected = Signal()
     stop_speaking_signal = Signal()
     wake_word_error_signal = Signal(str)
 
-    def __init__(self, access_key):
+    def __init__(self, access_key, audio_capture):
         super().__init__()
         self.access_key = access_key
+        self.audio_capture = audio_capture
         self._is_running = True
         self.porcupine = None # <--- تم الإضافة
-        self.pa = None # <--- تم الإضافة
-        self.audio_stream = None # <--- تم الإضافة
 
     def run(self):
         try:
             self.porcupine = pvporcupine.create(access_key=self.access_key, keyword_paths=[pvporcupine.KEYWORD_PATHS['alexa']])
-            self.pa = pyaudio.PyAudio()
-            self.audio_stream = self.pa.open(rate=self.porcupine.sample_rate, channels=1, format=pyaudio.paInt16, input=True, frames_per_buffer=self.porcupine.frame_length)
-            logging.info("Wake word engine started successfully.")
+            if (self.porcupine.sample_rate, self.porcupine.frame_length) != (self.audio_capture.sample_rate, self.audio_capture.frame_length):
+                raise RuntimeError("Porcupine frame format does not match the audio capture stream.")
+            processor = PorcupineFrameProcessor(self.porcupine)
+            audio_buffer = self.audio_capture.audio_buffer
+            self.audio_capture.ensure_started()
+            cursor = audio_buffer.position
+            logging.info("Wake word engine started successfully (native frame path: %s).", processor.native)
             while self._is_running:
-                pcm = self.audio_stream.read(self.porcupine.frame_length, exception_on_overflow=False)
-                pcm = struct.unpack_from("h" * self.porcupine.frame_length, pcm)
-                if self.porcupine.process(pcm) >= 0:
+                # المهلة تسمح بملاحظة طلب الإيقاف حتى أثناء تبديل الميكروفون
+                copied, cursor = audio_buffer.read_into(cursor, processor.frame, timeout=0.5)
+                if not copied:
+                    if audio_buffer.closed:
+                        break
+                    continue
+                if processor.process() >= 0:
                     if self._is_running: 
                         self.stop_speaking_signal.emit()
                         self.wake_word_detected.emit()
@@ -108,18 +147,13 @@ class WakeWordThread(QThread):
             logging.error("Wake word engine error: %s", e)
             self.stop_speaking_signal.emit()
             self.wake_word_error_signal.emit(str(e))
+        finally:
+            if self.porcupine:
+                self.porcupine.delete()
+                self.porcupine = None
 
     def stop(self):
         self._is_running = False
-        if self.porcupine:
-            self.porcupine.delete()
-            self.porcupine = None
-        if self.audio_stream:
-            self.audio_stream.close()
-            self.audio_stream = None
-        if self.pa:
-            self.pa.terminate()
-            self.pa = None
 
 
 class ConversationThread(QThread):
@@ -129,10 +163,12 @@ class ConversationThread(QThread):
     command_to_execute_signal = Signal(str)
     stop_speaking_signal = Signal() 
 
-    def __init__(self):
+    def __init__(self, audio_capture=None):
         super().__init__()
         self._is_in_conversation = True
         self.microphone_index = None
+        # مصدر صوت من خدمة الالتقاط المشتركة؛ إن لم تتوفر نفتح الميكروفون كالسابق
+        self.audio_source = audio_capture.create_audio_source() if audio_capture is not None else None
 
     def run(self):
         self.status_signal.emit("تفضل بأمرك...")
@@ -150,7 +186,15 @@ class ConversationThread(QThread):
         
         while self._is_in_conversation:
             try:
-                with sr.Microphone(device_index=self.microphone_index) as source:
+                if self.audio_source is not None and self.audio_source.ring_buffer.closed:
+                    self.audio_source = None
+                if self.audio_source is not None:
+                    # نبدأ من اللحظة الحالية حتى لا يُلتقط صوت المساعد أثناء الرد السابق
+                    self.audio_source.seek()
+                    source_context = self.audio_source
+                else:
+                    source_context = sr.Microphone(device_index=self.microphone_index)
+                with source_context as source:
                     recognizer.energy_threshold = 500
                     recognizer.dynamic_energy_threshold = False
                     recognizer.pause_threshold = 1.0
@@ -0,0 +1,317 @@
+# conversation_view.py
+import os
+import json
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QPoint, QRect, QRectF, QSize
+from PySide6.QtGui import QColor, QFont, QFontMetrics, QPainter, QPainterPath, QPixmap, QTextOption, QKeySequence
+from PySide6.QtWidgets import QApplication, QListView, QStyledItemDelegate, QAbstractItemView
+
+MessageRole = Qt.UserRole + 1
+
+AVATAR_SIZE = 40
+SPACING = 10
+BUBBLE_PADDING = 12
+BUBBLE_RADIUS = 18
+BUBBLE_MAX_WIDTH = 450
+ROW_MARGIN = 5
+CODE_ROW_HEIGHT = 260
+# مسافة إضافية (بالبكسل) فوق الجزء الظاهر وتحته تُنشأ فيها عروض الكود مسبقاً
+CODE_WIDGET_MARGIN = 400
+
+
+class Message(NamedTuple):
+    speaker: str
+    text: str
+    source: Optional[str]
+    is_user: bool
+
+    @property
+    def is_code(self):
+        text = self.text.strip()
+        return len(text) >= 6 and text.startswith("```") and text.endswith("```")
+
+
+class ConversationStore:
+    """
+    Compact message history. The newest `max_in_memory` messages are kept as tuples; when
+    `spill_path` is set, older messages are written to a JSON-lines file in pages of
+    `page_size` and read back a page at a time (with a small LRU of pages) when those
+    rows are scrolled into view.
+    """
+
+    def __init__(self, spill_path=None, max_in_memory=500, page_size=100, cached_pages=4):
+        self.spill_path = spill_path
+        self.max_in_memory = max_in_memory
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self._recent = []
+        self._offsets = []
+        self._pages = OrderedDict()
+        self._file = None
+        if spill_path:
+            os.makedirs(os.path.dirname(os.path.abspath(spill_path)), exist_ok=True)
+            # سجل الجلسة الحالية فقط
+            self._file = open(spill_path, 'w+b')
+
+    def __len__(self):
+        return len(self._offsets) + len(self._recent)
+
+    @property
+    def spilled(self):
+        return len(self._offsets)
+
+    def append(self, message):
+        self._recent.append(message)
+        if self._file is not None and len(self._recent) >= self.max_in_memory + self.page_size:
+            self._spill(self._recent[:self.page_size])
+            del self._recent[:self.page_size]
+
+    def get(self, row):
+        if row >= self.spilled:
+            return self._recent[row - self.spilled]
+        page = self._page(row // self.page_size)
+        return page[row % self.page_size]
+
+    def replace(self, row, message):
+        """Replaces an in-memory message (used while a reply is still streaming)."""
+        if row < self.spilled:
+            raise IndexError("Spilled messages are read-only.")
+        self._recent[row - self.spilled] = message
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _spill(self, messages):
+        self._file.seek(0, os.SEEK_END)
+        for message in messages:
+            self._offsets.append(self._file.tell())
+            self._file.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+
+    def _page(self, page_index):
+        page = self._pages.get(page_index)
+        if page is not None:
+            self._pages.move_to_end(page_index)
+            return page
+        self._file.seek(self._offsets[page_index * self.page_size])
+        page = [Message(*json.loads(self._file.readline())) for _ in range(self.page_size)]
+        self._pages[page_index] = page
+        if len(self._pages) > self.cached_pages:
+            self._pages.popitem(last=False)
+        return page
+
+
+class ConversationModel(QAbstractListModel):
+    """List model over a ConversationStore. Each row's MessageRole is a `Message`."""
+
+    def __init__(self, store=None, parent=None):
+        super().__init__(parent)
+        self.store = store or ConversationStore()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self.store.get(index.row())
+        if role == MessageRole:
+            return message
+        if role == Qt.DisplayRole:
+            return message.text
+        return None
+
+    def add_message(self, speaker, text, source=None, is_user=False):
+        row = len(self.store)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.store.append(Message(speaker, text, source, is_user))
+        self.endInsertRows()
+        return row
+
+    def append_text(self, row, text):
+        message = self.store.get(row)
+        self.store.replace(row, message._replace(text=message.text + text))
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+
+class ChatBubbleDelegate(QStyledItemDelegate):
+    """
+    Paints message bubbles directly (avatar, wrapped text, source line) instead of
+    instantiating a widget per row. Code rows only reserve space; ConversationView puts
+    a real code widget on them while they are visible.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        assets_dir = os.path.join(os.path.dirname(__file__), '..')
+        self.avatars = {
+            True: QPixmap(os.path.join(assets_dir, 'user.png')).scaled(AVATAR_SIZE, AVATAR_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation),
+            False: QPixmap(os.path.join(assets_dir, 'assistant.png')).scaled(AVATAR_SIZE, AVATAR_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation),
+        }
+        self.font = QFont("Segoe UI")
+        self.font.setPixelSize(14)
+        self.source_font = QFont("Segoe UI")
+        self.source_font.setPixelSize(10)
+        self._heights = {}
+        self._heights_width = None
+
+    def invalidate(self, row=None):
+        if row is None:
+            self._heights.clear()
+        else:
+            self._heights.pop(row, None)
+
+    def _text_width(self, view_width):
+        return max(50, min(BUBBLE_MAX_WIDTH, view_width - AVATAR_SIZE - SPACING - 2 * ROW_MARGIN) - 2 * BUBBLE_PADDING)
+
+    def _source_text(self, message):
+        return f"المصدر: {message.source}" if message.source and message.source != "user" else None
+
+    def _text_rect(self, message, text_width):
+        return QFontMetrics(self.font).boundingRect(QRect(0, 0, text_width, 100000), Qt.TextWordWrap, message.text)
+
+    def sizeHint(self, option, index):
+        view_width = self.parent().viewport().width()
+        if view_width != self._heights_width:
+            self._heights.clear()
+            self._heights_width = view_width
+        row = index.row()
+        height = self._heights.get(row)
+        if height is None:
+            message = index.data(MessageRole)
+            if message.is_code:
+                height = CODE_ROW_HEIGHT
+            else:
+                height = self._text_rect(message, self._text_width(view_width)).height() + 2 * BUBBLE_PADDING
+                if self._source_text(message):
+                    height += QFontMetrics(self.source_font).height() + 5
+                height = max(height, AVATAR_SIZE) + 2 * ROW_MARGIN
+            self._heights[row] = height
+        return QSize(view_width, height)
+
+    def paint(self, painter, option, index):
+        message = index.data(MessageRole)
+        if message.is_code:
+            return
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        row_rect = option.rect.adjusted(ROW_MARGIN, ROW_MARGIN, -ROW_MARGIN, -ROW_MARGIN)
+        text_width = self._text_width(option.rect.width())
+        text_rect = self._text_rect(message, text_width)
+        source_text = self._source_text(message)
+        source_height = QFontMetrics(self.source_font).height() + 5 if source_text else 0
+        bubble_width = max(text_rect.width(), QFontMetrics(self.source_font).horizontalAdvance(source_text) if source_text else 0) + 2 * BUBBLE_PADDING
+        bubble_height = text_rect.height() + source_height + 2 * BUBBLE_PADDING
+
+        if message.is_user:
+            avatar_x = row_rect.right() - AVATAR_SIZE
+            bubble_x = avatar_x - SPACING - bubble_width
+            color, text_color = QColor("#528bff"), QColor("white")
+        else:
+            avatar_x = row_rect.left()
+            bubble_x = avatar_x + AVATAR_SIZE + SPACING
+            color, text_color = QColor("#353b48"), QColor("#dcdde1")
+        painter.drawPixmap(avatar_x, row_rect.top(), self.avatars[message.is_user])
+
+        bubble = QRectF(bubble_x, row_rect.top(), bubble_width, bubble_height)
+        path = QPainterPath()
+        path.addRoundedRect(bubble, BUBBLE_RADIUS, BUBBLE_RADIUS)
+        painter.fillPath(path, color)
+
+        text_option = QTextOption()
+        text_option.setWrapMode(QTextOption.WordWrap)
+        text_option.setTextDirection(Qt.LayoutDirectionAuto)
+        painter.setFont(self.font)
+        painter.setPen(text_color)
+        inner = bubble.adjusted(BUBBLE_PADDING, BUBBLE_PADDING, -BUBBLE_PADDING, -BUBBLE_PADDING)
+        painter.drawText(QRectF(inner.left(), inner.top(), inner.width(), text_rect.height()), message.text, text_option)
+
+        if source_text:
+            painter.setFont(self.source_font)
+            painter.setPen(QColor("#b2bec3"))
+            painter.drawText(QRectF(inner.left(), inner.bottom() - source_height + 5, inner.width(), source_height - 5),
+                             Qt.AlignRight | Qt.AlignVCenter, source_text)
+        painter.restore()
+
+
+class ConversationView(QListView):
+    """
+    QListView for the conversation. Rich code views are created with `code_widget_factory`
+    only for code rows within CODE_WIDGET_MARGIN pixels of the viewport and destroyed once
+    they scroll away, so only a handful of widgets exist however long the session is.
+    Ctrl+C copies the selected message.
+    """
+
+    def __init__(self, code_widget_factory, parent=None):
+        super().__init__(parent)
+        self.code_widget_factory = code_widget_factory
+        self._code_widgets = {}
+        self.bubble_delegate = ChatBubbleDelegate(self)
+        self.setItemDelegate(self.bubble_delegate)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setResizeMode(QListView.Adjust)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(100)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setUniformItemSizes(False)
+        self.verticalScrollBar().valueChanged.connect(self._update_code_widgets)
+
+    def setModel(self, model):
+        super().setModel(model)
+        model.rowsInserted.connect(lambda parent, first, last: self._update_code_widgets())
+        model.dataChanged.connect(self._on_data_changed)
+
+    def _on_data_changed(self, top_left, bottom_right, roles=()):
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            self.bubble_delegate.invalidate(row)
+            index = self.model().index(row)
+            self.bubble_delegate.sizeHintChanged.emit(index)
+            # نص الرد اكتمل ككتلة كود أو لم يعد كذلك
+            widget = self._code_widgets.pop(row, None)
+            if widget is not None:
+                self.setIndexWidget(index, None)
+        self._update_code_widgets()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_code_widgets()
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy) and self.currentIndex().isValid():
+            QApplication.clipboard().setText(self.currentIndex().data(Qt.DisplayRole))
+            return
+        super().keyPressEvent(event)
+
+    def _visible_rows(self):
+        model = self.model()
+        if model is None or model.rowCount() == 0:
+            return range(0)
+        viewport = self.viewport().rect()
+        top = self.indexAt(viewport.topLeft() - QPoint(0, CODE_WIDGET_MARGIN))
+        bottom = self.indexAt(viewport.bottomLeft() + QPoint(0, CODE_WIDGET_MARGIN))
+        first = top.row() if top.isValid() else 0
+        last = bottom.row() if bottom.isValid() else model.rowCount() - 1
+        return range(first, last + 1)
+
+    def _update_code_widgets(self):
+        model = self.model()
+        if model is None:
+            return
+        visible = self._visible_rows()
+        for row in list(self._code_widgets):
+            if row not in visible:
+                self.setIndexWidget(model.index(row), None)
+                del self._code_widgets[row]
+        for row in visible:
+            if row in self._code_widgets:
+                continue
+            message = model.index(row).data(MessageRole)
+            if message.is_code:
+                widget = self.code_widget_factory(message)
+                self.setIndexWidget(model.index(row), widget)
+                self._code_widgets[row] = widget
@@ -4,31 +4,32 @@ import os
 import subprocess
 import difflib
 import json
-import spacy
-import importlib.util
 import webbrowser
-from gtts import gTTS
 import uuid
 import datetime
-import requests
 import io
 import urllib.parse
 import google.generativeai as genai
 import threading
 import logging
-import google.api_core.exceptions
-import tempfile
+import time
 
 # استيراد PySide6
 from PySide6.QtWidgets import (QApplication, QMainWindow, QPushButton, QTextEdit,
-                               QVBoxLayout, QWidget, QLabel, QListWidget,
-                               QListWidgetItem, QHBoxLayout, QGraphicsOpacityEffect,
-                               QDialog, QLineEdit, QDialogButtonBox, QComboBox)
+                               QVBoxLayout, QWidget, QLabel,
+                               QHBoxLayout, QGraphicsOpacityEffect,
+                               QDialog, QLineEdit, QDialogButtonBox, QComboBox, QProgressBar)
 from PySide6.QtCore import Qt, QThread, Signal, QPropertyAnimation, QEasingCurve, QTimer, QSize, QPoint, QSequentialAnimationGroup, QParallelAnimationGroup, QPauseAnimation
 from PySide6.QtGui import QPixmap, QMovie
 
 # استيراد مكونات إدارة الصوت من الملف الجديد
 from audio_manager import AudioPlaybackThread, WakeWordThread, ConversationThread
+from audio_capture import AudioCaptureService
+from speech_output import BACKENDS as TTS_BACKENDS, SpeechSynthesisThread
+from intent_router import IntentRouter, NLUModelLoaderThread
+from plugin_manager import PluginManager
+from llm_stream import GeminiStreamThread
+from conversation_view import ConversationModel, ConversationStore, ConversationView
 
 
 import pygame
@@ -149,7 +150,9 @@ class TypingIndicatorWidget(QWidget):
     def stop_animation(self): self.main_animation_group.stop(); self.hide()
 
 class SettingsDialog(QDialog):
-    def __init__(self, current_name, current_city, current_mic_index, parent=None):
+    TTS_ENGINE_LABELS = {"gtts": "Google (عبر الإنترنت)", "pyttsx3": "محلي (بدون إنترنت)"}
+
+    def __init__(self, current_name, current_city, current_mic_index, parent=None, current_tts_engine="gtts"):
         super().__init__(parent)
         self.setWindowTitle("الإعدادات")
         layout = QVBoxLayout(self)
@@ -174,6 +177,15 @@ class SettingsDialog(QDialog):
         layout.addWidget(mic_label)
         layout.addWidget(self.mic_combo)
 
+        tts_label = QLabel("محرك تحويل النص إلى كلام:")
+        self.tts_combo = QComboBox()
+        for engine_name in TTS_BACKENDS:
+            self.tts_combo.addItem(self.TTS_ENGINE_LABELS.get(engine_name, engine_name), engine_name)
+        idx = self.tts_combo.findData(current_tts_engine)
+        if idx != -1:
+            self.tts_combo.setCurrentIndex(idx)
+        layout.addWidget(tts_label)
+        layout.addWidget(self.tts_combo)
 
         layout.addStretch()
         button_box = QDialogButtonBox(QDialogButtonBox.Save | QDialogButtonBox.Cancel)
@@ -196,30 +208,44 @@ class SettingsDialog(QDialog):
         return {
             "name": self.name_input.text(),
             "city": self.city_input.text(),
-            "microphone_index": self.mic_combo.currentData()
+            "microphone_index": self.mic_combo.currentData(),
+            "tts_engine": self.tts_combo.currentData()
         }
 
 
 class MainWindow(QMainWindow):
+    _ui_call_requested = Signal(object)
+
     def __init__(self):
         super().__init__()
+        self._ui_call_requested.connect(self._run_ui_call)
         # تم تحديث المسار ليشير إلى user_data.json في مجلد data
         self.user_data_file = os.path.join(os.path.dirname(__file__), '..', 'data', 'user_data.json')
         self.user_name = None
         self.user_city = None
         self.microphone_index = None
+        self.tts_engine = "gtts"
         self.last_known_subject = None
 
-        self.commands = {}
         self.conversation_thread = None 
         self.audio_playback_thread = AudioPlaybackThread()
-
+        # بث ميكروفون واحد يبقى مفتوحاً ويتشاركه محرك كلمة التفعيل والتعرف على الكلام
+        self.audio_capture = AudioCaptureService()
+        # تحويل النص إلى كلام يتم خارج خيط الواجهة، جملة بجملة ومع كاش للعبارات المتكررة
+        self.speech_synthesis_thread = SpeechSynthesisThread(engine_name=self.tts_engine)
+        self.speech_synthesis_thread.chunk_ready.connect(self._play_speech_chunk)
+        self.speech_synthesis_thread.synthesis_error.connect(self._handle_speech_error)
+
+        # طبقات التوجيه: الكلمات المفتاحية للإضافات، ثم نموذج NLU، ثم Gemini
+        self.intent_router = IntentRouter()
+        self.plugin_manager = PluginManager(os.path.join(os.path.dirname(__file__), 'plugins'), self)
+        self.plugin_manager.plugins_changed.connect(self._update_plugin_routes)
         self.load_plugins()
 
         self.setWindowTitle("المساعد الصوتي | Hands-Free"); self.setGeometry(100, 100, 600, 800)
         self.setStyleSheet("""
             #main_widget { background-color: #282c34; }
-            QListWidget { background-color: #282c34; border: none; }
+            QListView { background-color: #282c34; border: none; }
             #user_message {
                 background-color: #528bff;
                 color: white;
@@ -243,8 +269,12 @@ class MainWindow(QMainWindow):
         main_layout.setContentsMargins(0,0,0,0)
         main_layout.setSpacing(0)
 
-        self.conversation_list = QListWidget()
-        self.conversation_list.setSpacing(10)
+        # سجل المحادثة: الرسائل تُرسم مباشرة، وعروض الكود تُنشأ للصفوف الظاهرة فقط،
+        # والرسائل القديمة تُنقل إلى ملف على القرص وتُقرأ صفحةً صفحة عند التمرير إليها
+        self.conversation_model = ConversationModel(ConversationStore(
+            os.path.join(os.path.dirname(__file__), '..', 'data', 'conversation_history.jsonl')), self)
+        self.conversation_view = ConversationView(lambda message: ChatMessageWidget(message.text, message.is_user, message.source))
+        self.conversation_view.setModel(self.conversation_model)
 
         bottom_widget = QWidget()
         bottom_widget.setObjectName("bottom_bar")
@@ -258,6 +288,11 @@ class MainWindow(QMainWindow):
         self.status_label = QLabel("جاري بدء المحرك...")
         self.typing_indicator = TypingIndicatorWidget()
         self.typing_indicator.hide()
+        self.mic_level_bar = QProgressBar()
+        self.mic_level_bar.setRange(0, 100)
+        self.mic_level_bar.setTextVisible(False)
+        self.mic_level_bar.setFixedSize(60, 6)
+        self.audio_capture.level_changed.connect(lambda level: self.mic_level_bar.setValue(int(level * 100)))
 
 
         bottom_layout.addWidget(self.settings_button)
@@ -265,8 +300,9 @@ class MainWindow(QMainWindow):
         bottom_layout.addWidget(self.status_label)
         bottom_layout.addWidget(self.typing_indicator)
         bottom_layout.addStretch()
+        bottom_layout.addWidget(self.mic_level_bar)
 
-        main_layout.addWidget(self.conversation_list)
+        main_layout.addWidget(self.conversation_view)
         main_layout.addWidget(bottom_widget)
 
         central_widget = QWidget()
@@ -279,16 +315,21 @@ class MainWindow(QMainWindow):
         pygame.mixer.init()
 
         self.gemini_chat_session = None
+        self.gemini_stream_threads = []
+        self._gemini_request_id = 0
+        self._speaking_request_id = None
+        self._streaming_message = None
+        self._ttfa_request = None
+        self.audio_playback_thread.playback_started.connect(self._on_playback_started)
 
         self.nlu_model = None
         self.preferred_browser_path = None
         self._set_preferred_browser()
-        try:
-            # تم تحديث المسار ليشير إلى nlu_model_ar في مجلد data
-            self.nlu_model = spacy.load(os.path.join(os.path.dirname(__file__), '..', 'data', 'nlu_model_ar'))
-            logging.info("NLU model loaded successfully.")
-        except IOError:
-            logging.warning("NLU model not found. Assistant will run in normal mode.")
+        # تحميل نموذج NLU في الخلفية حتى تظهر النافذة فوراً؛ حتى اكتماله تمر الأوامر بالكلمات المفتاحية ثم Gemini
+        # تم تحديث المسار ليشير إلى nlu_model_ar في مجلد data
+        self.nlu_loader_thread = NLUModelLoaderThread(os.path.join(os.path.dirname(__file__), '..', 'data', 'nlu_model_ar'))
+        self.nlu_loader_thread.model_loaded.connect(self._on_nlu_model_loaded)
+        self.nlu_loader_thread.start()
 
         self.follow_up_plugin = None
 
@@ -416,12 +457,13 @@ class MainWindow(QMainWindow):
             self.speak(f"عذراً، لا أعرف كيف أفتح برنامجاً اسمه '{app_name}'.", "تطبيق محلي")
 
     def open_settings_dialog(self):
-        dialog = SettingsDialog(self.user_name, self.user_city, self.microphone_index, self)
+        dialog = SettingsDialog(self.user_name, self.user_city, self.microphone_index, self, self.tts_engine)
         if dialog.exec():
             new_data = dialog.get_data()
             self.user_name = new_data["name"]
             self.user_city = new_data["city"]
             self.microphone_index = new_data["microphone_index"]
+            self._set_tts_engine(new_data["tts_engine"])
             
             with open(self.user_data_file, 'w', encoding='utf-8') as f:
                 json.dump(new_data, f, ensure_ascii=False, indent=4)
@@ -430,15 +472,7 @@ class MainWindow(QMainWindow):
             self.restart_audio_engines()
     
     def restart_audio_engines(self):
-        logging.info("Restarting audio engines to apply new settings...")
-        if hasattr(self, 'wake_word_thread') and self.wake_word_thread and self.wake_word_thread.isRunning():
-            self.wake_word_thread.stop()
-            self.wake_word_thread.wait()
-
-        if hasattr(self, 'conversation_thread') and self.conversation_thread and self.conversation_thread.isRunning():
-            self.conversation_thread.stop()
-            self.conversation_thread.wait()
-        
+        logging.info("Switching microphone to apply new settings...")
         if self.microphone_index is None:
             try:
                 import pyaudio
@@ -451,13 +485,17 @@ class MainWindow(QMainWindow):
                 logging.warning(f"Could not find default microphone, continuing without specific index. Error: {e}")
                 self.microphone_index = -1
 
-        self.start_wake_word_engine()
+        # يُعاد فتح البث داخل خدمة الالتقاط دون إيقاف محرك كلمة التفعيل أو المحادثة الجارية
+        self.audio_capture.set_device(self.microphone_index)
+        if not (hasattr(self, 'wake_word_thread') and self.wake_word_thread and self.wake_word_thread.isRunning()):
+            self.start_wake_word_engine()
         self.speak("تم تطبيق إعدادات الميكروفون الجديدة.", "إعدادات")
 
 
     def listen_for_single_response(self, timeout=10):
         recognizer = sr.Recognizer()
-        with sr.Microphone(device_index=self.microphone_index) as source:
+        self.audio_capture.set_device(self.microphone_index)
+        with self.audio_capture.create_audio_source() as source:
             self.update_status("أستمع...")
             QApplication.processEvents()
             recognizer.adjust_for_ambient_noise(source, duration=0.5)
@@ -498,15 +536,17 @@ class MainWindow(QMainWindow):
                 
                 self.speak("وأخيراً، يرجى اختيار الميكروفون الذي تود استخدامه من القائمة الظاهرة.", "إعدادات")
 
-                dialog = SettingsDialog(self.user_name, self.user_city, self.microphone_index, self)
+                dialog = SettingsDialog(self.user_name, self.user_city, self.microphone_index, self, self.tts_engine)
                 if dialog.exec():
                     new_data = dialog.get_data()
                     self.user_name = new_data["name"]
                     self.user_city = new_data["city"]
                     self.microphone_index = new_data["microphone_index"]
+                    self._set_tts_engine(new_data["tts_engine"])
 
                     user_data = {"name": self.user_name,
                                  "city": self.user_city,
+                                 "tts_engine": self.tts_engine,
                                  "microphone_index": self.microphone_index}
                     with open(self.user_data_file, 'w', encoding='utf-8') as f:
                         json.dump(user_data, f, ensure_ascii=False, indent=4)
@@ -529,6 +569,7 @@ class MainWindow(QMainWindow):
                 self.user_name = user_data.get("name")
                 self.user_city = user_data.get("city")
                 self.microphone_index = user_data.get("microphone_index")
+                self._set_tts_engine(user_data.get("tts_engine", "gtts"))
                 if self.microphone_index is None:
                     try:
                         import pyaudio
@@ -546,33 +587,38 @@ class MainWindow(QMainWindow):
             self.run_first_time_setup()
 
     def load_plugins(self):
-        plugins_dir = os.path.join(os.path.dirname(__file__), 'plugins')
-        if not os.path.exists(plugins_dir):
-            logging.warning(f"تنبيه: مجلد الإضافات '{plugins_dir}' غير موجود.")
-            return
-
+        # يُقرأ الملف التعريفي فقط؛ تُستورد الإضافات عند أول استخدام أو في الخلفية
         logging.info("--- Loading Plugins ---")
-        for filename in os.listdir(plugins_dir):
-            if filename.endswith(".py") and not filename.startswith("__"):
-                try:
-                    module_name = filename[:-3]
-                    file_path = os.path.join(plugins_dir, filename)
-
-                    spec = importlib.util.spec_from_file_location(module_name, file_path)
-                    module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(module)
-
-                    if hasattr(module, 'Plugin'):
-                        plugin_instance = module.Plugin()
-                        for keyword in plugin_instance.get_keywords():
-                            self.commands[keyword] = plugin_instance
-                        logging.info("[Success] Loaded plugin: %s", module_name)
-                except Exception as e:
-                    logging.error("[Failed] Failed to load plugin %s: %s", filename, e)
+        self.plugin_manager.load()
+        self._update_plugin_routes()
         logging.info("-----------------------")
 
+    @property
+    def commands(self):
+        return self.plugin_manager.commands
+
+    def _update_plugin_routes(self):
+        self.intent_router.set_plugins(self.plugin_manager.commands)
+
+    def run_on_ui_thread(self, func):
+        """Runs `func()` on the GUI thread; safe to call from plugin worker threads."""
+        self._ui_call_requested.emit(func)
+
+    def _run_ui_call(self, func):
+        try:
+            func()
+        except Exception as e:
+            logging.exception("Error in UI callback: %s", e)
+
+    def _on_nlu_model_loaded(self, model):
+        self.nlu_model = model
+        self.intent_router.nlu_model = model
+
 
     def stop_current_speech(self):
+        # بقية رد Gemini الجاري تُعرض نصاً دون أن تُنطق
+        self._speaking_request_id = None
+        self.speech_synthesis_thread.cancel()
         self.audio_playback_thread.stop_playback()
 
     def execute_command(self, command):
@@ -600,28 +646,20 @@ class MainWindow(QMainWindow):
             return # إيقاف المعالجة في execute_command
 
 
-        # 3. معالجة أوامر النظام باستخدام NLU (مع عتبة ثقة عالية)
-        intent = None
-        entities = {}
-        top_confidence = 0.0
-    
-        if self.nlu_model:
-            doc = self.nlu_model(command)
-            intents_scored = sorted(doc.cats.items(), key=lambda item: item[1], reverse=True)
-    
-            if intents_scored:
-                top_intent = intents_scored[0][0]
-                top_confidence = intents_scored[0][1]
-                if top_confidence > 0.75:
-                    intent = top_intent
-                    entities = {ent.label_: ent.text for ent in doc.ents}
-    
-            logging.info("NLU Analysis -> Top Intent: %s (Confidence: %.2f), Entities: %s",
-                         intent, top_confidence, entities)
-    
+        # 3. التوجيه المتدرج: كلمات الإضافات المفتاحية أولاً، ثم NLU (مع عتبة ثقة عالية)
+        route = self.intent_router.route(command)
+        if route.tier == "keyword":
+            logging.info("Keyword route -> '%s' (%s, %.3f ms)", route.keyword, route.plugin.name, route.latency_ms)
+            route.plugin.execute(self, command, self.speak)
+            self.last_known_subject = None
+            return
+
+        intent = route.intent
+        entities = route.entities
+
         if intent:
             if intent == "VOLUME_CONTROL":
-                volume_plugin = self.commands.get("صوت")
+                volume_plugin = self.plugin_manager.for_intent("VOLUME_CONTROL")
                 if volume_plugin: volume_plugin.execute(self, command, self.speak)
                 else: self.speak("عذراً، لا أستطيع التحكم بالصوت حالياً.", "خطأ محلي")
                 self.last_known_subject = None
@@ -637,13 +675,13 @@ class MainWindow(QMainWindow):
                 self.last_known_subject = None
                 return
             elif intent == "GET_TIME":
-                time_plugin = self.commands.get("الوقت")
+                time_plugin = self.plugin_manager.for_intent("GET_TIME")
                 if time_plugin: time_plugin.execute(self, command, self.speak)
                 else: self.speak("عذراً، لا أستطيع معرفة الوقت حالياً.", "خطأ محلي")
                 self.last_known_subject = None
                 return
             elif intent == "GET_WEATHER":
-                weather_plugin = self.commands.get("طقس")
+                weather_plugin = self.plugin_manager.for_intent("GET_WEATHER")
                 city = entities.get("LOCATION")
                 if weather_plugin:
                     if city: weather_plugin.execute_follow_up(city, self, self.speak)
@@ -689,7 +727,8 @@ class MainWindow(QMainWindow):
             self.wake_word_thread.wait()
 
         self.update_status("في انتظار كلمة التفعيل (أليكسا)...", "#A3BE8C")
-        self.wake_word_thread = WakeWordThread(access_key=os.getenv("PICOVOICE_ACCESS_KEY"))
+        self.audio_capture.set_device(self.microphone_index)
+        self.wake_word_thread = WakeWordThread(access_key=os.getenv("PICOVOICE_ACCESS_KEY"), audio_capture=self.audio_capture)
         self.wake_word_thread.wake_word_detected.connect(self.start_conversation_mode)
         self.wake_word_thread.stop_speaking_signal.connect(self.stop_current_speech)
         self.wake_word_thread.wake_word_error_signal.connect(self.handle_wake_word_error)
@@ -711,7 +750,7 @@ class MainWindow(QMainWindow):
         welcome_message = f"أهلاً {self.user_name}, تفضل بأمرك..." if self.user_name else "تفضل بأمرك..."
         self.update_status(welcome_message)
         self.gemini_chat_session = genai.GenerativeModel('gemini-1.5-flash').start_chat(history=[])
-        self.conversation_thread = ConversationThread()
+        self.conversation_thread = ConversationThread(audio_capture=self.audio_capture)
         self.conversation_thread.status_signal.connect(self.update_status)
         self.conversation_thread.conversation_signal.connect(self.add_message_to_conversation)
         self.conversation_thread.command_to_execute_signal.connect(self.execute_command)
@@ -721,12 +760,9 @@ class MainWindow(QMainWindow):
         self.conversation_thread.start()
 
     def add_message_to_conversation(self, speaker, text, source=None):
-        list_item = QListWidgetItem(self.conversation_list)
-        message_widget = ChatMessageWidget(text, speaker == "أنت", source)
-        list_item.setSizeHint(message_widget.sizeHint())
-        self.conversation_list.addItem(list_item)
-        self.conversation_list.setItemWidget(list_item, message_widget)
-        self.conversation_list.scrollToBottom()
+        row = self.conversation_model.add_message(speaker, text, source, speaker == "أنت")
+        self.conversation_view.scrollToBottom()
+        return row
 
     def update_status(self, text, color_hex="#EBCB8B"):
         self.status_icon.setStyleSheet(f"color: {color_hex};")
@@ -740,8 +776,12 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         logging.info("Closing application and stopping threads...")
-        self.audio_playback_thread.stop_playback()
+        self.speech_synthesis_thread.stop()
+        self.speech_synthesis_thread.wait()
+        self.audio_playback_thread.shutdown()
         self.audio_playback_thread.wait()
+        # إغلاق البث أولاً ينهي أي استماع جارٍ فتتوقف الخيوط التالية فوراً
+        self.audio_capture.stop()
 
         if hasattr(self, 'conversation_thread') and self.conversation_thread and self.conversation_thread.isRunning():
             self.conversation_thread.stop()
@@ -752,57 +792,103 @@ class MainWindow(QMainWindow):
             self.wake_word_thread.stop()
             self.wake_word_thread.wait()
             logging.info("Wake word thread stopped.")
-        
+
+        self.audio_capture.wait()
+        self.nlu_loader_thread.wait()
+        for thread in list(self.gemini_stream_threads):
+            thread.wait()
+        self.conversation_model.store.close()
         event.accept()
 
     def speak(self, text, source="المساعد"):
         self.update_status("يتحدث...")
         self.add_message_to_conversation("المساعد", text, source)
+        # يعود فوراً؛ يبدأ التشغيل بعد تجهيز أول جملة
+        self.speech_synthesis_thread.say(text)
 
-        temp_file_path = None
-        try:
-            tts = gTTS(text=text, lang='ar')
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp_audio:
-                tts.write_to_fp(tmp_audio)
-                temp_file_path = tmp_audio.name
+    def _play_speech_chunk(self, generation, file_path):
+        # تجاهل المقاطع التي وصلت بعد إيقاف الكلام
+        if generation == self.speech_synthesis_thread.generation:
+            self.audio_playback_thread.play_audio(file_path)
 
-            self.audio_playback_thread.play_audio(temp_file_path)
+    def _handle_speech_error(self, error_message):
+        self.add_message_to_conversation("المساعد", f"عذراً، لا أستطيع التحدث الآن: {error_message}", "خطأ صوتي")
 
-        except Exception as e:
-            logging.error("gTTS error: %s", e)
-            self.add_message_to_conversation("المساعد", f"عذراً، لا أستطيع التحدث الآن: {e}", "خطأ صوتي")
-            if temp_file_path and os.path.exists(temp_file_path):
-                logging.warning("Failed to delete temp audio file: %s - it might be in use.", temp_file_path)
+    def _set_tts_engine(self, engine_name):
+        self.tts_engine = engine_name or "gtts"
+        self.speech_synthesis_thread.set_engine(self.tts_engine)
 
 
     def handle_gemini_chat(self, command, keep_subject=False):
         self.update_status("أفكر...")
-        try:
-            response = self.gemini_chat_session.send_message(command)
-            self.speak(response.text, "Gemini")
-            if not keep_subject:
-                if len(response.text.split()) > 2:
-                    potential_subject = response.text.split()[0:3]
-                    if not any(k in potential_subject for k in ["الطقس", "الساعة", "الوقت", "تطبيق", "برنامج", "المتصفح", "يوتيوب"]):
-                        self.last_known_subject = " ".join(potential_subject)
-                    else:
-                        self.last_known_subject = None
+        self._gemini_request_id += 1
+        request_id = self._gemini_request_id
+        self._speaking_request_id = request_id
+        self._streaming_message = None
+        # الرد يصل عبر البث في خيط منفصل؛ النص يُعرض تدريجياً وكل جملة مكتملة تُرسل للنطق
+        thread = GeminiStreamThread(self.gemini_chat_session, command, request_id)
+        thread.first_token.connect(self._on_gemini_first_token)
+        thread.text_delta.connect(self._on_gemini_text)
+        thread.sentence_ready.connect(self._on_gemini_sentence)
+        thread.completed.connect(lambda rid, text: self._on_gemini_completed(rid, text, keep_subject))
+        thread.failed.connect(self._on_gemini_failed)
+        thread.finished.connect(lambda: self.gemini_stream_threads.remove(thread))
+        self.gemini_stream_threads.append(thread)
+        self._ttfa_request = (request_id, thread.started_at)
+        thread.start()
+
+    def _on_gemini_first_token(self, request_id, elapsed_ms):
+        self.intent_router.record_latency("llm", elapsed_ms)
+        logging.info("Gemini first token after %.0f ms", elapsed_ms)
+
+    def _on_gemini_text(self, request_id, text):
+        if request_id != self._gemini_request_id:
+            return
+        if self._streaming_message is None:
+            self._streaming_message = self.add_message_to_conversation("المساعد", text, "Gemini")
+        else:
+            self.conversation_model.append_text(self._streaming_message, text)
+            self.conversation_view.scrollToBottom()
+
+    def _on_gemini_sentence(self, request_id, sentence):
+        if request_id != self._speaking_request_id:
+            return
+        self.update_status("يتحدث...")
+        self.speech_synthesis_thread.say(sentence)
+
+    def _on_playback_started(self, file_path):
+        if self._ttfa_request is None:
+            return
+        request_id, started_at = self._ttfa_request
+        self._ttfa_request = None
+        if request_id == self._speaking_request_id:
+            logging.info("Gemini time to first audio: %.0f ms", (time.perf_counter() - started_at) * 1000)
+
+    def _on_gemini_completed(self, request_id, text, keep_subject):
+        if request_id != self._gemini_request_id:
+            return
+        # كتل الكود تتحول إلى عرض الكود تلقائياً عند اكتمال نصها (انظر ConversationView)
+        self._streaming_message = None
+        if not keep_subject:
+            if len(text.split()) > 2:
+                potential_subject = text.split()[0:3]
+                if not any(k in potential_subject for k in ["الطقس", "الساعة", "الوقت", "تطبيق", "برنامج", "المتصفح", "يوتيوب"]):
+                    self.last_known_subject = " ".join(potential_subject)
                 else:
                     self.last_known_subject = None
-            
-        except google.api_core.exceptions.InvalidArgument as e: 
+            else:
+                self.last_known_subject = None
+
+    def _on_gemini_failed(self, request_id, kind, message):
+        if request_id != self._gemini_request_id:
+            return
+        self._streaming_message = None
+        self.last_known_subject = None
+        if kind == "invalid_argument":
             self.speak("عذراً، لا يمكنني معالجة هذا الطلب. قد يكون هناك مشكلة في صياغة السؤال أو نوع المدخلات.", "خطأ Gemini")
-            logging.error("Gemini InvalidArgument Error: %s", e)
-            self.last_known_subject = None
-        except google.api_core.exceptions.ResourceExhausted as e:
+        elif kind == "resource_exhausted":
             self.speak("عذراً، لقد تجاوزتُ حد الاستخدام اليومي للذكاء الاصطناعي (الكوتا). يرجى المحاولة لاحقاً أو التحقق من استخدامك.", "خطأ Gemini")
-            logging.error("Gemini ResourceExhausted Error: %s", e)
-            self.last_known_subject = None
-        except requests.exceptions.ConnectionError as e:
+        elif kind == "connection":
             self.speak("عذراً، لا أستطيع الاتصال بخدمة الذكاء الاصطناعي. يرجى التحقق من اتصالك بالإنترنت.", "خطأ شبكة")
-            logging.error("Gemini Connection Error: %s", e)
-            self.last_known_subject = None
-        except Exception as e:
-            logging.exception("Gemini General Error: %s", e)
+        else:
             self.speak("عذرًا، حدث خطأ عام أثناء التواصل مع الذكاء الاصطناعي. يرجى مراجعة سجل الأخطاء.", "خطأ Gemini")
-            self.last_known_subject = None
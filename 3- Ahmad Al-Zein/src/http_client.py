@@ -0,0 +1,126 @@
+# http_client.py
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_POOL_SIZE = 4
+DEFAULT_WORKERS = 4
+DEFAULT_CACHE_ENTRIES = 256
+
+# مدة صلاحية الكاش لكل نقطة نهاية (بادئة الرابط -> ثوانٍ)
+DEFAULT_CACHE_TTLS = {
+    "http://api.weatherapi.com/v1/current.json": 10 * 60,
+    "https://api.weatherapi.com/v1/current.json": 10 * 60,
+}
+
+
+class HttpClient:
+    """
+    Shared HTTP layer for plugins.
+
+    One keep-alive `requests.Session` with at most `pool_size` connections per host,
+    default timeouts, and retries with backoff for connection errors and 429/5xx on GET.
+    Successful GET responses are cached for the TTL of the longest matching URL prefix
+    in `cache_ttls` (endpoints without a TTL are not cached), and identical requests
+    already in flight are coalesced into one. `get_async` runs on a small thread pool
+    and returns a Future, so callers on the GUI or conversation threads never block.
+    """
+
+    def __init__(self, cache_ttls=None, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE,
+                 retries=2, max_workers=DEFAULT_WORKERS, max_cache_entries=DEFAULT_CACHE_ENTRIES):
+        self.cache_ttls = dict(DEFAULT_CACHE_TTLS if cache_ttls is None else cache_ttls)
+        self.timeout = timeout
+        self.max_cache_entries = max_cache_entries
+
+        retry = Retry(total=retries, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({"GET", "HEAD"}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http")
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._in_flight = {}
+
+    def set_cache_ttl(self, url_prefix, seconds):
+        with self._lock:
+            self.cache_ttls[url_prefix] = seconds
+
+    def get(self, url, params=None, timeout=None):
+        """Blocking GET through the cache and request coalescing. Returns a `requests.Response`."""
+        return self._submit(url, params, timeout, run_inline=True).result()
+
+    def get_async(self, url, params=None, timeout=None):
+        """Non-blocking GET. Returns a `concurrent.futures.Future` resolving to a `requests.Response`."""
+        return self._submit(url, params, timeout, run_inline=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def _submit(self, url, params, timeout, run_inline):
+        key = url + ("?" + urlencode(sorted(params.items())) if params else "")
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                future = Future()
+                future.set_result(cached[1])
+                return future
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                return in_flight
+            future = Future()
+            self._in_flight[key] = future
+
+        if run_inline:
+            self._fetch(key, url, params, timeout, future)
+        else:
+            self._executor.submit(self._fetch, key, url, params, timeout, future)
+        return future
+
+    def _fetch(self, key, url, params, timeout, future):
+        try:
+            response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+        except Exception as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            return
+
+        ttl = self._ttl_for(url)
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if ttl and response.ok:
+                if len(self._cache) >= self.max_cache_entries:
+                    self._evict_expired()
+                self._cache[key] = (time.monotonic() + ttl, response)
+        logging.debug("HTTP GET %s -> %s (%.0f ms)", url, response.status_code, response.elapsed.total_seconds() * 1000)
+        future.set_result(response)
+
+    def _ttl_for(self, url):
+        matches = [prefix for prefix in self.cache_ttls if url.startswith(prefix)]
+        return self.cache_ttls[max(matches, key=len)] if matches else None
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[key]
+        # إن بقي الكاش ممتلئاً نحذف الأقرب انتهاءً
+        while len(self._cache) >= self.max_cache_entries:
+            del self._cache[min(self._cache, key=lambda key: self._cache[key][0])]
+
+
+http_client = HttpClient()
@@ -0,0 +1,191 @@
+# intent_router.py
+import re
+import time
+import logging
+import threading
+from typing import NamedTuple, Optional
+
+from PySide6.QtCore import QThread, Signal
+
+# عتبات الثقة الافتراضية لكل طبقة
+DEFAULT_KEYWORD_THRESHOLD = 0.9
+DEFAULT_NLU_THRESHOLD = 0.75
+
+# المقاصد التي تحتاج إلى الكيانات؛ لا يُشغَّل NER لغيرها
+ENTITY_INTENTS = frozenset({"OPEN_APPLICATION", "GET_WEATHER", "SEARCH_YOUTUBE", "SEARCH_BROWSER"})
+
+TIERS = ("keyword", "nlu", "llm")
+
+_ARABIC_FOLDING = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ى': 'ي', 'ة': 'ه', 'ـ': None})
+_ARABIC_FOLDING.update({code: None for code in range(0x064B, 0x0653)})
+_PUNCTUATION_RE = re.compile(r'[^\w\s]+')
+
+_END = object()
+
+
+def normalize_tokens(text):
+    """Lowercases, folds Arabic letter variants and diacritics, and splits into words."""
+    return _PUNCTUATION_RE.sub(' ', text.lower().translate(_ARABIC_FOLDING)).split()
+
+
+class RouteResult(NamedTuple):
+    tier: str
+    intent: Optional[str] = None
+    confidence: float = 0.0
+    plugin: object = None
+    keyword: Optional[str] = None
+    entities: dict = {}
+    latency_ms: float = 0.0
+
+
+class KeywordTrie:
+    """
+    Word-level trie over plugin keywords. `match` finds the longest keyword that the
+    command starts with. A command that is exactly a keyword scores 1.0; a prefix match
+    scores by how much of the command the keyword covers, so "الساعة" does not claim
+    "الساعة كم" with full confidence.
+    """
+
+    def __init__(self):
+        self._root = {}
+        self.size = 0
+
+    def add(self, keyword, value):
+        node = self._root
+        for token in normalize_tokens(keyword):
+            node = node.setdefault(token, {})
+        if _END not in node:
+            self.size += 1
+        node[_END] = (keyword, value)
+
+    def match(self, tokens):
+        """Returns (keyword, value, confidence) for the longest keyword prefix of `tokens`, or None."""
+        node = self._root
+        best = None
+        for depth, token in enumerate(tokens, 1):
+            node = node.get(token)
+            if node is None:
+                break
+            if _END in node:
+                best = (depth, node[_END])
+        if best is None:
+            return None
+        depth, (keyword, value) = best
+        confidence = 1.0 if depth == len(tokens) else 0.5 + 0.5 * depth / len(tokens)
+        return keyword, value, confidence
+
+
+class IntentRouter:
+    """
+    Routes a spoken command through three tiers, cheapest first:
+
+    0. `keyword`: the plugin keyword trie (microseconds, no model).
+    1. `nlu`: the spaCy model with only the text classifier enabled; NER runs on the
+       same Doc only for intents that need entities.
+    2. `llm`: nothing matched confidently; the caller falls back to Gemini and reports
+       the time taken through `record_latency`.
+
+    Each tier has its own confidence threshold, and `stats()` reports per-tier counts
+    and latencies.
+    """
+
+    def __init__(self, nlu_model=None, keyword_threshold=DEFAULT_KEYWORD_THRESHOLD,
+                 nlu_threshold=DEFAULT_NLU_THRESHOLD, entity_intents=ENTITY_INTENTS):
+        self.nlu_model = nlu_model
+        self.keyword_threshold = keyword_threshold
+        self.nlu_threshold = nlu_threshold
+        self.entity_intents = entity_intents
+        self.trie = KeywordTrie()
+        self._lock = threading.Lock()
+        self._stats = {tier: {"count": 0, "total_ms": 0.0, "max_ms": 0.0} for tier in TIERS}
+
+    def set_plugins(self, commands):
+        """Rebuilds the keyword tier from a {keyword: plugin} mapping."""
+        trie = KeywordTrie()
+        for keyword, plugin in commands.items():
+            trie.add(keyword, plugin)
+        self.trie = trie
+        logging.info("Intent router indexed %d plugin keywords.", trie.size)
+
+    def route(self, command):
+        started = time.perf_counter()
+        tokens = normalize_tokens(command)
+
+        match = self.trie.match(tokens) if tokens else None
+        if match is not None and match[2] >= self.keyword_threshold:
+            keyword, plugin, confidence = match
+            return self._finish(RouteResult("keyword", confidence=confidence, plugin=plugin, keyword=keyword), started)
+        self._record("keyword", (time.perf_counter() - started) * 1000)
+
+        if self.nlu_model is not None:
+            nlu_started = time.perf_counter()
+            intent, confidence, entities = self._classify(command)
+            logging.info("NLU Analysis -> Top Intent: %s (Confidence: %.2f), Entities: %s",
+                         intent, confidence, entities)
+            if intent is not None:
+                return self._finish(RouteResult("nlu", intent=intent, confidence=confidence, entities=entities), nlu_started)
+            self._record("nlu", (time.perf_counter() - nlu_started) * 1000)
+
+        return RouteResult("llm", latency_ms=(time.perf_counter() - started) * 1000)
+
+    def _classify(self, command):
+        textcat_pipes = [name for name in self.nlu_model.pipe_names if name.startswith("textcat")]
+        with self.nlu_model.select_pipes(enable=textcat_pipes):
+            doc = self.nlu_model(command)
+        if not doc.cats:
+            return None, 0.0, {}
+        intent, confidence = max(doc.cats.items(), key=lambda item: item[1])
+        if confidence <= self.nlu_threshold:
+            return None, confidence, {}
+
+        entities = {}
+        if intent in self.entity_intents and "ner" in self.nlu_model.pipe_names:
+            doc = self.nlu_model.get_pipe("ner")(doc)
+            entities = {ent.label_: ent.text for ent in doc.ents}
+        return intent, confidence, entities
+
+    def _finish(self, result, started):
+        latency_ms = (time.perf_counter() - started) * 1000
+        self._record(result.tier, latency_ms)
+        return result._replace(latency_ms=latency_ms)
+
+    def record_latency(self, tier, latency_ms):
+        """Records time spent in a tier handled outside the router (the LLM fallback)."""
+        self._record(tier, latency_ms)
+
+    def _record(self, tier, latency_ms):
+        with self._lock:
+            stats = self._stats[tier]
+            stats["count"] += 1
+            stats["total_ms"] += latency_ms
+            stats["max_ms"] = max(stats["max_ms"], latency_ms)
+
+    def stats(self):
+        """Per-tier {count, avg_ms, max_ms}; a tier's count includes lookups that fell through."""
+        with self._lock:
+            return {tier: {"count": s["count"],
+                           "avg_ms": s["total_ms"] / s["count"] if s["count"] else 0.0,
+                           "max_ms": s["max_ms"]}
+                    for tier, s in self._stats.items()}
+
+
+class NLUModelLoaderThread(QThread):
+    """Loads the spaCy model off the GUI thread; the router uses it once `model_loaded` fires."""
+    model_loaded = Signal(object)
+
+    def __init__(self, model_path):
+        super().__init__()
+        self.model_path = model_path
+
+    def run(self):
+        try:
+            import spacy
+            model = spacy.load(self.model_path)
+        except IOError:
+            logging.warning("NLU model not found. Assistant will run in normal mode.")
+            return
+        except Exception as e:
+            logging.error("Could not load NLU model: %s", e)
+            return
+        logging.info("NLU model loaded successfully.")
+        self.model_loaded.emit(model)
@@ -0,0 +1,80 @@
+# llm_stream.py
+import time
+import logging
+import threading
+
+import requests
+import google.api_core.exceptions
+from PySide6.QtCore import QThread, Signal
+
+from speech_output import pop_complete_sentences
+
+# أقصر جملة تُرسل وحدها إلى تحويل النص إلى كلام؛ الأقصر منها تُدمج مع التالية
+MIN_SPEECH_CHARS = 40
+
+# جلسة محادثة Gemini لا تقبل طلبين متزامنين
+_session_lock = threading.Lock()
+
+
+class GeminiStreamThread(QThread):
+    """
+    Sends one message to a Gemini chat session with `stream=True` and reports the reply
+    as it arrives: `text_delta` for every streamed chunk (for incremental rendering) and
+    `sentence_ready` for every completed sentence (for the TTS queue), then `completed`
+    with the full text, or `failed` with an error kind. All signals carry `request_id`
+    so the window can ignore replies it no longer cares about.
+    """
+    text_delta = Signal(int, str)
+    sentence_ready = Signal(int, str)
+    first_token = Signal(int, float)
+    completed = Signal(int, str)
+    failed = Signal(int, str, str)
+
+    def __init__(self, chat_session, message, request_id, min_speech_chars=MIN_SPEECH_CHARS):
+        super().__init__()
+        self.chat_session = chat_session
+        self.message = message
+        self.request_id = request_id
+        self.min_speech_chars = min_speech_chars
+        self.started_at = time.perf_counter()
+
+    def run(self):
+        full_text = []
+        pending = ""
+        spoken_any = False
+        try:
+            with _session_lock:
+                response = self.chat_session.send_message(self.message, stream=True)
+                # يجب استهلاك البث كاملاً حتى تُحفظ الإجابة في سجل الجلسة
+                for chunk in response:
+                    text = chunk.text
+                    if not text:
+                        continue
+                    if not full_text:
+                        self.first_token.emit(self.request_id, (time.perf_counter() - self.started_at) * 1000)
+                    full_text.append(text)
+                    self.text_delta.emit(self.request_id, text)
+
+                    pending += text
+                    sentences, tail = pop_complete_sentences(pending)
+                    speech = " ".join(sentences)
+                    # الجملة الأولى تُرسل فوراً لتقليل زمن أول صوت، والبقية تُجمع في مقاطع معقولة الطول
+                    if speech and (len(speech) >= self.min_speech_chars or not spoken_any):
+                        self.sentence_ready.emit(self.request_id, speech)
+                        spoken_any = True
+                        pending = tail
+            if pending.strip():
+                self.sentence_ready.emit(self.request_id, pending.strip())
+            self.completed.emit(self.request_id, "".join(full_text))
+        except google.api_core.exceptions.InvalidArgument as e:
+            logging.error("Gemini InvalidArgument Error: %s", e)
+            self.failed.emit(self.request_id, "invalid_argument", str(e))
+        except google.api_core.exceptions.ResourceExhausted as e:
+            logging.error("Gemini ResourceExhausted Error: %s", e)
+            self.failed.emit(self.request_id, "resource_exhausted", str(e))
+        except requests.exceptions.ConnectionError as e:
+            logging.error("Gemini Connection Error: %s", e)
+            self.failed.emit(self.request_id, "connection", str(e))
+        except Exception as e:
+            logging.exception("Gemini General Error: %s", e)
+            self.failed.emit(self.request_id, "general", str(e))
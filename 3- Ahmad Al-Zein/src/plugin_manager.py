@@ -0,0 +1,184 @@
+# plugin_manager.py
+import os
+import json
+import logging
+import threading
+import importlib.util
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer, Signal
+
+MANIFEST_NAME = "manifest.json"
+RELOAD_DEBOUNCE_MS = 300
+
+
+class PluginProxy:
+    """
+    Stands in for a plugin declared in the manifest. The module is imported and its
+    `Plugin` instantiated on first use (any attribute access such as `execute`), or
+    ahead of time by `load()` from a background thread.
+    """
+
+    def __init__(self, name, path, keywords=(), intents=(), preload=False):
+        self.name = name
+        self.path = path
+        self.keywords = list(keywords)
+        self.intents = list(intents)
+        self.preload = preload
+        self.mtime = os.path.getmtime(path)
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get_keywords(self):
+        # من الملف التعريفي مباشرة، دون استيراد الوحدة
+        return self.keywords
+
+    def load(self):
+        if self._instance is not None:
+            return self._instance
+        with self._lock:
+            if self._instance is None:
+                spec = importlib.util.spec_from_file_location(self.name, self.path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self._instance = module.Plugin()
+                logging.info("[Success] Loaded plugin: %s", self.name)
+        return self._instance
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+
+class PluginManager(QObject):
+    """
+    Builds plugin proxies from `plugins/manifest.json` without importing any plugin.
+
+    Plugins marked `"preload": true` are imported in a background thread after startup;
+    the others on first dispatch. Modules present in the folder but missing from the
+    manifest are imported in the background to read their keywords. The folder is
+    watched: editing, adding or removing a plugin (or the manifest) takes effect
+    without restarting, and `plugins_changed` is emitted so routing can be rebuilt.
+    """
+    plugins_changed = Signal()
+
+    def __init__(self, plugins_dir, parent=None):
+        super().__init__(parent)
+        self.plugins_dir = plugins_dir
+        self.manifest_path = os.path.join(plugins_dir, MANIFEST_NAME)
+        self.proxies = {}
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._schedule_reload)
+        self._watcher.fileChanged.connect(self._schedule_reload)
+        self._reload_timer = QTimer(self)
+        self._reload_timer.setSingleShot(True)
+        self._reload_timer.setInterval(RELOAD_DEBOUNCE_MS)
+        self._reload_timer.timeout.connect(self.reload)
+
+    @property
+    def commands(self):
+        """{keyword: plugin proxy}, like the dictionary load_plugins used to build."""
+        return {keyword: proxy for proxy in self.proxies.values() for keyword in proxy.get_keywords()}
+
+    def for_intent(self, intent):
+        for proxy in self.proxies.values():
+            if intent in proxy.intents:
+                return proxy
+        return None
+
+    def load(self):
+        if not os.path.exists(self.plugins_dir):
+            logging.warning(f"تنبيه: مجلد الإضافات '{self.plugins_dir}' غير موجود.")
+            return
+        self.proxies = self._build_proxies(self._read_manifest())
+        logging.info("Plugin manifest loaded: %d plugins (none imported yet).", len(self.proxies))
+        self._watch()
+        self._load_in_background([proxy for proxy in self.proxies.values() if proxy.preload or not proxy.keywords])
+
+    def reload(self):
+        old_proxies = self.proxies
+        self.proxies = self._build_proxies(self._read_manifest(), old_proxies)
+        changed = [proxy for name, proxy in self.proxies.items() if old_proxies.get(name) is not proxy]
+        for proxy in changed:
+            logging.info("Plugin '%s' changed on disk; it will be reloaded.", proxy.name)
+        removed = set(old_proxies) - set(self.proxies)
+        for name in removed:
+            logging.info("Plugin '%s' was removed.", name)
+        self._watch()
+        self._load_in_background([proxy for proxy in changed if proxy.preload or not proxy.keywords])
+        # الكلمات المفتاحية أو المقاصد قد تتغير في الملف التعريفي وحده
+        self.plugins_changed.emit()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("plugins", [])
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            # ملف تعريفي تالف أثناء التحرير: نُبقي البيانات السابقة حتى الحفظ التالي
+            logging.error("Could not read plugin manifest %s: %s", self.manifest_path, e)
+            return None
+
+    def _build_proxies(self, manifest, old_proxies=None):
+        old_proxies = old_proxies or {}
+        declared = {entry["module"]: entry for entry in manifest} if manifest is not None else None
+        proxies = {}
+        for filename in sorted(os.listdir(self.plugins_dir)):
+            if not filename.endswith(".py") or filename.startswith("__"):
+                continue
+            name = filename[:-3]
+            path = os.path.join(self.plugins_dir, filename)
+            entry = declared.get(name, {}) if declared is not None else None
+            old = old_proxies.get(name)
+            if old is not None and old.mtime == os.path.getmtime(path):
+                # الوحدة لم تتغير؛ نحتفظ بالنسخة المحملة ونحدّث بيانات الملف التعريفي فقط
+                if entry:
+                    old.keywords = list(entry.get("keywords", []))
+                    old.intents = list(entry.get("intents", []))
+                    old.preload = entry.get("preload", False)
+                proxies[name] = old
+                continue
+            if entry is None:
+                entry = {"keywords": old.keywords, "intents": old.intents, "preload": old.preload} if old else {}
+            proxies[name] = PluginProxy(name, path, entry.get("keywords", []), entry.get("intents", []),
+                                        entry.get("preload", False))
+        return proxies
+
+    def _load_in_background(self, proxies):
+        if not proxies:
+            return
+
+        def run():
+            discovered = False
+            for proxy in proxies:
+                try:
+                    instance = proxy.load()
+                except Exception as e:
+                    logging.error("[Failed] Failed to load plugin %s: %s", proxy.name, e)
+                    continue
+                if not proxy.keywords:
+                    # وحدة غير مذكورة في الملف التعريفي: نقرأ كلماتها المفتاحية منها
+                    proxy.keywords = list(instance.get_keywords())
+                    discovered = True
+            if discovered:
+                self.plugins_changed.emit()
+
+        threading.Thread(target=run, name="plugin-preload", daemon=True).start()
+
+    def _watch(self):
+        paths = [self.plugins_dir] + [proxy.path for proxy in self.proxies.values()]
+        if os.path.exists(self.manifest_path):
+            paths.append(self.manifest_path)
+        # المحررات تستبدل الملف عند الحفظ فيزول من المراقبة، لذلك نعيد إضافته في كل مرة
+        watched = set(self._watcher.files()) | set(self._watcher.directories())
+        missing = [path for path in paths if path not in watched]
+        if missing:
+            self._watcher.addPaths(missing)
+
+    def _schedule_reload(self, path):
+        self._reload_timer.start()
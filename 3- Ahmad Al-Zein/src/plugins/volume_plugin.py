@@ -6,7 +6,14 @@ import logging # تم الإضافة: استيراد مكتبة التسجيل
 
 class Plugin:
     def __init__(self):
+        # تهيئة واجهة COM مؤجلة إلى أول استخدام، وفي الخيط الذي يستخدمها
+        self.volume = None
+        self.error = None
+        self._initialized = False
+
+    def _init_volume(self):
         """Initializes the audio volume interface."""
+        self._initialized = True
         try:
             devices = AudioUtilities.GetSpeakers()
             interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
@@ -22,6 +29,8 @@ class Plugin:
         return ["صوت"]
 
     def execute(self, main_window, command, speak_func):
+        if not self._initialized:
+            self._init_volume()
         if not self.volume:
             speak_func(f"عذرًا، لا يمكن التحكم بالصوت. {self.error}")
             return
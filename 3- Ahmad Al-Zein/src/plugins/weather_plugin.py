@@ -2,6 +2,9 @@
 import requests
 import os
 import logging # <--- تم الإضافة
+from http_client import http_client
+
+WEATHER_URL = "http://api.weatherapi.com/v1/current.json"
 
 class Plugin:
     def get_keywords(self):
@@ -40,10 +43,17 @@ class Plugin:
         # لم تعد هناك حاجة لـ main_window.follow_up_plugin = None هنا، لأنها ستتم في process_follow_up
         # main_window.follow_up_plugin = None
 
-        url = f"http://api.weatherapi.com/v1/current.json?key={os.getenv('WEATHER_API_KEY')}&q={city_name}&aqi=no"
+        params = {"key": os.getenv('WEATHER_API_KEY'), "q": city_name, "aqi": "no"}
         speak_func(f"حسنًا، جاري جلب حالة الطقس في {city_name}...")
+        # الطلب في الخلفية (مع كاش لعشر دقائق)، والرد يُنطق في خيط الواجهة
+        future = http_client.get_async(WEATHER_URL, params=params)
+        future.add_done_callback(
+            lambda f: main_window.run_on_ui_thread(lambda: self._report_weather(f, city_name, speak_func)))
+
+    def _report_weather(self, future, city_name, speak_func):
+        response = None
         try:
-            response = requests.get(url)
+            response = future.result()
             response.raise_for_status()
             data = response.json()
             report = f"الطقس في {data['location']['name']} حاليًا {data['current']['condition']['text']}، ودرجة الحرارة {int(data['current']['temp_c'])} درجة مئوية."
@@ -57,13 +67,16 @@ class Plugin:
             elif response.status_code == 403:
                 error_message = "عذراً، وصول WeatherAPI محظور. ربما انتهت صلاحية المفتاح أو هناك قيود."
             speak_func(error_message)
-            main_window.logging.error("WeatherAPI HTTP Error for %s: %s - Response: %s", city_name, http_err, response.text)
+            logging.error("WeatherAPI HTTP Error for %s: %s - Response: %s", city_name, http_err, response.text)
         except requests.exceptions.ConnectionError as conn_err:
             speak_func("عذراً، لا أستطيع الاتصال بخدمة الطقس. يرجى التحقق من اتصالك بالإنترنت.")
-            main_window.logging.error("WeatherAPI Connection Error: %s", conn_err)
+            logging.error("WeatherAPI Connection Error: %s", conn_err)
         except requests.exceptions.Timeout as timeout_err:
             speak_func("عذراً، استغرق الاتصال بخدمة الطقس وقتاً طويلاً. يرجى المحاولة مرة أخرى.")
-            main_window.logging.error("WeatherAPI Timeout Error: %s", timeout_err)
+            logging.error("WeatherAPI Timeout Error: %s", timeout_err)
         except requests.exceptions.RequestException as req_err:
             speak_func(f"عذرًا، حدث خطأ عام أثناء جلب بيانات الطقس لمدينة {city_name}.")
-            main_window.logging.error("WeatherAPI General Request Error: %s", req_err)
\ No newline at end of file
+            logging.error("WeatherAPI General Request Error: %s", req_err)
+        except (KeyError, ValueError) as e:
+            speak_func(f"عذرًا، وصلت بيانات طقس غير متوقعة لمدينة {city_name}.")
+            logging.error("WeatherAPI unexpected response for %s: %s", city_name, e)
@@ -0,0 +1,304 @@
+# speech_output.py
+import os
+import re
+import queue
+import hashlib
+import logging
+import tempfile
+import threading
+
+from PySide6.QtCore import QThread, Signal
+
+try:
+    import pyttsx3
+except ImportError:  # المحرك المحلي اختياري
+    pyttsx3 = None
+
+# مجلد الكاش في مجلد data بجانب ملف إعدادات المستخدم
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'tts_cache')
+DEFAULT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_CHUNK_CHARS = 220
+
+# نهايات الجمل بالعربية والإنجليزية، مع الأسطر الجديدة
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?؟؛\n])\s+')
+_CLAUSE_END_RE = re.compile(r'(?<=[،,:])\s+')
+
+
+def split_sentences(text, max_chars=DEFAULT_CHUNK_CHARS):
+    """
+    Splits text into speakable chunks at sentence boundaries. Short sentences are merged
+    and long ones are split at commas, then at spaces, so no chunk exceeds `max_chars`.
+    """
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_END_RE.split(text.strip()):
+        pieces = [sentence] if len(sentence) <= max_chars else _split_long(sentence, max_chars)
+        for piece in pieces:
+            piece = piece.strip()
+            if not piece:
+                continue
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def pop_complete_sentences(text):
+    """
+    Splits streamed text into (completed sentences, unfinished remainder). A sentence is
+    complete once its terminator is followed by whitespace, so the remainder may still grow.
+    """
+    parts = _SENTENCE_END_RE.split(text)
+    return [part.strip() for part in parts[:-1] if part.strip()], parts[-1]
+
+
+def _split_long(sentence, max_chars):
+    pieces = []
+    for clause in _CLAUSE_END_RE.split(sentence):
+        while len(clause) > max_chars:
+            cut = clause.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(clause[:cut])
+            clause = clause[cut:]
+        pieces.append(clause)
+    return pieces
+
+
+class TTSBackend:
+    """Base class for text-to-speech engines. `synthesize` returns encoded audio bytes."""
+    name = None
+    extension = None
+
+    def synthesize(self, text, lang, voice=None):
+        raise NotImplementedError
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS (online, MP3)."""
+    name = "gtts"
+    extension = ".mp3"
+
+    def __init__(self):
+        from gtts import gTTS
+        self._gtts = gTTS
+
+    def synthesize(self, text, lang, voice=None):
+        buffer = tempfile.SpooledTemporaryFile()
+        self._gtts(text=text, lang=lang).write_to_fp(buffer)
+        buffer.seek(0)
+        return buffer.read()
+
+
+class Pyttsx3Backend(TTSBackend):
+    """Offline system voices through pyttsx3 (SAPI5 / NSSpeechSynthesizer / eSpeak, WAV)."""
+    name = "pyttsx3"
+    extension = ".wav"
+
+    def __init__(self):
+        if pyttsx3 is None:
+            raise RuntimeError("pyttsx3 is not installed.")
+        # يجب استخدام المحرك من نفس الخيط دائماً، لذلك يُنشأ داخل خيط التركيب
+        self._engine = pyttsx3.init()
+
+    def _select_voice(self, lang, voice):
+        if voice:
+            self._engine.setProperty('voice', voice)
+            return
+        for candidate in self._engine.getProperty('voices'):
+            if _voice_matches(candidate, lang):
+                self._engine.setProperty('voice', candidate.id)
+                return
+        # لا يوجد صوت لهذه اللغة، نترك الصوت الحالي كما هو
+
+    def synthesize(self, text, lang, voice=None):
+        self._select_voice(lang, voice)
+        fd, path = tempfile.mkstemp(suffix=self.extension)
+        os.close(fd)
+        try:
+            self._engine.save_to_file(text, path)
+            self._engine.runAndWait()
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+def _voice_matches(candidate, lang):
+    """
+    Whether a pyttsx3 voice speaks `lang`, compared on whole locale tags only: the
+    primary subtag of its languages (eSpeak, NSSpeech), or a lang-REGION token of its id
+    (SAPI5 ids such as ...\\TTS_MS_AR-EG_HODA_11.0 carry no languages).
+    """
+    lang = lang.lower()
+    for language in candidate.languages or []:
+        if isinstance(language, bytes):
+            # eSpeak يسبق رمز اللغة ببايت الأولوية
+            language = language.decode('utf-8', 'ignore')
+        tag = re.sub(r'^[^a-zA-Z]+', '', str(language)).lower()
+        if re.split(r'[-_]', tag)[0] == lang:
+            return True
+    locale = re.compile(rf'(?:^|_){re.escape(lang)}[-_][a-z]{{2}}(?:_|$)')
+    return any(locale.search(token) for token in re.split(r'[\\/.\s]+', (candidate.id or '').lower()))
+
+
+BACKENDS = {
+    GTTSBackend.name: GTTSBackend,
+    Pyttsx3Backend.name: Pyttsx3Backend,
+}
+
+
+class PhraseCache:
+    """
+    Content-addressed cache of synthesized audio on disk. Files are named after a hash of
+    (engine, voice, lang, text); the total size is bounded and the least recently used
+    files are evicted first (file modification time is refreshed on every hit).
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_bytes = sum(os.path.getsize(path) for path in self._files())
+
+    def _files(self):
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isfile(path) and not name.endswith('.tmp'):
+                yield path
+
+    def path_for(self, text, lang, voice, backend):
+        key = hashlib.sha256(f"{backend.name}\x00{voice or ''}\x00{lang}\x00{text}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + backend.extension)
+
+    def get(self, text, lang, voice, backend):
+        path = self.path_for(text, lang, voice, backend)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, text, lang, voice, backend, audio):
+        path = self.path_for(text, lang, voice, backend)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(audio)
+        with self._lock:
+            existed = os.path.exists(path)
+            os.replace(tmp_path, path)
+            if not existed:
+                self._total_bytes += len(audio)
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _evict(self, keep):
+        entries = sorted((os.path.getmtime(path), path) for path in self._files() if path != keep)
+        for _, path in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._total_bytes -= size
+            except OSError as e:
+                # قد يكون الملف قيد التشغيل حالياً (ويندوز)، نتجاوزه للمرة القادمة
+                logging.warning("Could not evict cached speech file %s: %s", path, e)
+
+
+class SpeechSynthesisThread(QThread):
+    """
+    Synthesizes queued utterances chunk by chunk off the GUI thread. Each chunk is emitted
+    through `chunk_ready` as soon as it is available (from the cache or the engine), so
+    playback of the first sentence starts while the rest is still being synthesized.
+    """
+    chunk_ready = Signal(int, str)
+    synthesis_error = Signal(str)
+
+    def __init__(self, engine_name="gtts", lang="ar", voice=None, cache=None, max_chunk_chars=DEFAULT_CHUNK_CHARS):
+        super().__init__()
+        self.engine_name = engine_name
+        self.lang = lang
+        self.voice = voice
+        self.cache = cache or PhraseCache()
+        self.max_chunk_chars = max_chunk_chars
+        self._queue = queue.Queue()
+        self._generation = 0
+        self._backends = {}
+        self._is_running = True
+
+    @property
+    def generation(self):
+        """Incremented by `cancel`; chunks emitted for an older generation should not be played."""
+        return self._generation
+
+    def say(self, text):
+        self._queue.put((self._generation, text))
+        if not self.isRunning():
+            self.start()
+
+    def cancel(self):
+        """Drops everything queued or in progress; already emitted chunks are the player's concern."""
+        self._generation += 1
+
+    def set_engine(self, engine_name, voice=None):
+        self.engine_name = engine_name
+        self.voice = voice
+
+    def stop(self):
+        self._is_running = False
+        self.cancel()
+        self._queue.put(None)
+
+    def run(self):
+        while self._is_running:
+            item = self._queue.get()
+            if item is None:
+                break
+            generation, text = item
+            for chunk in split_sentences(text, self.max_chunk_chars):
+                if generation != self._generation or not self._is_running:
+                    break
+                try:
+                    path = self._synthesize_chunk(chunk)
+                except Exception as e:
+                    logging.error("Speech synthesis error: %s", e)
+                    self.synthesis_error.emit(str(e))
+                    break
+                if generation == self._generation:
+                    self.chunk_ready.emit(generation, path)
+
+    def _synthesize_chunk(self, chunk):
+        last_error = None
+        for backend in self._backend_chain():
+            cached = self.cache.get(chunk, self.lang, self.voice, backend)
+            if cached:
+                return cached
+            try:
+                audio = backend.synthesize(chunk, self.lang, self.voice)
+            except Exception as e:
+                logging.warning("TTS engine '%s' failed, trying the next one: %s", backend.name, e)
+                last_error = e
+                continue
+            return self.cache.put(chunk, self.lang, self.voice, backend, audio)
+        raise last_error or RuntimeError("No text-to-speech engine is available.")
+
+    def _backend_chain(self):
+        # المحرك المختار أولاً ثم البقية كاحتياط (مثلاً المحلي عند انقطاع الإنترنت)
+        if self.engine_name not in BACKENDS:
+            logging.warning("Unknown TTS engine '%s', falling back to the available engines.", self.engine_name)
+        names = [self.engine_name] + [name for name in BACKENDS if name != self.engine_name]
+        for name in (name for name in names if name in BACKENDS):
+            if name not in self._backends:
+                try:
+                    self._backends[name] = BACKENDS[name]()
+                except Exception as e:
+                    logging.warning("TTS engine '%s' is unavailable: %s", name, e)
+                    self._backends[name] = None
+            if self._backends[name] is not None:
+                yield self._backends[name]
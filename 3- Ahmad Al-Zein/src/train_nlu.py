@@ -2,22 +2,31 @@
 import spacy
 import json
 import random
+import time
+import hashlib
+import argparse
 from spacy.tokens import DocBin
 from spacy.training import Example
+from spacy.scorer import Scorer
+from spacy.util import minibatch
+from thinc.api import compounding
 import os # تم الإضافة
 
 # --- الخطوة 0: تفعيل دعم الـ GPU ---
 # تأكد من تثبيت المكتبات الصحيحة: pip install -U spacy[cuda11x] cupy
 # قم بإلغاء التعليق عن السطر التالي لتفعيل الـ GPU
-# spacy.require_gpu() 
+# spacy.require_gpu()
 # print("GPU Activated:", spacy.prefer_gpu())
 
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+CACHE_DIR = os.path.join(DATA_DIR, 'nlu_cache')
+
 
 def load_data(file_path):
     """تحميل البيانات من ملف JSON وتحويلها لصيغة spaCy"""
     with open(file_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
-    
+
     training_data = []
     for intent_data in data['intents']:
         intent_name = intent_data['intent']
@@ -28,64 +37,176 @@ def load_data(file_path):
                     start = text.find(entity['text'])
                     end = start + len(entity['text'])
                     entities.append((start, end, entity['label']))
-            
+
             # إضافة القصد إلى فئات النص
             cats = {i['intent']: 0 for i in data['intents']}
             cats[intent_name] = 1
-            
+
             training_data.append({"text": text, "entities": entities, "cats": cats})
-            
+
     return training_data
 
-def train_spacy(data, iterations=20, model_name="nlu_model_ar"):
+
+def build_examples(data, nlp, cache_dir=CACHE_DIR):
+    """
+    Converts the training data to Example objects once. The annotated reference docs are
+    stored in a DocBin named after a hash of the data and the spaCy version, so later runs
+    on unchanged data skip tokenization and alignment entirely.
+    """
+    digest = hashlib.sha1(json.dumps([spacy.__version__, data], ensure_ascii=False, sort_keys=True)
+                          .encode('utf-8')).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f"examples-{digest}.spacy")
+
+    if os.path.exists(cache_path):
+        references = list(DocBin().from_disk(cache_path).get_docs(nlp.vocab))
+        print(f"تم تحميل {len(references)} مثالاً من الكاش: {cache_path}")
+    else:
+        references = []
+        for item in data:
+            doc = nlp.make_doc(item['text'])
+            example = Example.from_dict(doc, {"entities": item['entities'], "cats": item['cats']})
+            references.append(example.reference)
+        os.makedirs(cache_dir, exist_ok=True)
+        DocBin(docs=references).to_disk(cache_path)
+        print(f"تم حفظ {len(references)} مثالاً في الكاش: {cache_path}")
+
+    return [Example(nlp.make_doc(reference.text), reference) for reference in references]
+
+
+def split_examples(examples, dev_ratio, seed):
+    """تقسيم الأمثلة إلى تدريب وتقييم بشكل ثابت (نفس البذرة تعطي نفس التقسيم)"""
+    examples = list(examples)
+    random.Random(seed).shuffle(examples)
+    if dev_ratio <= 0 or len(examples) < 2:
+        return examples, []
+    dev_size = max(1, int(len(examples) * dev_ratio))
+    return examples[dev_size:], examples[:dev_size]
+
+
+def bucketed_minibatches(examples, batch_sizes, window=2048):
+    """
+    Returns minibatches of examples with similar lengths. Examples are shuffled, grouped into
+    windows of `window` examples, sorted by length inside each window and cut with
+    `minibatch`; the batch order is shuffled again so lengths still vary across steps.
+    `batch_sizes` is a shared compounding generator, so batches grow across epochs.
+    """
+    examples = list(examples)
+    random.shuffle(examples)
+    batches = []
+    for start in range(0, len(examples), window):
+        bucket = sorted(examples[start:start + window], key=lambda eg: len(eg.reference))
+        batches.extend(minibatch(bucket, size=batch_sizes))
+    random.shuffle(batches)
+    return batches
+
+
+def evaluate(nlp, examples, batch_size=256, n_process=1):
+    """تقييم النموذج على مجموعة التقييم باستخدام nlp.pipe"""
+    if not examples:
+        return {}
+    texts = [eg.reference.text for eg in examples]
+    predicted = nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+    scored = [Example(doc, eg.reference) for doc, eg in zip(predicted, examples)]
+    scores = Scorer(nlp).score(scored)
+
+    correct = sum(max(eg.predicted.cats, key=eg.predicted.cats.get) == max(eg.reference.cats, key=eg.reference.cats.get)
+                  for eg in scored if eg.predicted.cats and eg.reference.cats)
+    return {
+        "intent_accuracy": correct / len(scored),
+        "cats_score": scores.get("cats_score") or 0.0,
+        "ents_f": scores.get("ents_f") or 0.0,
+    }
+
+
+def train_spacy(data, iterations=20, model_name="nlu_model_ar", dev_ratio=0.1, patience=5,
+                batch_start=4.0, batch_end=32.0, batch_compound=1.001, dropout=0.35,
+                eval_batch_size=256, n_process=1, seed=42):
     """تدريب نموذج spaCy وحفظه"""
+    random.seed(seed)
+    spacy.util.fix_random_seed(seed)
+
     # إنشاء نموذج فارغ باللغة العربية
     nlp = spacy.blank("ar")
 
     # إضافة مصنف النص (Text Classifier) إلى الـ pipeline
     if "textcat" not in nlp.pipe_names:
-        textcat = nlp.add_pipe("textcat", last=True)
-    else:
-        textcat = nlp.get_pipe("textcat")
+        nlp.add_pipe("textcat", last=True)
 
     # إضافة الكيانات (NER) إلى الـ pipeline
     if "ner" not in nlp.pipe_names:
-        ner = nlp.add_pipe("ner", last=True)
-    else:
-        ner = nlp.get_pipe("ner")
-
-    # إضافة أسماء المقاصد (intents) والكيانات (entities) إلى المكونات
-    all_intents = {cat for item in data for cat in item['cats']}
-    for intent in all_intents:
-        textcat.add_label(intent)
-        
-    all_labels = {ent[2] for item in data for ent in item['entities']}
-    for label in all_labels:
-        ner.add_label(label)
-
-    # بدء التدريب
-    optimizer = nlp.begin_training()
+        nlp.add_pipe("ner", last=True)
+
+    examples = build_examples(data, nlp)
+    train_examples, dev_examples = split_examples(examples, dev_ratio, seed)
+    print(f"أمثلة التدريب: {len(train_examples)}، أمثلة التقييم: {len(dev_examples)}")
+
+    # initialize يستنتج أسماء المقاصد والكيانات من أمثلة التدريب
+    optimizer = nlp.initialize(lambda: train_examples)
+    batch_sizes = compounding(batch_start, batch_end, batch_compound)
+
+    model_output_path = os.path.join(DATA_DIR, model_name)
+    best_score, best_epoch, epochs_without_improvement = None, 0, 0
+
     print("--- بدء التدريب ---")
     for itn in range(iterations):
-        random.shuffle(data)
         losses = {}
-        for item in data:
-            doc = nlp.make_doc(item['text'])
-            example = Example.from_dict(doc, {"entities": item['entities'], "cats": item['cats']})
-            nlp.update([example], drop=0.35, losses=losses, sgd=optimizer)
-        print(f"التكرار {itn + 1}/{iterations}, الخسارة: {losses}")
+        epoch_start = time.perf_counter()
+        for batch in bucketed_minibatches(train_examples, batch_sizes):
+            nlp.update(batch, drop=dropout, losses=losses, sgd=optimizer)
+        train_seconds = time.perf_counter() - epoch_start
+        examples_per_sec = len(train_examples) / train_seconds if train_seconds > 0 else 0.0
+
+        # التقييم بالأوزان المتوسطة، وهي نفسها التي تُحفظ
+        with nlp.use_params(optimizer.averages):
+            scores = evaluate(nlp, dev_examples, eval_batch_size, n_process)
+        print(f"التكرار {itn + 1}/{iterations}, الخسارة: {losses}, الوقت: {train_seconds:.2f}ث "
+              f"({examples_per_sec:.0f} مثال/ث), التقييم: {scores}")
+
+        if not dev_examples:
+            continue
+        score = (scores["cats_score"] + scores["ents_f"]) / 2
+        if best_score is None or score > best_score:
+            best_score, best_epoch, epochs_without_improvement = score, itn + 1, 0
+            # حفظ أفضل نموذج حتى الآن باستخدام المُحسِّن بأوزانه المتوسطة
+            with nlp.use_params(optimizer.averages):
+                nlp.to_disk(model_output_path)
+        else:
+            epochs_without_improvement += 1
+            if patience and epochs_without_improvement >= patience:
+                print(f"إيقاف مبكر: لا تحسن منذ {patience} تكرارات.")
+                break
 
     # حفظ النموذج المدرب إلى مجلد
     # تم تحديث المسار ليشير إلى مجلد nlu_model_ar داخل مجلد data
-    model_output_path = os.path.join(os.path.dirname(__file__), '..', 'data', model_name)
-    nlp.to_disk(model_output_path)
+    if not dev_examples:
+        with nlp.use_params(optimizer.averages):
+            nlp.to_disk(model_output_path)
+    else:
+        print(f"أفضل نتيجة تقييم {best_score:.3f} في التكرار {best_epoch}")
     print(f"\n--- تم حفظ النموذج بنجاح في مجلد '{model_output_path}' ---")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="تدريب نموذج فهم اللغة (المقاصد والكيانات)")
+    parser.add_argument("--iterations", type=int, default=20, help="الحد الأقصى لعدد التكرارات")
+    parser.add_argument("--patience", type=int, default=5, help="عدد التكرارات بلا تحسن قبل الإيقاف (0 للتعطيل)")
+    parser.add_argument("--dev-ratio", type=float, default=0.1, help="نسبة أمثلة التقييم")
+    parser.add_argument("--batch-start", type=float, default=4.0)
+    parser.add_argument("--batch-end", type=float, default=32.0)
+    parser.add_argument("--dropout", type=float, default=0.35)
+    parser.add_argument("--eval-batch-size", type=int, default=256)
+    parser.add_argument("--n-process", type=int, default=1, help="عدد العمليات لـ nlp.pipe أثناء التقييم")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
     # 1. تحميل بيانات التدريب
     # تم تحديث المسار ليشير إلى training_data.json في مجلد data
-    training_data = load_data(os.path.join(os.path.dirname(__file__), '..', 'data', 'training_data.json'))
-    
+    training_data = load_data(os.path.join(DATA_DIR, 'training_data.json'))
+
     # 2. بدء عملية التدريب
-    train_spacy(training_data)
\ No newline at end of file
+    train_spacy(training_data, iterations=args.iterations, dev_ratio=args.dev_ratio, patience=args.patience,
+                batch_start=args.batch_start, batch_end=args.batch_end, dropout=args.dropout,
+                eval_batch_size=args.eval_batch_size, n_process=args.n_process, seed=args.seed)
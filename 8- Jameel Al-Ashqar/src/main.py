@@ -3,8 +3,9 @@ from __future__ import annotations
 
 import argparse
 import collections
-import random
+import os
 import time
+from functools import partial
 from pathlib import Path
 
 import cv2
@@ -27,12 +28,17 @@ DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 GAMMA = 0.99
 LR = 1e-4
 BATCH_SIZE = 16               # تقليل حجم الباتش
-MEMORY_CAPACITY = 20_000      # تقليل سعة الذاكرة
+MEMORY_CAPACITY = 1_000_000   # الإطارات تُخزن مرة واحدة بصيغة uint8 (~7GB عند الامتلاء، تُحجز تدريجياً)
 MIN_MEMORY_FOR_TRAIN = 2_000  # بدء التدريب مبكراً مع بيانات أقل
 TARGET_UPDATE_FREQ = 5_000    # تحديث شبكة الهدف بشكل أسرع
 MAX_FRAMES = 50_000           # تقليل زمن التدريب كثيراً
 SAVE_EVERY = 10_000           # حفظ النموذج بشكل متكرر
 
+NUM_ENVS = os.cpu_count() or 1  # بيئات متوازية، كل منها في عملية منفصلة
+FRAME_SKIP = 4
+TRAIN_EVERY = 1               # خطوات الوكيل (عبر كل البيئات) لكل تحديث للشبكة
+LOG_EVERY_SECONDS = 30
+
 EPS_START = 1.0
 EPS_END = 0.05
 EPS_DECAY_FRAMES = 500_000
@@ -43,24 +49,100 @@ RUN_NAME = f"dqn_pong_{int(time.time())}"  # checkpoint folder
 # 2. Utilities: Replay Buffer & Frame Processing
 # ──────────────────────────────────────────────────────────────────────────────
 class ReplayBuffer:
-    def __init__(self, capacity: int):
+    """Preallocated ring of single uint8 frames; stacks are rebuilt by index when sampling.
+
+    Slot t holds the frame observed at step t and, once `push` is called, the action,
+    reward and done flag of the transition leaving it; the next frame is in slot t+1.
+    A terminal transition writes no next frame (its next state is masked by `done`), so
+    an episode costs exactly one slot per transition.
+    """
+
+    def __init__(self, capacity: int, frame_shape=(84, 84), stack: int = STACK_FRAMES):
         self.capacity = capacity
-        self.memory = collections.deque(maxlen=capacity)
+        self.stack = stack
+        self.frames = np.empty((capacity, *frame_shape), dtype=np.uint8)
+        self.actions = np.zeros(capacity, dtype=np.uint8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.episode_start = np.zeros(capacity, dtype=np.bool_)
+        self.has_transition = np.zeros(capacity, dtype=np.bool_)
+        self.cursor = -1      # slot of the current (latest) frame
+        self.filled = 0       # slots written so far, up to capacity
+        self.size = 0         # transitions that can be sampled
+        self.rng = np.random.default_rng()
+
+    def _write_frame(self, frame: np.ndarray, episode_start: bool):
+        self.cursor = (self.cursor + 1) % self.capacity
+        if self.has_transition[self.cursor]:
+            self.size -= 1
+        self.frames[self.cursor] = frame
+        self.episode_start[self.cursor] = episode_start
+        self.has_transition[self.cursor] = False
+        self.filled = min(self.filled + 1, self.capacity)
+
+    def start_episode(self, frame: np.ndarray):
+        self._write_frame(frame, episode_start=True)
+
+    def push(self, action: int, reward: float, next_frame: np.ndarray | None, done: bool):
+        slot = self.cursor
+        self.actions[slot] = action
+        self.rewards[slot] = reward
+        self.dones[slot] = done
+        if not done:
+            # slot+1 بعد نهاية الحلقة هو أول إطار في الحلقة التالية، ولا يُقرأ لأن done يلغي قيمته
+            self._write_frame(next_frame, episode_start=False)
+        self.has_transition[slot] = True
+        self.size += 1
+
+    def _stacks(self, last: np.ndarray) -> np.ndarray:
+        idx = (last[:, None] + np.arange(1 - self.stack, 1)) % self.capacity
+        # الإطارات السابقة لبداية الحلقة تُستبدل بأول إطار فيها (كما في AtariWrapper.reset)
+        starts = self.episode_start[idx]
+        start_pos = np.where(starts.any(axis=1), self.stack - 1 - np.argmax(starts[:, ::-1], axis=1), 0)
+        pos = np.maximum(np.arange(self.stack), start_pos[:, None])
+        return self.frames[np.take_along_axis(idx, pos, axis=1)]
+
+    def sample(self, batch_size: int):
+        oldest = (self.cursor + 1) % self.capacity if self.filled == self.capacity else 0
+        slots = np.empty(0, dtype=np.int64)
+        while len(slots) < batch_size:
+            candidates = self.rng.integers(0, self.filled, size=2 * batch_size)
+            # الانتقال صالح إذا لم يُستبدل أي إطار من مكدسه بإطار أحدث
+            age = (candidates - oldest) % self.capacity
+            valid = self.has_transition[candidates] & (age >= self.stack - 1)
+            slots = np.concatenate([slots, candidates[valid]])
+        slots = slots[:batch_size]
+        return (self._stacks(slots),
+                self.actions[slots].astype(np.int64),
+                self.rewards[slots],
+                self._stacks((slots + 1) % self.capacity),
+                self.dones[slots])
+
+    def __len__(self):
+        return self.size
 
-    def push(self, state: np.ndarray, action: int, reward: float, next_state: np.ndarray, done: bool):
-        self.memory.append((state, action, reward, next_state, done))
+
+class VectorReplayBuffer:
+    """One ReplayBuffer per environment, so each keeps its frames contiguous."""
+
+    def __init__(self, capacity: int, num_envs: int):
+        self.shards = [ReplayBuffer(capacity // num_envs) for _ in range(num_envs)]
+        self.rng = np.random.default_rng()
+
+    def start_episode(self, env_idx: int, frame: np.ndarray):
+        self.shards[env_idx].start_episode(frame)
+
+    def push(self, env_idx: int, action: int, reward: float, next_frame: np.ndarray | None, done: bool):
+        self.shards[env_idx].push(action, reward, next_frame, done)
 
     def sample(self, batch_size: int):
-        batch = random.sample(self.memory, batch_size)
-        states, actions, rewards, next_states, dones = zip(*batch)
-        return (np.array(states, dtype=np.float32),
-                np.array(actions),
-                np.array(rewards, dtype=np.float32),
-                np.array(next_states, dtype=np.float32),
-                np.array(dones, dtype=np.bool_))
+        sizes = np.array([len(shard) for shard in self.shards], dtype=np.float64)
+        counts = self.rng.multinomial(batch_size, sizes / sizes.sum())
+        parts = [shard.sample(n) for shard, n in zip(self.shards, counts) if n > 0]
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
 
     def __len__(self):
-        return len(self.memory)
+        return sum(len(shard) for shard in self.shards)
 
 # Frame preprocessing: gray‑scale, crop, resize to 84×84
 _CROP = slice(34, 194)  # remove score & floor
@@ -69,7 +151,7 @@ def preprocess_frame(frame: np.ndarray) -> np.ndarray:
     frame = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)  # gray
     frame = frame[_CROP, :]                         # crop
     frame = cv2.resize(frame, (84, 84), interpolation=cv2.INTER_AREA)
-    return frame / 255.0  # normalize to 0‑1
+    return frame  # uint8؛ التطبيع إلى 0‑1 يتم داخل الشبكة
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 3. Neural Network
@@ -84,7 +166,7 @@ class DQN(nn.Module):
         self.out = nn.Linear(512, n_actions)
 
     def forward(self, x):
-        x = x / 1.0  # already 0‑1, keep for clarity
+        x = x.float() / 255.0  # uint8 frames → 0‑1
         x = F.relu(self.conv1(x))
         x = F.relu(self.conv2(x))
         x = F.relu(self.conv3(x))
@@ -101,47 +183,75 @@ def epsilon_by_frame(frame_idx: int) -> float:
     return eps
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 5. Environment wrapper: skip & stack frames
+# 5. Environment wrapper: skip, max‑pool & stack frames
 # ──────────────────────────────────────────────────────────────────────────────
-class AtariWrapper:
-    """Minimal wrap: frame‑skip 4 & stack 4 processed frames."""
-
-    def __init__(self, env_id: str):
-        self.env = gym.make(env_id, frameskip=1, repeat_action_probability=0.0, render_mode="human")
-
-        self.action_space = self.env.action_space
+class AtariWrapper(gym.Wrapper):
+    """Frame‑skip 4 with max‑pool over the last 2 raw frames & stack 4 processed frames.
+
+    With `autoreset=True` (used inside vector env workers) an ended episode is reset
+    here and reported through info["done"] / info["episode_reward"], while the returned
+    terminated/truncated stay False so the vector env never resets on its own.
+    """
+
+    def __init__(self, env: gym.Env, autoreset: bool = False):
+        super().__init__(env)
+        self.autoreset = autoreset
+        self.observation_space = gym.spaces.Box(0, 255, (STACK_FRAMES, 84, 84), dtype=np.uint8)
         self.obs_queue = collections.deque(maxlen=STACK_FRAMES)
+        self.raw_frames = collections.deque(maxlen=2)
+        self.episode_reward = 0.0
 
-    def reset(self):
-        obs, info = self.env.reset()
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
         frame = preprocess_frame(obs)
         for _ in range(STACK_FRAMES):
             self.obs_queue.append(frame)
+        self.episode_reward = 0.0
         return np.stack(self.obs_queue, axis=0), info
 
     def step(self, action: int):
         total_reward = 0.0
         done = truncated = False
-        for _ in range(4):
+        self.raw_frames.clear()
+        for _ in range(FRAME_SKIP):
             obs, reward, done, truncated, info = self.env.step(action)
+            self.raw_frames.append(obs)
             total_reward += reward
             if done or truncated:
                 break
-        frame = preprocess_frame(obs)
+        # أقصى قيمة لآخر إطارين تزيل وميض الكائنات في Atari
+        frame = preprocess_frame(np.maximum.reduce(self.raw_frames))
         self.obs_queue.append(frame)
         next_state = np.stack(self.obs_queue, axis=0)
-        return next_state, total_reward, done, truncated, info
+        self.episode_reward += total_reward
 
-    def close(self):
-        self.env.close()
+        if not self.autoreset:
+            return next_state, total_reward, done, truncated, info
+        info = {"done": done or truncated}
+        if done or truncated:
+            # الحالة التالية للانتقال النهائي لا تُستخدم في التعلم، فنعيد حالة الحلقة الجديدة مباشرة
+            info["episode_reward"] = self.episode_reward
+            next_state, _ = self.reset()
+        return next_state, total_reward, False, False, info
+
+
+def make_env(env_id: str, render_mode: str | None = None, autoreset: bool = False) -> AtariWrapper:
+    env = gym.make(env_id, frameskip=1, repeat_action_probability=0.0, render_mode=render_mode)
+    return AtariWrapper(env, autoreset=autoreset)
+
+
+def make_vector_env(env_id: str, num_envs: int) -> gym.vector.AsyncVectorEnv:
+    # بدون نافذة عرض أثناء التدريب؛ المعالجة المسبقة تتم داخل العمليات الفرعية
+    return gym.vector.AsyncVectorEnv([partial(make_env, env_id, None, True) for _ in range(num_envs)])
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 6. Training loop
 # ──────────────────────────────────────────────────────────────────────────────
 
-def train():
-    env = AtariWrapper(ENV_ID)
-    n_actions = env.action_space.n
+def train(num_envs: int = NUM_ENVS):
+    # تُنشأ البيئات قبل الشبكة حتى لا تُنسخ حالة CUDA إلى العمليات الفرعية
+    envs = make_vector_env(ENV_ID, num_envs)
+    n_actions = envs.single_action_space.n
 
     policy_net = DQN(STACK_FRAMES, n_actions).to(DEVICE)
     target_net = DQN(STACK_FRAMES, n_actions).to(DEVICE)
@@ -149,76 +259,101 @@ def train():
     target_net.eval()
 
     optimizer = optim.Adam(policy_net.parameters(), lr=LR, eps=1e-4)
-    memory = ReplayBuffer(MEMORY_CAPACITY)
+    memory = VectorReplayBuffer(MEMORY_CAPACITY, num_envs)
 
-    state, _ = env.reset()
+    states, _ = envs.reset()
+    for env_idx in range(num_envs):
+        memory.start_episode(env_idx, states[env_idx][-1])
     frame_idx = 0
-    episode_reward = 0
+    pending_updates = 0
+    next_target_update = TARGET_UPDATE_FREQ
+    next_save = SAVE_EVERY
     rewards_history = []
 
+    collect_seconds = 0.0
+    log_frames, log_start = 0, time.perf_counter()
+
     # main loop
     while frame_idx < MAX_FRAMES:
+        collect_start = time.perf_counter()
         eps = epsilon_by_frame(frame_idx)
-        if random.random() < eps:
-            action = env.action_space.sample()
-        else:
-            with torch.no_grad():
-                state_v = torch.tensor(state, dtype=torch.float32).unsqueeze(0).to(DEVICE)
-                q_values = policy_net(state_v)
-                action = int(torch.argmax(q_values).item())
-
-        next_state, reward, done, truncated, _ = env.step(action)
-        memory.push(state, action, reward, next_state, done or truncated)
-        state = next_state
-        episode_reward += reward
-        frame_idx += 1
-
-        # learn when enough samples
+        # اختيار أفعال كل البيئات بتمرير واحد عبر الشبكة
+        with torch.no_grad():
+            q_values = policy_net(torch.from_numpy(states).to(DEVICE))
+            actions = torch.argmax(q_values, dim=1).cpu().numpy()
+        explore = np.random.random(num_envs) < eps
+        actions[explore] = np.random.randint(n_actions, size=explore.sum())
+
+        next_states, rewards, _, _, infos = envs.step(actions)
+        collect_seconds += time.perf_counter() - collect_start
+
+        for env_idx in range(num_envs):
+            done = bool(infos["done"][env_idx])
+            # يُخزن الإطار الجديد فقط؛ بقية المكدس موجودة مسبقاً في الذاكرة
+            # عند نهاية الحلقة يكون next_states أول حالة في الحلقة الجديدة، فيُخزن مرة واحدة عبر start_episode
+            memory.push(env_idx, actions[env_idx], rewards[env_idx], None if done else next_states[env_idx][-1], done)
+            if done:
+                episode_reward = float(infos["episode_reward"][env_idx])
+                rewards_history.append(episode_reward)
+                print(f"Frame: {frame_idx:7d} | Episode reward: {episode_reward:5.1f} | Eps: {eps:.3f}")
+                memory.start_episode(env_idx, next_states[env_idx][-1])
+        states = next_states
+        frame_idx += num_envs
+        log_frames += num_envs
+
+        # learn when enough samples (نفس نسبة التحديثات إلى خطوات الوكيل كما في البيئة الواحدة)
         if len(memory) > MIN_MEMORY_FOR_TRAIN:
-            states, actions, rewards, next_states, dones = memory.sample(BATCH_SIZE)
-            states_v = torch.tensor(states).to(DEVICE)
-            actions_v = torch.tensor(actions).unsqueeze(1).to(DEVICE)
-            rewards_v = torch.tensor(rewards).to(DEVICE)
-            next_states_v = torch.tensor(next_states).to(DEVICE)
-            dones_v = torch.tensor(dones).to(DEVICE)
-
-            q_values = policy_net(states_v).gather(1, actions_v).squeeze(1)
-            with torch.no_grad():
-                next_q = target_net(next_states_v).max(1)[0]
-                expected_q = rewards_v + GAMMA * next_q * (~dones_v)
-
-            loss = F.smooth_l1_loss(q_values, expected_q)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
+            pending_updates += num_envs
+            while pending_updates >= TRAIN_EVERY:
+                pending_updates -= TRAIN_EVERY
+                states_b, actions_b, rewards_b, next_states_b, dones_b = memory.sample(BATCH_SIZE)
+                states_v = torch.from_numpy(states_b).to(DEVICE)
+                actions_v = torch.from_numpy(actions_b).unsqueeze(1).to(DEVICE)
+                rewards_v = torch.from_numpy(rewards_b).to(DEVICE)
+                next_states_v = torch.from_numpy(next_states_b).to(DEVICE)
+                dones_v = torch.from_numpy(dones_b).to(DEVICE)
+
+                q_values = policy_net(states_v).gather(1, actions_v).squeeze(1)
+                with torch.no_grad():
+                    next_q = target_net(next_states_v).max(1)[0]
+                    expected_q = rewards_v + GAMMA * next_q * (~dones_v)
+
+                loss = F.smooth_l1_loss(q_values, expected_q)
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
 
         # update target network
-        if frame_idx % TARGET_UPDATE_FREQ == 0:
+        if frame_idx >= next_target_update:
             target_net.load_state_dict(policy_net.state_dict())
-
-        # logging + checkpoint
-        if done:
-            rewards_history.append(episode_reward)
-            print(f"Frame: {frame_idx:7d} | Episode reward: {episode_reward:5.1f} | Eps: {eps:.3f}")
-            state, _ = env.reset()
-            episode_reward = 0
-
-        if frame_idx % SAVE_EVERY == 0 and frame_idx > 0:
+            next_target_update += TARGET_UPDATE_FREQ
+
+        # throughput: إطارات البيئة (بعد احتساب تخطي الإطارات) في الثانية
+        elapsed = time.perf_counter() - log_start
+        if elapsed >= LOG_EVERY_SECONDS:
+            env_frames = log_frames * FRAME_SKIP
+            print(f"Throughput: {env_frames / elapsed:8.0f} env-frames/s overall | "
+                  f"{env_frames / max(collect_seconds, 1e-9):8.0f} env-frames/s collecting | {num_envs} envs")
+            collect_seconds = 0.0
+            log_frames, log_start = 0, time.perf_counter()
+
+        # checkpoint
+        if frame_idx >= next_save:
             save_path = Path(RUN_NAME)
             save_path.mkdir(parents=True, exist_ok=True)
             ckpt = save_path / f"dqn_pong_{frame_idx//1000}k.pt"
             torch.save(policy_net.state_dict(), ckpt)
             print(f"Model saved to {ckpt}")
+            next_save += SAVE_EVERY
 
-    env.close()
+    envs.close()
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 7. Play / Evaluation loop
 # ──────────────────────────────────────────────────────────────────────────────
 
 def play(model_path: str | None = None, episodes: int = 5):
-    env = AtariWrapper(ENV_ID)
-   # env.env.render_mode = "human"  # enable display
+    env = make_env(ENV_ID, render_mode="human")
     n_actions = env.action_space.n
 
     policy_net = DQN(STACK_FRAMES, n_actions).to(DEVICE)
@@ -232,7 +367,7 @@ def play(model_path: str | None = None, episodes: int = 5):
         total_reward = 0
         while not done:
             with torch.no_grad():
-                state_v = torch.tensor(state, dtype=torch.float32).unsqueeze(0).to(DEVICE)
+                state_v = torch.from_numpy(state).unsqueeze(0).to(DEVICE)
                 action = int(torch.argmax(policy_net(state_v)).item())
             next_state, reward, done, _, _ = env.step(action)
             total_reward += reward
@@ -249,10 +384,11 @@ def main():
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--train", action="store_true", help="Train from scratch")
     group.add_argument("--play", metavar="MODEL", help="Play using a saved model")
+    parser.add_argument("--num-envs", type=int, default=NUM_ENVS, help="Parallel environments for training")
     args = parser.parse_args()
 
     if args.train:
-        train()
+        train(args.num_envs)
     else:
         play(args.play)
 
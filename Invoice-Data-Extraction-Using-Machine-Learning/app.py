@@ -3,14 +3,13 @@ import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 from PIL import Image, ImageDraw
+import io
 import traceback
 
 import gradio as gr
 
-import torch
-from docquery import pipeline
-from docquery.document import load_document, ImageDocument
-from docquery.ocr_reader import get_ocr_reader
+from doc_cache import DocumentCache
+from pipelines import CHECKPOINTS, MODEL_REGISTRY, TOP_PAGES, needs_images, rank_pages
 
 
 
@@ -21,38 +20,35 @@ def ensure_list(x):
         return [x]
 
 
-CHECKPOINTS = {
-    "LayoutLMv1": "impira/layoutlm-document-qa",
-    "LayoutLMv1 for Invoices": "impira/layoutlm-invoices",
-    "Donut": "naver-clova-ix/donut-base-finetuned-docvqa",
-}
-
-
-
-PIPELINES = {}
-
-
+DOCUMENT_CACHE = DocumentCache()
 
-def construct_pipeline(task, model):
-    global PIPELINES
-    if model in PIPELINES:
-        return PIPELINES[model]
+# Requests Gradio's queue runs at once; calls into the same model still take turns
+CONCURRENCY = int(os.environ.get("DOCQUERY_CONCURRENCY", 2))
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    ret = pipeline(task=task, model=CHECKPOINTS[model], device=device)
-    PIPELINES[model] = ret
-    return ret
 
+def run_pipeline(model, question, document, top_k, top_pages=TOP_PAGES):
+    # Answers are remembered per question, so asking again (or switching back to a
+    # model) does not run the model
+    params = [top_k, top_pages]
+    predictions = DOCUMENT_CACHE.get_answers(document.key, model, question, params)
+    if predictions is not None:
+        return predictions
 
-def run_pipeline(model, question, document, top_k):
-    pipeline = construct_pipeline("document-question-answering", model)
-    return pipeline(question=question, **document.context, top_k=top_k)
+    # Only the pages that share the most words with the question are read by the model
+    page_indices = rank_pages(question, document, top_pages)
+    with MODEL_REGISTRY.acquire(model) as pipeline:
+        pages = document.pages(page_indices, with_images=needs_images(pipeline))
+        predictions = pipeline(question=question, image=pages, top_k=top_k)
+    for p in ensure_list(predictions):
+        if p.get("page") is not None:
+            p["page"] = page_indices[p["page"]]
+    DOCUMENT_CACHE.put_answers(document.key, model, question, params, predictions)
+    return predictions
 
 
 # TODO: Move into docquery
-# TODO: Support words past the first page (or window?)
 def lift_word_boxes(document, page):
-    return document.context["image"][page][1]
+    return document.word_boxes(page)
 
 
 def expand_bbox(word_boxes):
@@ -109,7 +105,7 @@ def process_path(path):
     error = None
     if path:
         try:
-            document = load_document(path)
+            document = DOCUMENT_CACHE.load(path)
             return (
                 document,
                 gr.update(visible=True, value=document.preview),
@@ -155,7 +151,8 @@ def process_question(question, document, model=list(CHECKPOINTS.keys())[0]):
 
     text_value = None
     predictions = run_pipeline(model, question, document, 3)
-    pages = [x.copy().convert("RGB") for x in document.preview]
+    # Pages are shown from their files on disk; only the answer page is copied to draw on
+    pages = document.preview
     for i, p in enumerate(ensure_list(predictions)):
         if i == 0:
             text_value = p["answer"]
@@ -165,7 +162,8 @@ def process_question(question, document, model=list(CHECKPOINTS.keys())[0]):
             break
 
         if "word_ids" in p:
-            image = pages[p["page"]]
+            image = document.page_image(p["page"]).copy().convert("RGB")
+            pages[p["page"]] = image
             draw = ImageDraw.Draw(image, "RGBA")
             word_boxes = lift_word_boxes(document, p["page"])
             x1, y1, x2, y2 = normalize_bbox(
@@ -188,9 +186,11 @@ def process_question(question, document, model=list(CHECKPOINTS.keys())[0]):
 def load_example_document(img, question, model):
     if img is not None:
         if question in question_files:
-            document = load_document(question_files[question])
+            document = DOCUMENT_CACHE.load(question_files[question])
         else:
-            document = ImageDocument(Image.fromarray(img), get_ocr_reader())
+            buf = io.BytesIO()
+            Image.fromarray(img).save(buf, format="PNG")
+            document = DOCUMENT_CACHE.load_bytes(buf.getvalue(), "image/png")
         preview, answer, answer_text = process_question(question, document, model)
         return document, question, preview, gr.update(visible=True), answer, answer_text
     else:
@@ -414,4 +414,5 @@ with gr.Blocks(css=CSS) as demo:
     )
 
 if __name__ == "__main__":
-    demo.launch(enable_queue=False)
+    MODEL_REGISTRY.preload()
+    demo.queue(concurrency_count=CONCURRENCY).launch()
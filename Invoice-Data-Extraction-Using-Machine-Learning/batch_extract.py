@@ -0,0 +1,299 @@
+"""
+Headless batch extraction: answers the same set of field questions for many invoices.
+
+    python batch_extract.py invoices/ --schema fields.json --output results.jsonl
+
+`invoices/` may be a directory of documents or a manifest (one path or URL per line, or
+JSON lines with "id" and "path"). `fields.json` maps field names to questions, e.g.
+{"invoice_number": "What is the invoice number?"}. Results are written per document to
+JSONL or Parquet (when --output ends in .parquet, written as a directory of part files).
+Documents already present in the output are skipped, so an interrupted run can simply be
+restarted with the same arguments.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+from doc_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DocumentCache
+from pipelines import CHECKPOINTS, MODEL_REGISTRY, TOP_PAGES, needs_images, run_pipeline_batch
+
+
+DOCUMENT_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp"}
+
+
+def read_inputs(source):
+    """Returns a list of (id, path) pairs from a directory or a manifest file."""
+    if os.path.isdir(source):
+        paths = sorted(
+            path
+            for path in glob.glob(os.path.join(source, "**", "*"), recursive=True)
+            if os.path.splitext(path)[1].lower() in DOCUMENT_EXTENSIONS
+        )
+        return [(os.path.relpath(path, source), path) for path in paths]
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    inputs = []
+    with open(source, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                doc_id, path = entry.get("id", entry["path"]), entry["path"]
+            else:
+                doc_id, path = line, line
+            if not (path.startswith("http://") or path.startswith("https://") or os.path.isabs(path)):
+                path = os.path.join(base_dir, path)
+            inputs.append((doc_id, path))
+    return inputs
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.path = path
+        self._truncate_partial_line()
+        self._f = open(path, "a")
+
+    def _truncate_partial_line(self):
+        # A run killed mid-write can leave half a record at the end of the file
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def completed_ids(self):
+        ids = set()
+        with open(self.path, "r") as f:
+            for line in f:
+                ids.add(json.loads(line)["id"])
+        return ids
+
+    def write(self, records):
+        for record in records:
+            self._f.write(json.dumps(record) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, fields):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        # Fixed schema so every part file matches, even when a whole chunk failed
+        columns = [("id", pyarrow.string()), ("path", pyarrow.string()), ("error", pyarrow.string())]
+        for field in fields:
+            columns += [
+                (field, pyarrow.string()),
+                (f"{field}_score", pyarrow.float64()),
+                (f"{field}_page", pyarrow.int64()),
+            ]
+        self.schema = pyarrow.schema(columns)
+        os.makedirs(path, exist_ok=True)
+        self._parts = len(self._part_files())
+
+    def _part_files(self):
+        return sorted(glob.glob(os.path.join(self.path, "part-*.parquet")))
+
+    def completed_ids(self):
+        ids = set()
+        for part in self._part_files():
+            ids.update(self.pq.read_table(part, columns=["id"]).column("id").to_pylist())
+        return ids
+
+    def write(self, records):
+        if not records:
+            return
+        part = os.path.join(self.path, f"part-{self._parts:05d}.parquet")
+        # Written under a temporary name first so a crash never leaves a partial part
+        self.pq.write_table(self.pa.Table.from_pylist(records, schema=self.schema), part + ".tmp")
+        os.replace(part + ".tmp", part)
+        self._parts += 1
+
+    def close(self):
+        pass
+
+
+def open_writer(path, fields):
+    return ParquetWriter(path, fields) if path.endswith(".parquet") else JsonlWriter(path)
+
+
+def empty_record(doc_id, path, fields, error=None):
+    record = {"id": doc_id, "path": path, "error": error}
+    for field in fields:
+        record[field] = record[f"{field}_score"] = record[f"{field}_page"] = None
+    return record
+
+
+_worker_cache = None
+_worker_with_images = False
+
+
+def _init_worker(cache_dir, max_bytes, with_images):
+    global _worker_cache, _worker_with_images
+    _worker_cache = DocumentCache(cache_dir, max_bytes)
+    _worker_with_images = with_images
+
+
+def _load_document(path):
+    # Renders and OCRs every page into the shared cache directory; the main process
+    # then opens the entry by key
+    start = time.perf_counter()
+    document = _worker_cache.load(path)
+    document.pages(with_images=_worker_with_images)
+    return document.key, time.perf_counter() - start
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+
+    def add(self, stage, seconds, count):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + count
+
+    def report(self):
+        parts = []
+        for stage, seconds in self.seconds.items():
+            rate = self.counts[stage] / seconds if seconds > 0 else float("inf")
+            parts.append(f"{stage}: {self.counts[stage]} in {seconds:.1f}s ({rate:.2f}/s)")
+        return ", ".join(parts)
+
+
+def extract(
+    inputs, schema, writer, model, ocr_workers, batch_size, chunk_size, cache_dir, max_cache_bytes, top_pages=TOP_PAGES
+):
+    fields = list(schema.items())
+    done = writer.completed_ids()
+    pending = [(doc_id, path) for doc_id, path in inputs if doc_id not in done]
+    print(f"{len(inputs)} documents, {len(done)} already done, {len(pending)} to process", file=sys.stderr)
+
+    cache = DocumentCache(cache_dir, max_cache_bytes)
+    with_images = needs_images(MODEL_REGISTRY.get(model))
+    timer = StageTimer()
+    start = time.perf_counter()
+    processed = 0
+    initargs = (cache_dir, max_cache_bytes, with_images)
+    # Spawned rather than forked: the parent already holds the model (and maybe a CUDA context)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(ocr_workers, mp_context=context, initializer=_init_worker, initargs=initargs) as pool:
+        # OCR runs ahead of the model by up to two chunks
+        queue = deque()
+        remaining = iter(pending)
+
+        def fill():
+            while len(queue) < 2 * chunk_size:
+                item = next(remaining, None)
+                if item is None:
+                    return
+                queue.append((item, pool.submit(_load_document, item[1])))
+
+        fill()
+        while queue:
+            chunk, records = [], []
+            wait_start = time.perf_counter()
+            while queue and len(chunk) + len(records) < chunk_size:
+                (doc_id, path), future = queue.popleft()
+                try:
+                    key, ocr_seconds = future.result()
+                    timer.add("ocr (worker time)", ocr_seconds, 1)
+                    document = cache.get(key)
+                    if document is None:
+                        raise ValueError(f"{path} was evicted from the cache before it could be read")
+                    chunk.append((doc_id, path, document))
+                except Exception as e:
+                    traceback.print_exc()
+                    records.append(empty_record(doc_id, path, schema, str(e)))
+            timer.add("ocr wait", time.perf_counter() - wait_start, len(chunk) + len(records))
+            fill()
+
+            if chunk:
+                qa_start = time.perf_counter()
+                items = [(question, document) for _, _, document in chunk for _, question in fields]
+                try:
+                    predictions = run_pipeline_batch(model, items, top_k=1, batch_size=batch_size, top_pages=top_pages)
+                except Exception as e:
+                    traceback.print_exc()
+                    records.extend(empty_record(doc_id, path, schema, str(e)) for doc_id, path, _ in chunk)
+                else:
+                    timer.add("qa", time.perf_counter() - qa_start, len(items))
+                    for i, (doc_id, path, _) in enumerate(chunk):
+                        record = empty_record(doc_id, path, schema)
+                        for j, (field, _) in enumerate(fields):
+                            answers = predictions[i * len(fields) + j]
+                            best = answers[0] if isinstance(answers, list) and answers else answers or {}
+                            record[field] = best.get("answer")
+                            record[f"{field}_score"] = best.get("score")
+                            record[f"{field}_page"] = best.get("page")
+                        records.append(record)
+
+            write_start = time.perf_counter()
+            writer.write(records)
+            timer.add("write", time.perf_counter() - write_start, len(records))
+            processed += len(records)
+            elapsed = time.perf_counter() - start
+            print(
+                f"[{processed}/{len(pending)}] {processed / elapsed:.2f} docs/s | {timer.report()}",
+                file=sys.stderr,
+            )
+    return processed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract a fixed set of fields from many invoices.")
+    parser.add_argument("inputs", help="Directory of documents or a manifest file")
+    parser.add_argument("--schema", required=True, help="JSON file mapping field names to questions")
+    parser.add_argument("--output", required=True, help="Output .jsonl file or .parquet directory")
+    parser.add_argument("--model", default="LayoutLMv1 for Invoices", choices=list(CHECKPOINTS.keys()))
+    parser.add_argument("--ocr-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=16, help="Spans per forward pass")
+    parser.add_argument("--chunk-size", type=int, default=32, help="Documents per checkpoint")
+    parser.add_argument("--top-pages", type=int, default=TOP_PAGES, help="Pages read per question")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-cache-bytes", type=int, default=DEFAULT_MAX_BYTES)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.schema, "r") as f:
+        schema = json.load(f)
+    writer = open_writer(args.output, list(schema))
+    try:
+        extract(
+            read_inputs(args.inputs),
+            schema,
+            writer,
+            args.model,
+            args.ocr_workers,
+            args.batch_size,
+            args.chunk_size,
+            args.cache_dir,
+            args.max_cache_bytes,
+            args.top_pages,
+        )
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
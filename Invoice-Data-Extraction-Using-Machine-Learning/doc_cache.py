@@ -0,0 +1,356 @@
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from PIL import Image
+
+from docquery.document import Document, UnsupportedDocument, load_document, use_pdf2_image, use_pdf_plumber
+from docquery.ocr_reader import get_ocr_reader
+
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DOCQUERY_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "documents")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("DOCQUERY_CACHE_MAX_BYTES", 2 * 1024**3))
+
+# Bumped when the entry layout changes; older entries are treated as misses
+CACHE_VERSION = 2
+
+# Pages kept decoded in memory per document; the rest stay on disk
+RESIDENT_PAGES = 4
+RESIDENT_WORD_BOXES = 64
+
+
+def read_bytes(path):
+    """Returns the document bytes and its mime type, detected the same way as docquery."""
+    doc_type = mimetypes.guess_type(os.path.basename(path).split("?")[0].strip())[0]
+    if path.startswith("http://") or path.startswith("https://"):
+        resp = requests.get(path, allow_redirects=True)
+        resp.raise_for_status()
+        if "Content-Type" in resp.headers:
+            doc_type = resp.headers["Content-Type"].split(";")[0].strip()
+        return resp.content, doc_type
+    with open(path, "rb") as f:
+        return f.read(), doc_type
+
+
+def content_key(b):
+    return hashlib.sha256(b).hexdigest()
+
+
+class CachedDocument:
+    """
+    A document backed by a cache entry. Pages are rendered and OCR'd one at a time, the
+    first time they are needed, and the results are written to the entry, so later
+    questions (and later runs) reuse them. Only the last few rendered pages and word box
+    lists stay in memory, however long the document is.
+
+    `context` and `preview` match the docquery documents; `context` materializes every
+    page, so page-aware callers use `page_image`, `word_boxes` and `pages` instead.
+    """
+
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.num_pages = meta["pages"]
+        self.doc_type = meta["type"]
+        self._lock = threading.RLock()
+        self._images = OrderedDict()
+        self._word_boxes = OrderedDict()
+
+    @property
+    def context(self):
+        return {"image": self.pages()}
+
+    @property
+    def preview(self):
+        return [self.page_path(i) for i in range(self.num_pages)]
+
+    def pages(self, indices=None, with_images=True):
+        """(image, word_boxes) pairs for the given pages, as the pipeline takes them."""
+        indices = range(self.num_pages) if indices is None else indices
+        return [(self.page_image(i) if with_images else None, self.word_boxes(i)) for i in indices]
+
+    def page_path(self, i):
+        path = self.cache._path(self.key, "pages", f"{i}.png")
+        if not os.path.exists(path):
+            self.page_image(i)
+        return path
+
+    def page_image(self, i):
+        with self._lock:
+            image = _lru_get(self._images, i)
+            if image is not None:
+                return image
+            path = self.cache._path(self.key, "pages", f"{i}.png")
+            if os.path.exists(path):
+                image = Image.open(path)
+                image.load()
+            else:
+                image = self._render(i)
+                self.cache._write(self.key, ("pages", f"{i}.png"), lambda f: image.save(f, format="PNG"))
+            _lru_put(self._images, i, image, RESIDENT_PAGES)
+            return image
+
+    def word_boxes(self, i):
+        with self._lock:
+            if i in self._word_boxes:
+                return _lru_get(self._word_boxes, i)
+            path = self.cache._path(self.key, "words", f"{i}.json")
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    word_boxes = json.load(f)
+            else:
+                word_boxes = self._extract_words(i)
+                data = json.dumps(word_boxes).encode("utf-8")
+                self.cache._write(self.key, ("words", f"{i}.json"), lambda f: f.write(data))
+            _lru_put(self._word_boxes, i, word_boxes, RESIDENT_WORD_BOXES)
+            return word_boxes
+
+    def page_text(self, i):
+        return " ".join(word for word, _ in self.word_boxes(i))
+
+    def _source(self):
+        with open(self.cache._path(self.key, "source"), "rb") as f:
+            return f.read()
+
+    def _render(self, i):
+        if self.doc_type == "application/pdf":
+            use_pdf2_image()
+            import pdf2image
+
+            return pdf2image.convert_from_bytes(self._source(), first_page=i + 1, last_page=i + 1)[0].convert("RGB")
+        return Image.open(io.BytesIO(self._source())).convert("RGB")
+
+    def _extract_words(self, i):
+        words, boxes, dimensions = [], [], None
+        if self.doc_type == "application/pdf":
+            use_pdf_plumber()
+            import pdfplumber
+
+            with pdfplumber.open(io.BytesIO(self._source())) as pdf:
+                page = pdf.pages[i]
+                extracted_words = page.extract_words()
+                words = [w["text"] for w in extracted_words]
+                boxes = [[w["x0"], w["top"], w["x1"], w["bottom"]] for w in extracted_words]
+                dimensions = (page.width, page.height)
+        if not words:
+            image = self.page_image(i)
+            words, boxes = self.cache.ocr_reader.apply_ocr(image)
+            dimensions = (image.width, image.height)
+        output = Document._generate_document_output([None], [words], [boxes], [dimensions])
+        return [[word, list(box)] for word, box in output["image"][0][1]]
+
+
+class DocumentCache:
+    """
+    Persistent cache of processed documents, keyed by the sha256 of their content.
+
+    Each entry is a directory holding the original bytes, the rendered pages (PNG), the
+    OCR word boxes per page (normalized to 0-1000, exactly as LayoutLM consumes them) and
+    the answers already computed for it. Pages are filled in lazily by CachedDocument. A
+    document seen before, under any path or URL, skips rendering and OCR entirely.
+    Entries are evicted least recently used first once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ocr_reader=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._ocr_reader = ocr_reader
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # key -> [last_used, size_in_bytes]
+        self._index = {}
+        for key in os.listdir(cache_dir):
+            if key.startswith("."):
+                continue
+            if self._read_meta(key) is not None:
+                self._index[key] = [os.path.getmtime(self._path(key, "meta.json")), _dir_size(self._path(key))]
+
+    @property
+    def ocr_reader(self):
+        if self._ocr_reader is None:
+            self._ocr_reader = get_ocr_reader()
+        return self._ocr_reader
+
+    @property
+    def total_bytes(self):
+        return sum(size for _, size in self._index.values())
+
+    def load(self, path):
+        b, doc_type = read_bytes(path)
+        if doc_type == "text/html":
+            return self._load_web(path, b)
+        return self.load_bytes(b, doc_type, source=path)
+
+    def load_bytes(self, b, doc_type=None, source=None):
+        key = content_key(b)
+        document = self.get(key)
+        if document is not None:
+            return document
+
+        if doc_type == "application/pdf":
+            use_pdf_plumber()
+            import pdfplumber
+
+            with pdfplumber.open(io.BytesIO(b)) as pdf:
+                num_pages = len(pdf.pages)
+            if num_pages == 0:
+                raise UnsupportedDocument("the pdf has no pages")
+        else:
+            try:
+                Image.open(io.BytesIO(b)).verify()
+            except Exception as e:
+                raise UnsupportedDocument(e)
+            doc_type, num_pages = "image", 1
+
+        meta = self.put(key, {"source": b}, {"source": source, "type": doc_type, "pages": num_pages})
+        return CachedDocument(self, key, meta)
+
+    def _load_web(self, path, b):
+        # Web pages are screenshotted and read by the browser in one go, so they are stored eagerly
+        key = content_key(b)
+        document = self.get(key)
+        if document is not None:
+            return document
+        context = load_document(path).context
+        files = {}
+        for i, (image, word_boxes) in enumerate(context["image"]):
+            buf = io.BytesIO()
+            image.save(buf, format="PNG")
+            files[f"pages/{i}.png"] = buf.getvalue()
+            files[f"words/{i}.json"] = json.dumps([[word, list(box)] for word, box in word_boxes]).encode("utf-8")
+        meta = self.put(key, files, {"source": path, "type": "text/html", "pages": len(context["image"])})
+        return CachedDocument(self, key, meta)
+
+    def get(self, key):
+        with self._lock:
+            meta = self._read_meta(key)
+            if meta is None:
+                self._index.pop(key, None)
+                return None
+            if key not in self._index:
+                # Added by another process sharing the cache directory
+                self._index[key] = [time.time(), _dir_size(self._path(key))]
+            self._touch(key)
+        return CachedDocument(self, key, meta)
+
+    def put(self, key, files, meta):
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            for name, data in files.items():
+                path = os.path.join(tmp_dir, *name.split("/"))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(data)
+            for name in ("pages", "words", "answers"):
+                os.makedirs(os.path.join(tmp_dir, name), exist_ok=True)
+            meta = dict(meta, version=CACHE_VERSION, created=time.time())
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            size = _dir_size(tmp_dir)
+
+            with self._lock:
+                if self._read_meta(key) is not None:
+                    self._index.setdefault(key, [time.time(), size])
+                    return meta
+                # Leftovers of an entry evicted while a document was still filling it in
+                shutil.rmtree(self._path(key), ignore_errors=True)
+                try:
+                    os.replace(tmp_dir, self._path(key))
+                except OSError:
+                    # Written concurrently by another process; keep theirs
+                    if self._read_meta(key) is None:
+                        raise
+                self._index[key] = [time.time(), size]
+                self._evict(keep=key)
+            return meta
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def get_answers(self, key, model, question, params):
+        try:
+            with open(self._answer_path(key, model, question, params), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_answers(self, key, model, question, params, predictions):
+        data = json.dumps(predictions).encode("utf-8")
+        name = os.path.basename(self._answer_path(key, model, question, params))
+        self._write(key, ("answers", name), lambda f: f.write(data))
+
+    def _write(self, key, parts, write):
+        """Atomically adds a file to an entry and accounts for its size."""
+        path = self._path(key, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if key in self._index:
+                self._index[key][1] += size
+                self._evict(keep=key)
+
+    def _answer_path(self, key, model, question, params):
+        name = hashlib.sha1(json.dumps([model, question, params]).encode("utf-8")).hexdigest()
+        return self._path(key, "answers", f"{name}.json")
+
+    def _path(self, key, *parts):
+        return os.path.join(self.cache_dir, key, *parts)
+
+    def _read_meta(self, key):
+        try:
+            with open(self._path(key, "meta.json"), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("version") == CACHE_VERSION else None
+
+    def _touch(self, key):
+        self._index[key][0] = time.time()
+        try:
+            os.utime(self._path(key, "meta.json"))
+        except OSError:
+            pass
+
+    def _evict(self, keep=None):
+        total = self.total_bytes
+        for key, (_, size) in sorted(self._index.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            del self._index[key]
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            total -= size
+
+
+def _lru_get(cache, key):
+    if key not in cache:
+        return None
+    cache.move_to_end(key)
+    return cache[key]
+
+
+def _lru_put(cache, key, value, limit):
+    cache[key] = value
+    while len(cache) > limit:
+        cache.popitem(last=False)
+
+
+def _dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
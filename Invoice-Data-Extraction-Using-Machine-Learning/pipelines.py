@@ -0,0 +1,193 @@
+import math
+import os
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import torch
+from docquery import pipeline
+from PIL import Image
+from transformers.pipelines.base import Pipeline
+
+
+CHECKPOINTS = {
+    "LayoutLMv1": "impira/layoutlm-document-qa",
+    "LayoutLMv1 for Invoices": "impira/layoutlm-invoices",
+    "Donut": "naver-clova-ix/donut-base-finetuned-docvqa",
+}
+
+# Comma separated CHECKPOINTS names to load in the background at startup
+PRELOAD_MODELS = [
+    name.strip()
+    for name in os.environ.get("DOCQUERY_PRELOAD_MODELS", list(CHECKPOINTS.keys())[0]).split(",")
+    if name.strip()
+]
+MAX_MODEL_BYTES = int(os.environ.get("DOCQUERY_MAX_MODEL_BYTES", 6 * 1024**3))
+# Pages of a document the QA model reads per question, chosen by rank_pages
+TOP_PAGES = int(os.environ.get("DOCQUERY_TOP_PAGES", 3))
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from", "how", "in", "is", "it",
+    "many", "much", "of", "on", "or", "the", "this", "to", "was", "what", "when", "where", "which", "who", "why",
+}
+
+
+def model_bytes(pipe):
+    model = pipe.model
+    return sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+
+
+class ModelRegistry:
+    """
+    Resident document-question-answering pipelines, one per CHECKPOINTS name.
+
+    Each name has its own lock, so a model is only ever built once even when several
+    requests ask for it at the same time, while other models stay usable meanwhile.
+    Models are kept least recently used first and evicted once their parameters exceed
+    `max_bytes` in total (the model being returned is never evicted). `preload` builds
+    and warms up models in a background thread so the first user does not pay for the
+    download and load.
+    """
+
+    def __init__(self, checkpoints=CHECKPOINTS, max_bytes=MAX_MODEL_BYTES, device=None):
+        self.checkpoints = checkpoints
+        self.max_bytes = max_bytes
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self._lock = threading.Lock()
+        self._build_locks = {name: threading.Lock() for name in checkpoints}
+        # A pipeline keeps per-call state, so calls into the same model are serialized
+        self._call_locks = {name: threading.Lock() for name in checkpoints}
+        self._models = OrderedDict()
+
+    @property
+    def resident(self):
+        with self._lock:
+            return {name: size for name, (_, size) in self._models.items()}
+
+    def get(self, name):
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name][0]
+
+        with self._build_locks[name]:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name][0]
+
+            start = time.perf_counter()
+            pipe = pipeline(task="document-question-answering", model=self.checkpoints[name], device=self.device)
+            size = model_bytes(pipe)
+            print(f"Loaded {name} ({size / 1024**2:.0f} MB) in {time.perf_counter() - start:.1f}s")
+
+            with self._lock:
+                self._models[name] = (pipe, size)
+                self._evict(keep=name)
+            return pipe
+
+    @contextmanager
+    def acquire(self, name):
+        pipe = self.get(name)
+        with self._call_locks[name]:
+            yield pipe
+
+    def preload(self, names=PRELOAD_MODELS, warmup=True):
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                    if warmup:
+                        self.warmup(name)
+                except Exception:
+                    traceback.print_exc()
+
+        thread = threading.Thread(target=run, name="model-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def warmup(self, name):
+        # A tiny synthetic page, enough to initialize kernels and allocator pools
+        image = Image.new("RGB", (200, 100), "white")
+        word_boxes = [("Invoice", [0, 0, 500, 1000]), ("123", [500, 0, 1000, 1000])]
+        start = time.perf_counter()
+        with self.acquire(name) as pipe:
+            pipe(image=[(image, word_boxes)], question="What is the invoice number?")
+        print(f"Warmed up {name} in {time.perf_counter() - start:.1f}s")
+
+    def _evict(self, keep):
+        total = sum(size for _, size in self._models.values())
+        for name in list(self._models):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            _, size = self._models.pop(name)
+            total -= size
+            print(f"Evicted {name} to stay under {self.max_bytes / 1024**2:.0f} MB")
+        if self.device == "cuda":
+            torch.cuda.empty_cache()
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+def needs_images(pipe):
+    # LayoutLMv1 reads only words and boxes; Donut and image-aware models need the page itself
+    return pipe.model.config.is_encoder_decoder or getattr(pipe, "feature_extractor", None) is not None
+
+
+def _terms(text):
+    return [t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS]
+
+
+def rank_pages(question, document, top_pages=TOP_PAGES):
+    """
+    Cheap lexical retrieval: scores each page by the idf-weighted question terms it
+    contains and returns the indices of the best `top_pages`, in page order. Documents
+    with no more pages than that are returned whole; ties favour earlier pages.
+    """
+    if document.num_pages <= top_pages:
+        return list(range(document.num_pages))
+
+    terms = set(_terms(question))
+    page_terms = [set(_terms(document.page_text(i))) for i in range(document.num_pages)]
+    df = {term: sum(term in words for words in page_terms) for term in terms}
+    scores = [
+        sum(math.log((1 + document.num_pages) / (1 + df[term])) + 1 for term in terms & words)
+        for words in page_terms
+    ]
+    best = sorted(range(document.num_pages), key=lambda i: (-scores[i], i))[:top_pages]
+    return sorted(best)
+
+
+def run_pipeline_batch(model, items, top_k=1, batch_size=8, top_pages=TOP_PAGES):
+    """
+    Answers a list of (question, document) pairs, returning one list of predictions per
+    pair in order. Each question reads the `top_pages` pages chosen by `rank_pages`, and
+    the spans of all pairs are packed into forward passes of `batch_size`, so many
+    questions over many documents share the model calls.
+    """
+    with_images = needs_images(MODEL_REGISTRY.get(model))
+    page_indices = [rank_pages(question, document, top_pages) for question, document in items]
+    inputs = [
+        {"question": question, "pages": document.pages(indices, with_images=with_images)}
+        for (question, document), indices in zip(items, page_indices)
+    ]
+    with MODEL_REGISTRY.acquire(model) as pipeline:
+        if pipeline.model.config.is_encoder_decoder:
+            # Donut generates answers one question at a time
+            batch_size = 1
+        # docquery's __call__ only takes a single document and question, so go through the
+        # base Pipeline, which batches lists of inputs. Spans are padded to one length so
+        # they can be stacked.
+        results = Pipeline.__call__(pipeline, inputs, batch_size=batch_size, top_k=top_k, padding="max_length")
+
+    for predictions, indices in zip(results, page_indices):
+        for p in predictions if isinstance(predictions, list) else [predictions]:
+            if p.get("page") is not None:
+                p["page"] = indices[p["page"]]
+    return results